@@ -0,0 +1,174 @@
+# admission.py
+"""
+API 准入控制：每个后端一个并发闸门 + 相同请求合并
+
+- 并发闸门：同时在途的后端调用不超过 max_concurrent，其余排队；
+  排队数达到 max_queue 立即拒绝，排队超过 queue_timeout_sec 也拒绝（Overloaded）
+- 请求合并：相同 key 的并发请求只占一个名额、只调用一次后端（SingleFlight）
+- 旧结果兜底：被拒绝时若有 ADMISSION_STALE_MAX_SEC 内的同 key 成功结果，返回旧结果及其年龄
+- 排队等待、拒绝、合并、旧结果次数通过 stats() 暴露（/api/metrics）
+"""
+import threading
+import time
+from collections import deque
+
+import config
+from query_cache import QueryCache
+from snapshot import SingleFlight
+
+QUEUE_WAIT_SAMPLES = 1024     # 排队等待分位数的样本窗口
+
+
+class Overloaded(Exception):
+
+    def __init__(self, backend, reason):
+        super().__init__(f"backend {backend} overloaded ({reason})")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after_sec = config.ADMISSION_RETRY_AFTER_SEC
+
+
+class Backend:
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout_sec, stale_max_sec=None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_sec = queue_timeout_sec
+        self.stale_max_sec = config.ADMISSION_STALE_MAX_SEC if stale_max_sec is None else stale_max_sec
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._stale = QueryCache(max_bytes=config.ADMISSION_STALE_MAX_BYTES, name=f"stale_{name}")
+        self._waits = deque(maxlen=QUEUE_WAIT_SAMPLES)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.served_stale = 0
+
+    def _acquire(self):
+        t0 = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.max_queue:
+                    self.shed_queue_full += 1
+                    raise Overloaded(self.name, "queue_full")
+                self.waiting += 1
+            try:
+                ok = self._slots.acquire(timeout=self.queue_timeout_sec)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if not ok:
+                with self._lock:
+                    self.shed_timeout += 1
+                    self._waits.append(time.monotonic() - t0)
+                raise Overloaded(self.name, "queue_timeout")
+        with self._lock:
+            self.admitted += 1
+            self.in_flight += 1
+            self._waits.append(time.monotonic() - t0)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _guarded(self, fn):
+        self._acquire()
+        try:
+            return fn()
+        finally:
+            self._release()
+
+    def call(self, key, fn):
+        """
+        :param key: 请求标识（相同 key 的并发请求合并），需可哈希
+        :return: (结果, 旧结果年龄秒数；新结果为 None)
+        :raises Overloaded: 被拒绝且没有可用的旧结果
+        """
+        try:
+            result = self._flight.do(key, lambda: self._guarded(fn))
+        except Overloaded:
+            hit, item = self._stale.get(key)
+            if not hit:
+                raise
+            with self._lock:
+                self.served_stale += 1
+            stored_at, result = item
+            return result, round(time.monotonic() - stored_at, 1)
+
+        if self.stale_max_sec > 0:
+            self._remember(key, result)
+        return result, None
+
+    def _remember(self, key, result):
+        """
+        记录成功结果供过载兜底：与已存结果是同一批对象（如同一锚点的 ARI 快照）时
+        复用已估算的字节数，只刷新时间戳，不再每次调用都 estimate_size 整个结果
+        """
+        prev = self._stale.peek(key)
+        size = prev[0] if prev is not None and _same_result(prev[1][1], result) else None
+        self._stale.put(key, (time.monotonic(), result), self.stale_max_sec, size=size)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            out = {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "coalesced": self._flight.shared,
+                "shed_queue_full": self.shed_queue_full,
+                "shed_timeout": self.shed_timeout,
+                "served_stale": self.served_stale,
+            }
+        out["queue_wait_ms"] = {
+            "p50": round(waits[len(waits) // 2] * 1000, 1),
+            "p99": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 1),
+            "max": round(waits[-1] * 1000, 1),
+        } if waits else None
+        return out
+
+
+def _same_result(a, b):
+    """
+    同一对象，或逐项为同一对象的元组（后端函数常返回新元组包装同一份缓存数据）
+    """
+    if a is b:
+        return True
+    return (
+        isinstance(a, tuple) and isinstance(b, tuple) and len(a) == len(b)
+        and all(x is y for x, y in zip(a, b))
+    )
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name):
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = _backends[name] = Backend(name, **config.ADMISSION_BACKENDS[name])
+    return backend
+
+
+def admitted(backend, key, fn):
+    """
+    经 backend 闸门执行 fn：get_backend(backend).call(key, fn)
+    """
+    return get_backend(backend).call(key, fn)
+
+
+def admission_stats():
+    return {name: b.stats() for name, b in list(_backends.items())}
@@ -0,0 +1,249 @@
+# alerting.py
+"""
+ARI 等级变化告警
+
+- 每个周期在 compute_all_ari 之后调用 AlertEngine.process
+- 状态全部在内存中（device, field） -> 已确认等级 / 待确认等级，
+  每周期 O(设备数 × 字段数)，不回查 ClickHouse 历史
+- 去抖：等级变化需连续 N 个周期才确认（升级 / 降级分别配置）
+- 迟滞：ari_1 / ari_2 降级时数值需低于原等级下限一个 margin
+- 一个周期内的告警合并成一批，发送到各 sink
+"""
+import json
+import queue
+import urllib.request
+
+from ari_models import NO_LEVEL, get_model_set
+from config import ALERT_CONFIG
+from device_registry import registry
+
+
+# 等级严重程度（越大越严重）
+LEVEL_RANK = {
+    "无": 0,
+    "IV": 1, "III": 2, "II": 3, "I": 4,
+    "蓝": 1, "黄": 2, "橙": 3, "红": 4,
+}
+
+
+def level_rank(level):
+    """
+    等级严重程度，None / 未知等级按“无”计
+    """
+    return LEVEL_RANK.get(level or NO_LEVEL, 0)
+
+
+def more_severe(a, b):
+    """
+    两个等级中更严重的一个，同级时保留 a
+    """
+    return b if level_rank(b) > level_rank(a) else a
+
+# 等级字段 -> 对应数值字段（用于迟滞判断）
+VALUE_FIELD = {
+    "ari_1_level": "ari_1",
+    "ari_2_level": "ari_2",
+}
+
+
+# =========================
+# Sinks
+# =========================
+
+class FileSink:
+    """
+    追加写 JSON Lines，一条告警一行
+    """
+
+    def __init__(self, path="alerts.jsonl"):
+        self.path = path
+
+    def send(self, alerts):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for a in alerts:
+                f.write(json.dumps(a, ensure_ascii=False) + "\n")
+
+
+class QueueSink:
+    """
+    放入进程内队列（整批一次），供其他线程消费
+    """
+
+    def __init__(self, q=None, maxsize=1000):
+        self.queue = q if q is not None else queue.Queue(maxsize=maxsize)
+
+    def send(self, alerts):
+        try:
+            self.queue.put_nowait(list(alerts))
+        except queue.Full:
+            print(f"[ALERT] queue full, drop {len(alerts)} alerts")
+
+
+class WebhookSink:
+    """
+    POST 整批告警到 webhook；未配置 url 时不发送
+    """
+
+    def __init__(self, url=None, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        if not self.url:
+            return
+
+        body = json.dumps({"alerts": alerts}, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        urllib.request.urlopen(req, timeout=self.timeout).close()
+
+
+SINK_TYPES = {
+    "file": FileSink,
+    "queue": QueueSink,
+    "webhook": WebhookSink,
+}
+
+
+def build_sinks(sink_configs):
+    sinks = []
+    for cfg in sink_configs:
+        cfg = dict(cfg)
+        sink_cls = SINK_TYPES[cfg.pop("type")]
+        sinks.append(sink_cls(**cfg))
+    return sinks
+
+
+# =========================
+# 告警引擎
+# =========================
+
+class AlertEngine:
+
+    def __init__(self, config=None, sinks=None):
+        config = config or ALERT_CONFIG
+        self.fields = list(config["fields"])
+        self.confirm_up = max(1, config.get("confirm_cycles_up", 1))
+        self.confirm_down = max(1, config.get("confirm_cycles_down", 2))
+        self.margin = config.get("ari_value_hysteresis", 0.0)
+        self.alert_on_first_seen = config.get("alert_on_first_seen", False)
+        self.sinks = sinks if sinks is not None else build_sinks(config.get("sinks", []))
+
+        # (device_id, field) -> {"level", "pending", "count"}
+        self._state = {}
+
+    def _held_by_hysteresis(self, field, confirmed, res):
+        """
+        数值仍在原等级下限 - margin 之上时，不视为降级
+        """
+        value_field = VALUE_FIELD.get(field)
+        # 等级下限取自当前模型定义（ari_models.yaml）
+        floor = get_model_set().level_floors(field).get(confirmed)
+        if value_field is None or floor is None:
+            return False
+        v = res.get(value_field)
+        return v is not None and v >= floor - self.margin
+
+    def _step(self, key, field, level, res, cycle=True):
+        st = self._state.get(key)
+        if not cycle:
+            return self._nowcast_step(st, level)
+        if st is None:
+            self._state[key] = {"level": level, "pending": None, "count": 0}
+            if self.alert_on_first_seen and LEVEL_RANK.get(level, 0) > 0:
+                return "无"
+            return None
+
+        confirmed = st["level"]
+        rank_new = LEVEL_RANK.get(level, 0)
+        rank_old = LEVEL_RANK.get(confirmed, 0)
+
+        if level == confirmed or (
+            rank_new < rank_old and self._held_by_hysteresis(field, confirmed, res)
+        ):
+            st["pending"], st["count"] = None, 0
+            return None
+
+        if st["pending"] == level:
+            st["count"] += 1
+        else:
+            st["pending"], st["count"] = level, 1
+
+        need = self.confirm_up if rank_new > rank_old else self.confirm_down
+        if st["count"] < need:
+            return None
+
+        st["level"], st["pending"], st["count"] = level, None, 0
+        return confirmed
+
+    def _nowcast_step(self, st, level):
+        """
+        nowcast 补算不推进去抖计数（计数只按 30 分钟周期累计），
+        也不确认降级；仅在升级无需确认（confirm_cycles_up=1）时立即确认升级
+        """
+        if st is None or self.confirm_up > 1:
+            return None
+        confirmed = st["level"]
+        if LEVEL_RANK.get(level, 0) <= LEVEL_RANK.get(confirmed, 0):
+            return None
+        st["level"], st["pending"], st["count"] = level, None, 0
+        return confirmed
+
+    def process(self, ari_results, ari_time, calc_mode="cycle"):
+        """
+        对比本周期结果与内存状态，返回并发送本周期确认的告警列表
+        :param calc_mode: "cycle" 或 "nowcast"（见 _nowcast_step）
+        """
+        alerts = []
+        ts = ari_time.strftime("%Y-%m-%d %H:%M:%S")
+        cycle = calc_mode == "cycle"
+
+        for device_id, res in ari_results.items():
+            for field in self.fields:
+                level = res.get(field) or "无"
+                previous = self._step((device_id, field), field, level, res, cycle)
+                if previous is None:
+                    continue
+                alerts.append({
+                    "device_id": device_id,
+                    "field": field,
+                    "previous": previous,
+                    "current": level,
+                    "direction": "up" if LEVEL_RANK.get(level, 0) > LEVEL_RANK.get(previous, 0) else "down",
+                    "ari_time": ts,
+                })
+
+        if alerts:
+            self.dispatch(alerts)
+        return alerts
+
+    def dispatch(self, alerts):
+        for sink in self.sinks:
+            try:
+                sink.send(alerts)
+            except Exception as e:
+                print(f"[ALERT] sink {type(sink).__name__} failed: {e}")
+
+    def forget(self, device_id):
+        """
+        设备下线时清理状态
+        """
+        for key in [k for k in self._state if k[0] == device_id]:
+            del self._state[key]
+
+
+_engine = None
+
+
+def get_alert_engine():
+    global _engine
+    if _engine is None:
+        _engine = AlertEngine()
+        registry.add_listener(
+            lambda added, removed, snapshot: [_engine.forget(d) for d in removed]
+        )
+    return _engine
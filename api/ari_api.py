@@ -1,15 +1,63 @@
 # api/ari_api.py
-from flask import Blueprint, jsonify, request
+from datetime import date, datetime, timedelta
 
+from flask import Blueprint, request
+
+from admission import admitted
+from ari_models import get_model_set
 from fetch_data import (
-    fetch_sensor_data,
-    fetch_ari_last_valid_n
+    fetch_ari_last_valid_n,
+    fetch_quality_summary,
+    get_device_freshness,
+)
+from ari_stats import (
+    fetch_daily_stats,
+    fetch_season_stats,
+    merge,
+    new_stats,
+    season_of,
 )
-from compute_ari import compute_all_ari
+from data_quality import MISSING_RATIO_FLAG
+from device_registry import registry
+from regions import aggregate_region, compute_regions, resolve_members
+from stations import get_station_index
+from wind_stats import wind_fields
+from scenario import ScenarioError, get_base_inputs, run_scenarios
+from snapshot import get_current_ari
+from broadcaster import ari_broadcaster
+from api.encoding import encoded_response
 
 ari_bp = Blueprint("ari", __name__)
 
 
+def _current_ari():
+    """
+    当前 ARI 经 ari_compute 闸门：并发请求合并为一次，过载时返回上次结果
+    :return: (sensor_data, ari_now, stale_age)
+    """
+    (sensor_data, ari_now), stale_age = admitted("ari_compute", "current", get_current_ari)
+    return sensor_data, ari_now, stale_age
+
+
+def _oldest(*ages):
+    ages = [a for a in ages if a is not None]
+    return max(ages) if ages else None
+
+
+def _anchor_key(sensor_data, device_id=None):
+    """
+    ETag 标识：设备锚点时间 + 模型版本 + 注册表内容签名（与 snapshot.anchor_key 一致，
+    模型热更新 / 注册表变化后同一锚点的结果会重算，ETag 随之变化）
+    """
+    if device_id:
+        anchors = [device_id, sensor_data.get(device_id, {}).get("anchor_time")]
+    else:
+        anchors = sorted(
+            (did, d.get("anchor_time")) for did, d in sensor_data.items()
+        )
+    return [anchors, get_model_set().version, registry.snapshot().signature]
+
+
 @ari_bp.route("/ari", methods=["GET"])
 def get_ari():
     """
@@ -19,31 +67,38 @@ def get_ari():
     返回：
     - 不带参数：所有设备当前 ARI
     - 带 device_id：该设备 最近7条有效ARI（字符串）
+
+    支持 Accept / ?format= 选择 json / msgpack / arrow（仅单设备时间序列），
+    Accept-Encoding 选择 br / gzip，If-None-Match 命中返回 304
     """
 
     device_id = request.args.get("device_id")
 
     # =========================
-    # 1️⃣ 计算当前 ARI（你原有逻辑）
+    # 1️⃣ 计算当前 ARI（同一锚点多请求 / 多进程只算一次）
     # =========================
-    sensor_data = fetch_sensor_data()
-    ari_now = compute_all_ari(sensor_data)
+    sensor_data, ari_now, stale_age = _current_ari()
+    if stale_age is None:
+        ari_broadcaster.publish(ari_now, datetime.now(), new_cycle=False)
 
     # =========================
     # 2️⃣ 单设备：历史 + 当前
     # =========================
     if device_id:
         if device_id not in ari_now:
-            return jsonify({
+            return encoded_response({
                 "success": False,
                 "msg": f"device_id {device_id} not found"
-            }), 200
+            }, 200)
 
         # 最近 7 条【有值】ARI（字符串）
-        history = fetch_ari_last_valid_n(
-            device_id=device_id,
-            n=6
+        history, history_stale = admitted(
+            "clickhouse",
+            ("ari_history", device_id),
+            lambda: fetch_ari_last_valid_n(device_id=device_id, n=6),
         )
+        # 合并 / 旧结果共享同一对象，追加前复制
+        history = {k: list(v) for k, v in history.items()}
 
         # 当前值（统一转字符串，空的给 ""）
         current = ari_now.get(device_id, {})
@@ -52,16 +107,264 @@ def get_ari():
             v = current.get(k)
             history[k].append("" if v is None else str(v))
 
-        return jsonify({
+        return encoded_response({
             "success": True,
             "device_id": device_id,
             "data": history
-        }), 200
+        }, 200, etag_parts=_anchor_key(sensor_data, device_id), table=history,
+            stale_age=_oldest(stale_age, history_stale))
 
     # =========================
     # 3️⃣ 不带参数：当前全量
     # =========================
-    return jsonify({
+    return encoded_response({
         "success": True,
         "data": ari_now
-    }), 200
\ No newline at end of file
+    }, 200, etag_parts=_anchor_key(sensor_data), stale_age=stale_age)
+
+
+@ari_bp.route("/ari/quality", methods=["GET"])
+def get_ari_quality():
+    """
+    GET /api/ari/quality
+    GET /api/ari/quality?device_id=xxx
+
+    返回最近一次入库结果的数据质量（缺失率 / 漂移数 / 回溯时长 / 数据陈旧度），
+    以及全部设备按字段状态的计数
+    """
+    device_id = request.args.get("device_id")
+    summary, stale_age = admitted(
+        "clickhouse",
+        ("ari_quality", device_id),
+        lambda: fetch_quality_summary([device_id] if device_id else None),
+    )
+
+    status_count = {}
+    for item in summary.values():
+        fields = (item.get("data_quality") or {}).get("fields", {})
+        for name, info in fields.items():
+            status = info.get("status") or (
+                "missing_ratio_high" if info.get("missing_ratio", 0) > MISSING_RATIO_FLAG else "ok"
+            )
+            per_field = status_count.setdefault(name, {})
+            per_field[status] = per_field.get(status, 0) + 1
+
+    return encoded_response({
+        "success": True,
+        "data": summary,
+        "status_count": status_count,
+    }, 200, etag_parts=sorted((k, v["ari_time"]) for k, v in summary.items()), stale_age=stale_age)
+
+
+@ari_bp.route("/ari/scenario", methods=["POST"])
+def post_ari_scenario():
+    """
+    POST /api/ari/scenario
+    {
+        "grid": {"new_snow_24h": [0.1, 0.3], "wind_speed": [8, 10]},
+        "device_ids": ["..."],          # 可选，默认全部站点
+        "inputs": {"device_id": {...}}   # 可选，自定义基准输入
+    }
+
+    返回每个站点及全部站点在所有情景下的等级分布
+    """
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return encoded_response({
+            "success": False,
+            "msg": "request body must be a JSON object"
+        }, 400)
+
+    base_inputs, stale_age = body.get("inputs"), None
+    try:
+        if base_inputs is None:
+            base_inputs, stale_age = get_base_inputs()
+        result = run_scenarios(
+            body.get("grid"),
+            base_inputs=base_inputs,
+            device_ids=body.get("device_ids"),
+        )
+    except ScenarioError as e:
+        return encoded_response({
+            "success": False,
+            "msg": str(e)
+        }, 400)
+
+    return encoded_response({
+        "success": True,
+        "data": result
+    }, 200, stale_age=stale_age)
+
+
+@ari_bp.route("/ari/freshness", methods=["GET"])
+def get_ari_freshness():
+    """
+    GET /api/ari/freshness
+
+    设备新鲜度索引：各设备最新分钟及距当前的分钟数（null 表示停报）
+    """
+    now = datetime.now()
+    index, stale_age = admitted("clickhouse", ("ari_freshness",), get_device_freshness)
+    data = {
+        device_id: {
+            "latest": latest.strftime("%Y-%m-%d %H:%M:%S") if latest else None,
+            "lag_min": round((now - latest).total_seconds() / 60.0, 1) if latest else None,
+        }
+        for device_id, latest in index.items()
+    }
+    return encoded_response({
+        "success": True,
+        "data": data
+    }, 200, stale_age=stale_age)
+
+
+@ari_bp.route("/ari/wind", methods=["GET"])
+def get_ari_wind():
+    """
+    GET /api/ari/wind
+    GET /api/ari/wind?device_id=xxx
+
+    当前锚点的 24h 风吹雪指标（阵风最大值、持续大风时长、主导风向、输运量代理），
+    与 ARI 模型使用的输入一致
+    """
+    device_id = request.args.get("device_id")
+    sensor_data, _, stale_age = _current_ari()
+    if device_id and device_id not in sensor_data:
+        return encoded_response({
+            "success": False,
+            "msg": f"device_id {device_id} not found"
+        }, 200)
+
+    fields = wind_fields()
+    data = {
+        did: {"anchor_time": d.get("anchor_time"), **{f: d.get(f) for f in fields}}
+        for did, d in sensor_data.items()
+        if not device_id or did == device_id
+    }
+    return encoded_response({
+        "success": True,
+        "data": data
+    }, 200, etag_parts=_anchor_key(sensor_data, device_id), stale_age=stale_age)
+
+
+@ari_bp.route("/ari/regions", methods=["GET"])
+def get_ari_regions():
+    """
+    GET /api/ari/regions
+    GET /api/ari/regions?region=xxx
+    GET /api/ari/regions?lat=31.2&lon=103.5&radius_km=15&method=elevation_weighted
+
+    区域（多站点）ARI：按区域定义合成当前成员站点结果；
+    给出 lat / lon / radius_km 时按空间索引临时圈定成员
+    """
+    sensor_data, ari_now, stale_age = _current_ari()
+    snapshot = registry.snapshot()
+    name = request.args.get("region")
+
+    try:
+        if request.args.get("lat") is not None:
+            region = {
+                "center": [float(request.args["lat"]), float(request.args["lon"])],
+                "radius_km": float(request.args.get("radius_km", 10)),
+                "method": request.args.get("method"),
+            }
+            meta, index = get_station_index(snapshot)
+            members = resolve_members(region, snapshot, index)
+            data = {"adhoc": aggregate_region("adhoc", region, members, ari_now, meta)}
+        elif name is not None and name not in snapshot.regions:
+            return encoded_response({
+                "success": False,
+                "msg": f"region {name} not found"
+            }, 200)
+        else:
+            data = compute_regions(ari_now, snapshot, names=[name] if name else None)
+    except (KeyError, ValueError) as e:
+        return encoded_response({
+            "success": False,
+            "msg": f"invalid region query: {e}"
+        }, 400)
+
+    return encoded_response({
+        "success": True,
+        "data": data
+    }, 200, etag_parts=[dict(request.args), *_anchor_key(sensor_data)], stale_age=stale_age)
+
+
+def _format_stats(row):
+    return {
+        k: (v.strftime("%Y-%m-%d %H:%M:%S") if isinstance(v, datetime)
+            else v.isoformat() if isinstance(v, date) else v)
+        for k, v in row.items()
+    }
+
+
+def _stats_device_ids():
+    device_id = request.args.get("device_id")
+    return [device_id] if device_id else registry.snapshot().device_ids
+
+
+@ari_bp.route("/ari/stats/daily", methods=["GET"])
+def get_ari_stats_daily():
+    """
+    GET /api/ari/stats/daily?days=7
+    GET /api/ari/stats/daily?device_id=xxx&start=2024-12-01&end=2024-12-31
+
+    预计算的日统计（ari_1 / ari_2 最大值、各等级小时数、阈值触发次数），
+    summary 为区间内每设备合计（如“本周最高等级”）
+    """
+    try:
+        end = request.args.get("end")
+        end = date.fromisoformat(end) if end else date.today()
+        start = request.args.get("start")
+        start = date.fromisoformat(start) if start else end - timedelta(days=int(request.args.get("days", 7)) - 1)
+    except ValueError as e:
+        return encoded_response({
+            "success": False,
+            "msg": str(e)
+        }, 400)
+
+    device_ids = _stats_device_ids()
+    rows, stale_age = admitted(
+        "clickhouse",
+        ("ari_stats_daily", tuple(device_ids), start, end),
+        lambda: fetch_daily_stats(device_ids, start, end),
+    )
+
+    summary = {}
+    for row in rows:
+        total = summary.get(row["device_id"])
+        if total is None:
+            total = summary[row["device_id"]] = new_stats()
+        merge(total, row)
+
+    return encoded_response({
+        "success": True,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "data": [_format_stats(r) for r in rows],
+        "summary": {k: _format_stats(v) for k, v in summary.items()},
+    }, 200, etag_parts=sorted((r["device_id"], str(r["day"]), str(r["last_ari_time"])) for r in rows),
+        stale_age=stale_age)
+
+
+@ari_bp.route("/ari/stats/season", methods=["GET"])
+def get_ari_stats_season():
+    """
+    GET /api/ari/stats/season
+    GET /api/ari/stats/season?device_id=xxx&season=2024-2025
+
+    预计算的雪季统计，season 缺省为当前雪季
+    """
+    season = request.args.get("season") or season_of(date.today())
+    device_ids = _stats_device_ids()
+    rows, stale_age = admitted(
+        "clickhouse",
+        ("ari_stats_season", tuple(device_ids), season),
+        lambda: fetch_season_stats(device_ids, season),
+    )
+
+    return encoded_response({
+        "success": True,
+        "season": season,
+        "data": {r["device_id"]: _format_stats(r) for r in rows},
+    }, 200, etag_parts=sorted((r["device_id"], str(r["last_ari_time"])) for r in rows), stale_age=stale_age)
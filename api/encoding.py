@@ -0,0 +1,229 @@
+# api/encoding.py
+"""
+API 响应编码：内容协商 + 压缩 + ETag
+
+- 序列化格式（Accept 或 ?format=）：
+    json     -> application/json（有 orjson 时用 orjson）
+    msgpack  -> application/msgpack（需要 msgpack）
+    arrow    -> application/vnd.apache.arrow.stream（需要 pyarrow，仅列式时间序列）
+- 压缩（Accept-Encoding）：br（需要 brotli）> gzip > identity
+- ETag：由调用方传入锚点时间等标识，If-None-Match 命中直接返回 304；
+  弱 ETag（W/）：同一内容的 br / gzip / identity 编码共用一个 ETag
+- 准入控制兜底的旧结果：响应体带 stale_age_sec，不带 ETag；被拒绝时 503 + Retry-After
+"""
+import gzip
+import hashlib
+import importlib.util
+import json
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+# pyarrow 导入耗时较长，只在真正输出 arrow 时导入
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None  # 可选依赖
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/msgpack"
+MEDIA_ARROW = "application/vnd.apache.arrow.stream"
+
+FORMAT_ALIASES = {
+    "json": MEDIA_JSON,
+    "msgpack": MEDIA_MSGPACK,
+    "arrow": MEDIA_ARROW,
+}
+
+# 小于该字节数不压缩（压缩头开销大于收益）
+MIN_COMPRESS_BYTES = 512
+
+
+# =========================
+# 协商
+# =========================
+
+def _available_media_types(arrow_ok):
+    types = [MEDIA_JSON]
+    if msgpack is not None:
+        types += [MEDIA_MSGPACK, "application/x-msgpack"]
+    if HAS_PYARROW and arrow_ok:
+        types.append(MEDIA_ARROW)
+    return types
+
+
+def negotiate_media_type(arrow_ok=False):
+    """
+    返回本次响应使用的 media type；客户端要求的格式不可用时返回 None
+    """
+    fmt = request.args.get("format")
+    available = _available_media_types(arrow_ok)
+
+    if fmt:
+        media = FORMAT_ALIASES.get(fmt.lower())
+        return media if media in available else None
+
+    if not request.accept_mimetypes:
+        return MEDIA_JSON
+
+    media = request.accept_mimetypes.best_match(available, default=None)
+    if media == "application/x-msgpack":
+        media = MEDIA_MSGPACK
+    return media
+
+
+def negotiate_content_encoding():
+    encodings = request.accept_encodings
+    if brotli is not None and encodings["br"]:
+        return "br"
+    if encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def make_etag(*parts):
+    """
+    根据锚点时间等标识生成 ETag（序列化格式由 encoded_response 自动拼入）
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24]
+
+
+# =========================
+# 序列化
+# =========================
+
+def _default(v):
+    # numpy 标量等：有 item() 的转成 Python 原生类型，其余转字符串
+    item = getattr(v, "item", None)
+    return item() if callable(item) else str(v)
+
+
+def _dumps_json(payload):
+    if orjson is not None:
+        return orjson.dumps(
+            payload,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+    return json.dumps(payload, ensure_ascii=False, default=_default).encode("utf-8")
+
+
+def _dumps_msgpack(payload):
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+def _pad_columns(table):
+    """
+    各列补齐到同一长度（在前部补 None，最新值对齐在末尾）
+    如 fetch_ari_last_valid_n 每个 ari_i 单独取最近 N 条有值记录，条数可能不同
+    """
+    n = max((len(v) for v in table.values()), default=0)
+    return {k: [None] * (n - len(v)) + list(v) for k, v in table.items()}
+
+
+def _dumps_arrow(table, meta):
+    """
+    table: {列名: [值...]}，列长不同时在前部补 None
+    meta:  其余响应字段，写入 schema metadata
+    """
+    import pyarrow as pa
+
+    arrow_table = pa.Table.from_pydict(_pad_columns(table)).replace_schema_metadata({
+        k: json.dumps(v, ensure_ascii=False, default=str) for k, v in meta.items()
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue().to_pybytes()
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+# =========================
+# 对外入口
+# =========================
+
+def encoded_response(payload, status=200, etag_parts=None, table=None, stale_age=None):
+    """
+    按请求头协商格式与压缩，构造 Flask Response
+
+    :param payload: 常规响应体（dict）
+    :param etag_parts: 生成 ETag 的标识（通常是锚点时间），None 表示不带 ETag
+    :param table: 可选的列式数据（时间序列），提供时才允许 Arrow 输出
+    :param stale_age: 过载时返回的旧结果年龄（秒），None 表示新结果
+    """
+    if stale_age is not None:
+        payload = {**payload, "stale_age_sec": stale_age}
+        etag_parts = None
+
+    media = negotiate_media_type(arrow_ok=table is not None)
+    if media is None:
+        resp = Response(
+            _dumps_json({"success": False, "msg": "requested format not available"}),
+            status=406,
+            mimetype=MEDIA_JSON,
+        )
+        resp.vary.update(("Accept", "Accept-Encoding"))
+        return resp
+
+    etag = None
+    if etag_parts is not None and status == 200:
+        etag = make_etag(media, *etag_parts)
+        if request.if_none_match.contains_weak(etag):
+            resp = Response(status=304)
+            resp.set_etag(etag, weak=True)
+            resp.vary.update(("Accept", "Accept-Encoding"))
+            return resp
+
+    if media == MEDIA_MSGPACK:
+        body = _dumps_msgpack(payload)
+    elif media == MEDIA_ARROW:
+        meta = {k: v for k, v in payload.items() if k != "data"}
+        body = _dumps_arrow(table, meta)
+    else:
+        body = _dumps_json(payload)
+
+    resp = Response(status=status, mimetype=media)
+
+    encoding = negotiate_content_encoding() if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = _compress(body, encoding)
+        resp.headers["Content-Encoding"] = encoding
+
+    resp.set_data(body)
+    resp.vary.update(("Accept", "Accept-Encoding"))
+    if etag:
+        resp.set_etag(etag, weak=True)
+    return resp
+
+
+def overloaded_response(e):
+    """
+    admission.Overloaded 的统一响应（在 app 上注册为错误处理）
+    """
+    resp = Response(
+        _dumps_json({"success": False, "msg": str(e), "backend": e.backend, "reason": e.reason}),
+        status=503,
+        mimetype=MEDIA_JSON,
+    )
+    resp.headers["Retry-After"] = str(e.retry_after_sec)
+    return resp
@@ -0,0 +1,93 @@
+# api/health_api.py
+import time
+from datetime import datetime
+
+from flask import Blueprint
+
+import config
+from cycle_budget import cycle_lag_minutes, load_cycle_status
+from fetch_data import get_ch_client
+from api.encoding import encoded_response
+
+health_bp = Blueprint("health", __name__)
+
+
+def _cycle_info(now):
+    status = load_cycle_status()
+    return {
+        "cycle_lag_min": cycle_lag_minutes(status, now),
+        "last_success": status.get("last_success"),
+        "last_duration_sec": status.get("last_duration_sec"),
+        "last_error": status.get("last_error"),
+        "consecutive_failures": status.get("consecutive_failures", 0),
+        "degrade_level": status.get("degrade_level"),
+        "degraded_devices": status.get("degraded_devices"),
+        "budget_sec": status.get("budget_sec"),
+        "backend_latency": status.get("backend_latency"),
+    }
+
+
+def ping_backend(timeout_sec=None):
+    """
+    ClickHouse 探测：SELECT 1 的往返耗时
+    :return: (ok, latency_ms, error)
+    """
+    timeout_sec = config.READY_BACKEND_TIMEOUT_SEC if timeout_sec is None else timeout_sec
+    t0 = time.monotonic()
+    try:
+        client = get_ch_client(connect_timeout=timeout_sec, send_receive_timeout=timeout_sec)
+        try:
+            client.execute("SELECT 1")
+        finally:
+            client.disconnect()
+    except Exception as e:
+        return False, round((time.monotonic() - t0) * 1000, 1), str(e)
+    return True, round((time.monotonic() - t0) * 1000, 1), None
+
+
+@health_bp.route("/healthz", methods=["GET"])
+def get_healthz():
+    """
+    GET /healthz
+
+    存活探针：进程可响应即 200；附带调度周期滞后、上次成功时间、上周期后端耗时
+    """
+    now = datetime.now()
+    return encoded_response({
+        "status": "ok",
+        "time": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "cycle": _cycle_info(now),
+    }, 200)
+
+
+@health_bp.route("/readyz", methods=["GET"])
+def get_readyz():
+    """
+    GET /readyz
+
+    就绪探针：ClickHouse 可达，距上次成功周期不超过 READY_MAX_CYCLE_LAG_MIN，
+    连续失败周期数不超过 READY_MAX_CONSECUTIVE_FAILURES，且不是“只失败过、从未成功”
+    （尚无周期记录时只看后端）；不满足返回 503 及原因
+    """
+    now = datetime.now()
+    cycle = _cycle_info(now)
+    ok, latency_ms, error = ping_backend()
+
+    reasons = []
+    if not ok:
+        reasons.append(f"backend unreachable: {error}")
+    lag = cycle["cycle_lag_min"]
+    if lag is not None and lag > config.READY_MAX_CYCLE_LAG_MIN:
+        reasons.append(f"cycle lag {lag} min > {config.READY_MAX_CYCLE_LAG_MIN} min")
+    failures = cycle["consecutive_failures"]
+    if failures > config.READY_MAX_CONSECUTIVE_FAILURES:
+        reasons.append(f"{failures} consecutive failed cycles: {cycle['last_error']}")
+    elif cycle["last_error"] and not cycle["last_success"]:
+        reasons.append(f"no successful cycle yet: {cycle['last_error']}")
+
+    return encoded_response({
+        "status": "ready" if not reasons else "not_ready",
+        "reasons": reasons,
+        "backend": {"ok": ok, "latency_ms": latency_ms},
+        "cycle": cycle,
+    }, 200 if not reasons else 503)
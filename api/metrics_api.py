@@ -0,0 +1,27 @@
+# api/metrics_api.py
+from flask import Blueprint
+
+from admission import admission_stats
+from fetch_sensor_history import history_cache
+from query_cache import query_cache
+from api.encoding import encoded_response
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    GET /api/metrics
+
+    进程内计数：查询缓存命中 / 未命中 / 淘汰、占用内存；
+    各后端准入控制的在途 / 排队数、排队等待分位数、拒绝 / 合并 / 旧结果次数
+    """
+    return encoded_response({
+        "success": True,
+        "data": {
+            "query_cache": query_cache.stats(),
+            "sensor_history_cache": history_cache.stats(),
+            "admission": admission_stats(),
+        }
+    }, 200)
@@ -1,7 +1,19 @@
 # api/sensor_api.py
+from datetime import datetime, timedelta
+
 from flask import Blueprint, request, jsonify
-from config import DEVICE_IDS
+import config
+from admission import admitted
+from device_registry import registry
 from fetch_sensor_realtime import fetch_realtime_sensor_data
+from fetch_sensor_history import (
+    SENSOR_HISTORY_DEFAULT_POINTS,
+    SENSOR_HISTORY_MAX_FIELDS,
+    HistoryQueryError,
+    fetch_sensor_history,
+)
+from time_utils import to_naive_local
+from api.encoding import encoded_response
 
 sensor_api = Blueprint("sensor_api", __name__)
 
@@ -16,15 +28,15 @@ def get_sensor_data():
             "msg": "device_id required"
         }), 400
 
-    if device_id not in DEVICE_IDS:
+    if device_id not in registry.snapshot():
         return jsonify({
             "success": False,
             "msg": "device_id not allowed"
         }), 403
 
-    data = fetch_realtime_sensor_data(device_id)
+    data, stale_age = admitted("clickhouse", ("sensor", device_id), lambda: fetch_realtime_sensor_data(device_id))
 
-    return jsonify({
+    return encoded_response({
         "success": True,
         "device_id": device_id,
         "data": {
@@ -41,4 +53,73 @@ def get_sensor_data():
             "rainfall": data["rainfall"],
             "update_time": data["update_time"]  # 新增：最近更新时间
         }
-    })
\ No newline at end of file
+    }, etag_parts=[device_id, data["update_time"]] if data["update_time"] else None, stale_age=stale_age)
+
+
+@sensor_api.route("/sensor/history", methods=["GET"])
+def get_sensor_history():
+    """
+    GET /api/sensor/history?device_id=xxx&field=snow_depth,wind_speed
+        &start=2024-01-01T00:00:00&end=2024-01-08T00:00:00&points=1000&method=minmax
+
+    原始传感器曲线，服务端按时间分桶降采样：
+    - method=minmax（默认）：每桶 min / max / avg / count，保留尖峰
+    - method=avg：每桶均值
+    - method=lttb：LTTB 保形降采样
+    start / end 缺省为最近 72 小时；支持 ?format=arrow（单字段）
+    """
+    device_id = request.args.get("device_id")
+    fields = list(dict.fromkeys(f for f in (request.args.get("field") or "snow_depth").split(",") if f))
+
+    if not device_id:
+        return jsonify({
+            "success": False,
+            "msg": "device_id required"
+        }), 400
+
+    if device_id not in registry.snapshot():
+        return jsonify({
+            "success": False,
+            "msg": "device_id not allowed"
+        }), 403
+
+    if len(fields) > SENSOR_HISTORY_MAX_FIELDS:
+        return jsonify({
+            "success": False,
+            "msg": f"at most {SENSOR_HISTORY_MAX_FIELDS} fields per request"
+        }), 400
+
+    try:
+        # 带时区的时间（如 ...Z）转为本地 naive 时间，与库中时间一致
+        end = request.args.get("end")
+        end = to_naive_local(datetime.fromisoformat(end)) if end else datetime.now()
+        start = request.args.get("start")
+        start = to_naive_local(datetime.fromisoformat(start)) if start else end - timedelta(hours=72)
+        points = int(request.args.get("points", SENSOR_HISTORY_DEFAULT_POINTS))
+        method = request.args.get("method", "minmax")
+
+        # 合并 key 用原始查询参数：缺省 end 的并发请求共享同一次查询
+        data, stale_age = admitted(
+            "clickhouse",
+            ("sensor_history", device_id, tuple(sorted(request.args.items()))),
+            lambda: {
+                field: fetch_sensor_history(device_id, field, start, end, points=points, method=method)
+                for field in fields
+            },
+        )
+    except (HistoryQueryError, ValueError) as e:
+        return jsonify({
+            "success": False,
+            "msg": str(e)
+        }), 400
+
+    # 只有不再变化的历史区间才给 ETag
+    immutable = request.args.get("end") is not None and end <= datetime.now() - timedelta(minutes=config.DATA_DELAY_GUARD_MIN)
+    etag_parts = [device_id, sorted(fields), method, points, str(start), str(end)] if immutable else None
+
+    return encoded_response({
+        "success": True,
+        "device_id": device_id,
+        "data": data
+    }, etag_parts=etag_parts, table=data[fields[0]]["series"] if len(fields) == 1 else None,
+        stale_age=stale_age)
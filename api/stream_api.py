@@ -0,0 +1,78 @@
+# api/stream_api.py
+import json
+
+from flask import Blueprint, Response, request, stream_with_context
+
+from broadcaster import ari_broadcaster
+from api.encoding import encoded_response
+
+stream_bp = Blueprint("ari_stream", __name__)
+
+# SSE 心跳间隔（秒），防止代理断开空闲连接
+SSE_HEARTBEAT_SEC = 15
+LONG_POLL_MAX_SEC = 55
+
+
+def _sse(event):
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+@stream_bp.route("/ari/stream", methods=["GET"])
+def ari_stream():
+    """
+    GET /api/ari/stream  (text/event-stream)
+
+    首次连接推送一次全量快照；之后只推送每个周期的变化设备。
+    断线重连时浏览器会带 Last-Event-ID，从该序号之后续传。
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        last_seq = int(last_id) if last_id is not None else None
+    except ValueError:
+        last_seq = None
+
+    def gen():
+        seq = last_seq
+        if seq is None:
+            snap = ari_broadcaster.snapshot()
+            seq = snap["seq"]
+            yield _sse(snap)
+
+        while True:
+            events = ari_broadcaster.events_since(seq, timeout=SSE_HEARTBEAT_SEC)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for e in events:
+                yield _sse(e)
+                seq = e["seq"]
+
+    resp = Response(stream_with_context(gen()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@stream_bp.route("/ari/poll", methods=["GET"])
+def ari_poll():
+    """
+    GET /api/ari/poll?since=<seq>&timeout=<秒>
+
+    长轮询：有新事件立即返回，否则最多挂起 timeout 秒后返回空列表。
+    不带 since 时直接返回全量快照。
+    """
+    since = request.args.get("since", type=int)
+    timeout = min(request.args.get("timeout", 25, type=float), LONG_POLL_MAX_SEC)
+
+    if since is None:
+        events = [ari_broadcaster.snapshot()]
+    else:
+        events = ari_broadcaster.events_since(since, timeout=timeout)
+
+    # 以本次返回的最后一条事件为游标（返回后新发布的事件留给下一次轮询）
+    return encoded_response({
+        "success": True,
+        "seq": events[-1]["seq"] if events else since,
+        "events": events,
+    })
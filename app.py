@@ -1,7 +1,16 @@
 # app.py
+import logging
+import threading
+
 from flask import Flask
 from api.ari_api import ari_bp
 from api.sensor_api import sensor_api
+from api.stream_api import stream_bp
+from api.metrics_api import metrics_bp
+from api.health_api import health_bp
+from api.encoding import overloaded_response
+from admission import Overloaded
+from config import ARI_EMBED_SCHEDULER
 
 def create_app():
     """
@@ -12,8 +21,30 @@ def create_app():
     # 注册 ARI Blueprint
     app.register_blueprint(ari_bp, url_prefix='/api')
     app.register_blueprint(sensor_api, url_prefix="/api")
+    app.register_blueprint(stream_bp, url_prefix="/api")
+    app.register_blueprint(metrics_bp, url_prefix="/api")
+
+    # 探针挂在根路径（编排系统约定 /healthz /readyz）
+    app.register_blueprint(health_bp)
+
+    # 准入控制拒绝且无旧结果可用：快速 503
+    app.register_error_handler(Overloaded, overloaded_response)
     return app
 
+
+def start_embedded_scheduler():
+    """
+    在 API 进程内后台运行调度器，周期结果经进程内广播器推送
+    """
+    from main import scheduler_loop
+
+    t = threading.Thread(target=scheduler_loop, name="ari-scheduler", daemon=True)
+    t.start()
+    return t
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     app = create_app()
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    if ARI_EMBED_SCHEDULER:
+        start_embedded_scheduler()
+    app.run(host='0.0.0.0', port=8000, debug=True, threaded=True, use_reloader=not ARI_EMBED_SCHEDULER)
@@ -0,0 +1,405 @@
+# archive.py
+"""
+传感器 / ARI 历史的 Parquet 归档（按 设备 / 天 分区）与读取
+
+目录：ARCHIVE_DIR/<数据集>/device_id=<id>/date=<YYYY-MM-DD>/part-0.parquet
+      （hive 分区，pyarrow.dataset / DuckDB / Spark 可直接读取）
+manifest.json：各数据集每设备已导出到的日（水位线）及每个分区的行数 / 时间范围 / 字节数
+
+- 只导出早于 今天 - ARCHIVE_LAG_DAYS 的完整日，分区写出后不再变化；
+  每导出一天即更新 manifest，中断后从水位线续传
+- 传感器数据按置信区间（注册表快照中含设备覆盖项）附加 <列>_qc：ok / missing / out_of_range
+- ArchiveReader：ari_stats 回填（--from-archive）、bench_grid 基准直接读文件，不占用线上库
+
+用法：python archive.py [--dataset sensor|ari] [--days N] [--loop]
+pyarrow 经 lazy_module 在读写时才导入
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import config
+from device_registry import registry
+from fetch_data import get_ch_client, iter_blocks
+from fetch_sensor_realtime import FIELD_MAPPING
+from lazy_import import lazy_module
+from minute_grid import GRID_FIELDS, build_minute_grid, grid_span
+from write_result import COLUMNS as ARI_COLUMNS, ensure_schema
+
+# pyarrow（可选依赖）在首次读写分区时导入；manifest / 导出计划不依赖它
+pa = lazy_module("pyarrow")
+pc = lazy_module("pyarrow.compute")
+pq = lazy_module("pyarrow.parquet")
+
+MANIFEST_FILE = "manifest.json"
+
+DATASETS = {
+    "sensor": {
+        "table": "snow_device_data",
+        "time": "create_time_min",
+        "columns": list(FIELD_MAPPING.values()),
+    },
+    "ari": {
+        "table": "snow_device_ari",
+        "time": "ari_time",
+        "columns": [c for c in ARI_COLUMNS if c not in ("device_id", "ari_time")],
+    },
+}
+
+QC_OK = "ok"
+QC_MISSING = "missing"
+QC_OUT_OF_RANGE = "out_of_range"
+
+
+def archive_root(root=None):
+    path = root or config.ARCHIVE_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def partition_path(root, dataset, device_id, day):
+    return os.path.join(root, dataset, f"device_id={device_id}", f"date={day.isoformat()}", "part-0.parquet")
+
+
+def _to_float(v):
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def qc_flag(value, rule):
+    if value is None or value != value:
+        return QC_MISSING
+    if rule and not rule["min"] <= value <= rule["max"]:
+        return QC_OUT_OF_RANGE
+    return QC_OK
+
+
+# =========================
+# manifest
+# =========================
+
+class Manifest:
+
+    def __init__(self, root):
+        self.path = os.path.join(root, MANIFEST_FILE)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {"format": 1, "datasets": {}}
+
+    def _dataset(self, dataset):
+        return self.data["datasets"].setdefault(dataset, {"watermarks": {}, "partitions": {}})
+
+    def watermark(self, dataset, device_id):
+        """
+        :return: 该设备已导出到的最后一天（含），None 表示尚未导出
+        """
+        day = self._dataset(dataset)["watermarks"].get(device_id)
+        return date.fromisoformat(day) if day else None
+
+    def record(self, dataset, device_id, day, info=None):
+        ds = self._dataset(dataset)
+        ds["watermarks"][device_id] = day.isoformat()
+        if info is not None:
+            ds["partitions"][f"{device_id}/{day.isoformat()}"] = info
+
+    def partitions(self, dataset, device_ids=None, start_day=None, end_day=None):
+        """
+        :return: [(device_id, day, info)]，按设备、日期排序
+        """
+        out = []
+        for key, info in self._dataset(dataset)["partitions"].items():
+            device_id, day = key.split("/")
+            day = date.fromisoformat(day)
+            if device_ids is not None and device_id not in device_ids:
+                continue
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            out.append((device_id, day, info))
+        return sorted(out, key=lambda x: (x[0], x[1]))
+
+    def coverage_end(self, dataset, device_ids):
+        """
+        所有设备都已导出的最后一天，任一设备未导出返回 None
+        """
+        marks = [self.watermark(dataset, d) for d in device_ids]
+        if not marks or any(m is None for m in marks):
+            return None
+        return min(marks)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.data["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+# =========================
+# 导出
+# =========================
+
+def partition_columns(dataset, rows, ranges=None):
+    """
+    :param rows: [(时间, 列1, 列2, ...)]，列顺序同 DATASETS[dataset]["columns"]
+    :return: {列名: 值列表}（传感器值转 float 并附加 <列>_qc）
+    """
+    spec = DATASETS[dataset]
+    cols = list(zip(*rows)) if rows else [()] * (len(spec["columns"]) + 1)
+    out = {spec["time"]: list(cols[0])}
+    if dataset != "sensor":
+        out.update((name, [None if v is None else str(v) for v in values])
+                   for name, values in zip(spec["columns"], cols[1:]))
+        return out
+
+    ranges = ranges if ranges is not None else config.SENSOR_CONFIDENCE_RANGE
+    for name, raw in zip(spec["columns"], cols[1:]):
+        values = [_to_float(v) for v in raw]
+        out[name] = values
+        out[f"{name}_qc"] = [qc_flag(v, ranges.get(name)) for v in values]
+    return out
+
+
+def _schema(dataset):
+    spec = DATASETS[dataset]
+    fields = [pa.field(spec["time"], pa.timestamp("s"))]
+    for name in spec["columns"]:
+        if dataset == "sensor":
+            fields += [pa.field(name, pa.float64()), pa.field(f"{name}_qc", pa.dictionary(pa.int8(), pa.string()))]
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def write_partition(path, dataset, columns):
+    schema = _schema(dataset)
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    table = pa.Table.from_arrays(arrays, schema=schema)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp, compression=config.ARCHIVE_COMPRESSION)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def _first_days(client, dataset, device_ids):
+    spec = DATASETS[dataset]
+    rows = client.execute(
+        f"""
+        SELECT device_id, toDate(min({spec["time"]}))
+        FROM {config.CLICKHOUSE_DB}.{spec["table"]}
+        WHERE device_id IN %(device_ids)s
+        GROUP BY device_id
+        """,
+        {"device_ids": list(device_ids)},
+    )
+    return dict(rows)
+
+
+def plan_days(manifest, dataset, device_ids, first_days, last_day, max_days):
+    """
+    :return: [(day, [待导出设备])]，从最早的水位线开始，至多 max_days 天
+    """
+    start = {}
+    for d in device_ids:
+        wm = manifest.watermark(dataset, d)
+        if wm is not None:
+            start[d] = wm + timedelta(days=1)
+        elif first_days.get(d) is not None:
+            start[d] = first_days[d]
+    if not start:
+        return []
+
+    plan = []
+    day = min(start.values())
+    while day <= last_day and len(plan) < max_days:
+        todo = [d for d in device_ids if d in start and start[d] <= day]
+        if todo:
+            plan.append((day, todo))
+        day += timedelta(days=1)
+    return plan
+
+
+def export_day(client, dataset, day, device_ids, manifest, root, snapshot):
+    """
+    一天的全部设备一次流式查询（按设备、时间排序），逐设备写分区
+    :return: 写入行数
+    """
+    spec = DATASETS[dataset]
+    blocks = iter_blocks(
+        client,
+        f"""
+        SELECT device_id, {spec["time"]}, {", ".join(spec["columns"])}
+        FROM {config.CLICKHOUSE_DB}.{spec["table"]}
+        WHERE device_id IN %(device_ids)s
+          AND {spec["time"]} >= %(start)s
+          AND {spec["time"]} < %(end)s
+        ORDER BY device_id, {spec["time"]}
+        """,
+        {
+            "device_ids": list(device_ids),
+            "start": datetime.combine(day, datetime.min.time()),
+            "end": datetime.combine(day + timedelta(days=1), datetime.min.time()),
+        },
+    )
+
+    written = 0
+
+    def flush(device_id, rows):
+        ranges = snapshot.devices[device_id]["confidence_range"] if device_id in snapshot else None
+        path = partition_path(root, dataset, device_id, day)
+        size = write_partition(path, dataset, partition_columns(dataset, rows, ranges))
+        manifest.record(dataset, device_id, day, {
+            "path": os.path.relpath(path, root),
+            "rows": len(rows),
+            "bytes": size,
+            "min_time": rows[0][0].strftime("%Y-%m-%d %H:%M:%S"),
+            "max_time": rows[-1][0].strftime("%Y-%m-%d %H:%M:%S"),
+            "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    current, rows = None, []
+    for block in blocks:
+        for r in block:
+            if r[0] != current:
+                if rows:
+                    flush(current, rows)
+                    written += len(rows)
+                current, rows = r[0], []
+            rows.append(r[1:])
+    if rows:
+        flush(current, rows)
+        written += len(rows)
+
+    # 当天无数据的设备也前移水位线（不写空分区）
+    for device_id in device_ids:
+        if manifest.watermark(dataset, device_id) != day:
+            manifest.record(dataset, device_id, day)
+    return written
+
+
+def run_export(datasets=None, until_day=None, max_days=None, client=None, root=None):
+    """
+    从 manifest 水位线续传导出，每导出一天保存一次 manifest
+    :return: {数据集: 写入行数}
+    """
+    client = client or get_ch_client()
+    root = archive_root(root)
+    until_day = until_day or date.today() - timedelta(days=config.ARCHIVE_LAG_DAYS)
+    max_days = config.ARCHIVE_BATCH_DAYS if max_days is None else max_days
+    snapshot = registry.snapshot()
+    manifest = Manifest(root)
+    if "ari" in (datasets or DATASETS):
+        ensure_schema()     # 旧表缺少新增列时导出的 SELECT 会失败
+
+    totals = {}
+    for dataset in datasets or list(DATASETS):
+        device_ids = snapshot.device_ids
+        missing = [d for d in device_ids if manifest.watermark(dataset, d) is None]
+        first_days = _first_days(client, dataset, missing) if missing else {}
+
+        totals[dataset] = 0
+        for day, todo in plan_days(manifest, dataset, device_ids, first_days, until_day, max_days):
+            rows = export_day(client, dataset, day, todo, manifest, root, snapshot)
+            manifest.save()
+            totals[dataset] += rows
+            print(f"[ARCHIVE] {dataset} {day}: {len(todo)} devices, {rows} rows")
+    return totals
+
+
+# =========================
+# 读取
+# =========================
+
+class ArchiveReader:
+
+    def __init__(self, root=None):
+        self.root = archive_root(root)
+        self.manifest = Manifest(self.root)
+
+    def _read(self, info, columns=None):
+        return pq.read_table(os.path.join(self.root, info["path"]), columns=columns)
+
+    def iter_rows(self, dataset, device_ids=None, start=None, end=None, columns=None):
+        """
+        [start, end) 内的记录（dict，含 device_id），按设备、时间顺序逐分区读取
+        """
+        spec = DATASETS[dataset]
+        tcol = spec["time"]
+        wanted = None if columns is None else [tcol, *[c for c in columns if c != tcol]]
+        for device_id, _, info in self.manifest.partitions(
+            dataset, device_ids,
+            start.date() if start else None,
+            end.date() if end else None,
+        ):
+            for row in self._read(info, wanted).to_pylist():
+                t = row[tcol]
+                if (start and t < start) or (end and t >= end):
+                    continue
+                row["device_id"] = device_id
+                yield row
+
+    def iter_sensor_blocks(self, device_id, start, end, fields):
+        """
+        minute_grid 块格式：每个分区一块 [(create_time_min, 字段1, ...)]
+        """
+        for _, _, info in self.manifest.partitions("sensor", [device_id], start.date(), end.date()):
+            table = self._read(info, ["create_time_min", *fields])
+            t = table.column("create_time_min")
+            mask = pc.and_(pc.greater_equal(t, start), pc.less(t, end))
+            table = table.filter(mask)
+            yield list(zip(*(table.column(c).to_pylist() for c in ["create_time_min", *fields])))
+
+    def minute_grid(self, device_id, anchor_time, ranges=None, fields=None, span_hours=None):
+        fields = fields or GRID_FIELDS
+        blocks = self.iter_sensor_blocks(device_id, grid_span(anchor_time, span_hours), anchor_time, fields)
+        return build_minute_grid(blocks, anchor_time, ranges, fields, span_hours)
+
+    def ari_results(self, since, until, device_ids=None):
+        """
+        与 ari_stats.fetch_new_results 相同的行格式：since < ari_time <= until
+        """
+        keys = ["ari_1", "ari_2", "ari_3", "ari_4", "ari_5", "threshold_level", "calc_mode"]
+        for row in self.iter_rows("ari", device_ids, since, until + timedelta(seconds=1), keys):
+            if row["ari_time"] <= since:
+                continue
+            row["calc_mode"] = row.get("calc_mode") or "cycle"
+            yield row
+
+    def coverage_end(self, dataset, device_ids):
+        """
+        :return: 归档覆盖到的时刻（最后完整日的次日零点），未覆盖返回 None
+        """
+        day = self.manifest.coverage_end(dataset, device_ids)
+        return datetime.combine(day + timedelta(days=1), datetime.min.time()) if day else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parquet archive export")
+    parser.add_argument("--dataset", choices=list(DATASETS), action="append", help="默认全部数据集")
+    parser.add_argument("--days", type=int, default=None, help="本次最多导出的天数（默认 ARCHIVE_BATCH_DAYS）")
+    parser.add_argument("--loop", action="store_true", help="每天运行一次")
+    args = parser.parse_args()
+
+    while True:
+        try:
+            run_export(args.dataset, max_days=args.days)
+        except Exception as e:
+            print(f"[ARCHIVE] export failed: {e}")
+        if not args.loop:
+            break
+        time.sleep(24 * 3600)
@@ -0,0 +1,434 @@
+# ari_models.py
+"""
+ARI 模型定义编译 / 热加载
+
+ari_models.yaml 在启动时编译为：
+- 标量路径：bisect 查阈值（compute_ari_for_device）
+- 向量路径：np.searchsorted 查阈值（compute_ari_batch / 情景评估）
+
+get_model_set() 按文件修改时间自动重新编译并原子替换；
+编译失败时保留旧版本继续运行。
+"""
+import math
+import operator
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+import config
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+NO_LEVEL = "无"
+
+COMPARE = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+}
+
+
+class ModelSpecError(ValueError):
+    pass
+
+
+def _num(v):
+    """
+    标量输入统一为 float / None（NaN 视为缺失）
+    """
+    try:
+        if v is None:
+            return None
+        v = float(v)
+        return None if math.isnan(v) else v
+    except (TypeError, ValueError):
+        return None
+
+
+# =========================
+# 编译单元
+# =========================
+
+class Ladder:
+    """
+    阶梯分级：levels 由重到轻 [[阈值, 等级], ...]
+    编译为升序阈值 + 每个区间对应的等级
+    """
+
+    def __init__(self, op, levels, default=NO_LEVEL):
+        if op not in COMPARE:
+            raise ModelSpecError(f"unknown op: {op}")
+        if not levels:
+            raise ModelSpecError("ladder needs at least one level")
+
+        pairs = [(float(t), str(label)) for t, label in levels]
+        self.op = op
+        self.default = default
+
+        if op in (">=", ">"):
+            # 值越大越严重：阈值升序 = levels 逆序
+            pairs = pairs[::-1]
+            self.labels = [default] + [label for _, label in pairs]
+        else:
+            self.labels = [label for _, label in pairs] + [default]
+        self.thresholds = [t for t, _ in pairs]
+
+        if self.thresholds != sorted(self.thresholds):
+            raise ModelSpecError(f"levels must be ordered from most to least severe: {levels}")
+
+        # >= 与 < 取 bisect_right，> 与 <= 取 bisect_left
+        self.side = "right" if op in (">=", "<") else "left"
+        self._bisect = bisect_right if self.side == "right" else bisect_left
+
+        self.np_thresholds = np.asarray(self.thresholds, dtype=float)
+        self.np_labels = np.asarray(self.labels, dtype=object)
+
+    def scalar(self, v):
+        if v is None:
+            return self.default
+        return self.labels[self._bisect(self.thresholds, v)]
+
+    def vector(self, arr, mask=None):
+        out = self.np_labels[np.searchsorted(self.np_thresholds, arr, side=self.side)]
+        invalid = np.isnan(arr)
+        if mask is not None:
+            invalid |= ~mask
+        out[invalid] = self.default
+        return out
+
+    def floors(self):
+        """
+        >= / > 阶梯中各等级的下限（用于告警迟滞）
+        """
+        if self.op not in (">=", ">"):
+            return {}
+        return dict(zip(self.labels[1:], self.thresholds))
+
+
+class Conditions:
+    """
+    前置条件：全部满足才参与分级，变量缺失视为不满足
+    """
+
+    def __init__(self, specs):
+        self.items = []
+        for c in specs or []:
+            if c.get("op") not in COMPARE:
+                raise ModelSpecError(f"unknown op in when: {c}")
+            self.items.append((c["field"], COMPARE[c["op"]], float(c["value"])))
+
+    def fields(self):
+        return [f for f, _, _ in self.items]
+
+    def scalar(self, data):
+        for field, cmp, value in self.items:
+            v = _num(data.get(field))
+            if v is None or not cmp(v, value):
+                return False
+        return True
+
+    def vector(self, cols, n):
+        mask = np.ones(n, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            for field, cmp, value in self.items:
+                mask &= cmp(cols[field], value)
+        return mask
+
+
+class IndexModel:
+
+    def __init__(self, spec, level_tables):
+        self.name = spec["name"]
+        self.level_output = spec.get("level_output")
+        self.terms = [
+            (t["field"], float(t["scale"]), bool(t.get("abs", False)))
+            for t in spec["terms"]
+        ]
+        self.min = spec.get("min")
+        table = spec.get("level_table")
+        if table is not None and table not in level_tables:
+            raise ModelSpecError(f"{self.name}: unknown level_table {table}")
+        self.ladder = level_tables.get(table)
+
+    def fields(self):
+        return [f for f, _, _ in self.terms]
+
+    def outputs(self):
+        return [self.name] + ([self.level_output] if self.level_output else [])
+
+    def scalar(self, data):
+        total = 0.0
+        value = None
+        for field, scale, use_abs in self.terms:
+            v = _num(data.get(field))
+            if v is None:
+                break
+            total += (abs(v) if use_abs else v) / scale
+        else:
+            value = total / len(self.terms)
+            if self.min is not None:
+                value = max(self.min, value)
+
+        out = {self.name: value}
+        if self.level_output:
+            out[self.level_output] = self.ladder.scalar(value)
+        return out
+
+    def vector(self, cols, n):
+        total = np.zeros(n)
+        for field, scale, use_abs in self.terms:
+            v = cols[field]
+            total = total + (np.abs(v) if use_abs else v) / scale
+        with np.errstate(invalid="ignore"):
+            value = total / len(self.terms)
+            if self.min is not None:
+                value = np.maximum(value, self.min)
+
+        out = {self.name: value}
+        if self.level_output:
+            out[self.level_output] = self.ladder.vector(value)
+        return out
+
+
+class LadderModel:
+
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.field = spec["field"]
+        self.when = Conditions(spec.get("when"))
+        self.ladder = Ladder(spec["op"], spec["levels"], spec.get("default", NO_LEVEL))
+
+    def fields(self):
+        return [self.field] + self.when.fields()
+
+    def outputs(self):
+        return [self.name]
+
+    def scalar(self, data):
+        v = _num(data.get(self.field))
+        if v is None or not self.when.scalar(data):
+            return {self.name: self.ladder.default}
+        return {self.name: self.ladder.scalar(v)}
+
+    def vector(self, cols, n):
+        mask = self.when.vector(cols, n)
+        return {self.name: self.ladder.vector(cols[self.field], mask)}
+
+
+class TableModel:
+    """
+    多指标阈值表：各指标独立分级，取最严重者
+    """
+
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.aliases = list(spec.get("aliases", []))
+        self.reason_output = spec.get("reason_output")
+        self.when = Conditions(spec.get("when"))
+        self.severity = [str(s) for s in spec["severity"]]
+        rank = {label: i for i, label in enumerate(self.severity)}
+
+        self.indicators = []
+        for ind in spec["indicators"]:
+            ladder = Ladder(ind["op"], ind["levels"], self.severity[0])
+            unknown = set(ladder.labels) - set(rank)
+            if unknown:
+                raise ModelSpecError(f"{self.name}: labels not in severity: {unknown}")
+            # 等级直接编译为严重度序号，取 max 即最严重
+            ladder.labels = [rank[l] for l in ladder.labels]
+            ladder.np_labels = np.asarray(ladder.labels, dtype=np.int64)
+            ladder.default = 0
+            self.indicators.append((ind["field"], Conditions(ind.get("when")), ladder))
+
+        reasons = spec.get("reasons", {})
+        self.reasons = [reasons.get(label) for label in self.severity]
+        self.np_severity = np.asarray(self.severity, dtype=object)
+        self.np_reasons = np.asarray(self.reasons, dtype=object)
+
+    def fields(self):
+        out = self.when.fields()
+        for field, when, _ in self.indicators:
+            out += [field] + when.fields()
+        return out
+
+    def outputs(self):
+        return [self.name] + self.aliases + ([self.reason_output] if self.reason_output else [])
+
+    def _pack(self, level, reason):
+        out = {alias: level for alias in self.aliases}
+        out[self.name] = level
+        if self.reason_output:
+            out[self.reason_output] = reason
+        return out
+
+    def scalar(self, data):
+        best = 0
+        if self.when.scalar(data):
+            for field, when, ladder in self.indicators:
+                v = _num(data.get(field))
+                if v is None or not when.scalar(data):
+                    continue
+                best = max(best, ladder.scalar(v))
+        return self._pack(self.severity[best], self.reasons[best])
+
+    def vector(self, cols, n):
+        best = np.zeros(n, dtype=np.int64)
+        for field, when, ladder in self.indicators:
+            best = np.maximum(best, ladder.vector(cols[field], when.vector(cols, n)))
+        best = np.where(self.when.vector(cols, n), best, 0)
+        return self._pack(self.np_severity[best], self.np_reasons[best])
+
+
+MODEL_TYPES = {
+    "index": IndexModel,
+    "ladder": LadderModel,
+    "table": TableModel,
+}
+
+
+# =========================
+# 模型集合
+# =========================
+
+class ModelSet:
+
+    def __init__(self, spec):
+        if "version" not in spec:
+            raise ModelSpecError("model spec needs a version")
+        self.version = str(spec["version"])
+
+        self.level_tables = {
+            name: Ladder(t["op"], t["levels"], t.get("default", NO_LEVEL))
+            for name, t in (spec.get("level_tables") or {}).items()
+        }
+
+        self.models = []
+        for m in spec["models"]:
+            model_type = MODEL_TYPES.get(m.get("type"))
+            if model_type is None:
+                raise ModelSpecError(f"unknown model type: {m.get('type')}")
+            if model_type is IndexModel:
+                self.models.append(IndexModel(m, self.level_tables))
+            else:
+                self.models.append(model_type(m))
+
+        self.input_fields = sorted({f for m in self.models for f in m.fields()})
+        self.output_fields = [o for m in self.models for o in m.outputs()]
+
+    def evaluate(self, data):
+        out = {}
+        for m in self.models:
+            out.update(m.scalar(data))
+        return out
+
+    def evaluate_batch(self, columns):
+        n = max(np.size(v) for v in columns.values()) if columns else 0
+        cols = {}
+        for field in self.input_fields:
+            v = columns.get(field)
+            if v is None:
+                cols[field] = np.full(n, np.nan)
+            else:
+                arr = np.asarray(v, dtype=float)
+                cols[field] = arr if arr.shape == (n,) else np.broadcast_to(arr, (n,))
+
+        out = {}
+        for m in self.models:
+            out.update(m.vector(cols, n))
+        return out
+
+    def thresholds(self, field):
+        """
+        输入变量在各模型阶梯 / 前置条件中出现的全部阈值（升序），用于 nowcast 分档
+        """
+        out = set()
+        for m in self.models:
+            conditions = [m.when] if hasattr(m, "when") else []
+            ladders = []
+            if isinstance(m, LadderModel):
+                ladders.append((m.field, m.ladder))
+            elif isinstance(m, TableModel):
+                for f, when, ladder in m.indicators:
+                    ladders.append((f, ladder))
+                    conditions.append(when)
+            for f, ladder in ladders:
+                if f == field:
+                    out.update(ladder.thresholds)
+            for c in conditions:
+                out.update(v for f, _, v in c.items if f == field)
+        return sorted(out)
+
+    def level_floors(self, level_output):
+        """
+        数值模型各等级下限，如 {"I": 1.0, "II": 0.9, ...}
+        """
+        for m in self.models:
+            if isinstance(m, IndexModel) and m.level_output == level_output:
+                return m.ladder.floors()
+        return {}
+
+
+def compile_spec(spec):
+    return ModelSet(spec)
+
+
+def load_spec_file(path):
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return compile_spec(yaml.safe_load(f))
+
+
+# =========================
+# 热加载
+# =========================
+
+_lock = threading.Lock()
+_current = {"models": None, "mtime": None, "checked": 0.0}
+
+
+def _spec_path():
+    path = config.ARI_MODEL_SPEC_FILE
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def reload_models(force=False):
+    """
+    文件修改时间变化时重新编译并原子替换
+    :return: 当前生效的 ModelSet
+    """
+    path = _spec_path()
+    with _lock:
+        mtime = None
+        try:
+            # 编辑器原子保存时文件可能短暂不存在：保留当前模型，下次检查再读
+            mtime = os.path.getmtime(path)
+            if force or _current["models"] is None or mtime != _current["mtime"]:
+                models = load_spec_file(path)
+                if _current["models"] is not None and models.version != _current["models"].version:
+                    print(f"[ARI] model spec reloaded: "
+                          f"{_current['models'].version} -> {models.version}")
+                _current["models"] = models
+        except Exception as e:
+            if _current["models"] is None:
+                raise
+            print(f"[ARI] model spec reload failed, keep version "
+                  f"{_current['models'].version}: {e}")
+        if mtime is not None:
+            _current["mtime"] = mtime
+        _current["checked"] = time.monotonic()
+        return _current["models"]
+
+
+def get_model_set():
+    """
+    当前生效的模型；最多每 ARI_MODEL_RELOAD_CHECK_SEC 秒检查一次文件
+    """
+    models = _current["models"]
+    if models is None or time.monotonic() - _current["checked"] > config.ARI_MODEL_RELOAD_CHECK_SEC:
+        models = reload_models()
+    return models
@@ -0,0 +1,387 @@
+# ari_stats.py
+"""
+ARI 日 / 雪季统计（离线预计算）
+
+从 snow_device_ari 增量汇总，报表和看板直接读汇总表，不再全表扫描：
+- 日表：每设备每天 ari_1 / ari_2 最大值、各综合等级累计小时数、
+  阈值触发周期数 / 触发次数（由“无”进入阈值等级）
+  nowcast 补算结果参与最大值 / 触发判定，但不计入小时数和周期数
+- 雪季表：由日表汇总（雪季自 ARI_SEASON_START_MONTH 月 1 日起算）
+- 水位线：日表中各设备的 max(last_ari_time)，每次只读取其后的新结果，
+  与当天已有汇总合并后覆盖写入（ReplacingMergeTree 按 last_ari_time 取新）；
+  新设备从其第一条结果开始回填，已移除设备的水位线不参与扫描起点
+
+日表 / 雪季表结构见 write_result.MIGRATIONS，任务启动时由 ensure_schema 创建
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+import config
+from alerting import level_rank, more_severe
+from ari_models import NO_LEVEL, get_model_set
+from compute_ari import ari_level_from_value, safe_float
+from device_registry import registry
+from fetch_data import get_ch_client, iter_blocks
+from write_result import DAILY_TABLE, SEASON_TABLE, ensure_schema, get_client
+
+# 综合等级 -> 小时数列
+HOUR_COLUMNS = {
+    "I": "hours_i",
+    "II": "hours_ii",
+    "III": "hours_iii",
+    "IV": "hours_iv",
+}
+
+STAT_COLUMNS = [
+    "samples",
+    "max_ari_1",
+    "max_ari_2",
+    "max_level",
+    "max_threshold_level",
+    *HOUR_COLUMNS.values(),
+    "threshold_cycles",
+    "threshold_triggers",
+    "last_threshold_level",
+    "last_ari_time",
+]
+
+DAILY_COLUMNS = ["device_id", "day", *STAT_COLUMNS]
+SEASON_COLUMNS = ["device_id", "season", "days", *STAT_COLUMNS]
+
+
+# =========================
+# 工具
+# =========================
+
+def _max(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+def season_of(day):
+    """
+    2024-12-01 -> "2024-2025"（起始月之前归上一雪季）
+    """
+    start = day.year if day.month >= config.ARI_SEASON_START_MONTH else day.year - 1
+    return f"{start}-{start + 1}"
+
+
+def season_range(season):
+    start = int(season.split("-")[0])
+    first = date(start, config.ARI_SEASON_START_MONTH, 1)
+    return first, date(start + 1, config.ARI_SEASON_START_MONTH, 1) - timedelta(days=1)
+
+
+def combined_level(row, models=None):
+    """
+    单条结果的综合等级：ari_1 / ari_2 数值换算等级与 ari_3 ~ ari_5 取最严重
+    """
+    models = models or get_model_set()
+    level = NO_LEVEL
+    for field in ("ari_1", "ari_2"):
+        level = more_severe(level, ari_level_from_value(safe_float(row.get(field)), models))
+    for field in ("ari_3", "ari_4", "ari_5"):
+        level = more_severe(level, row.get(field))
+    return level
+
+
+# =========================
+# 累加
+# =========================
+
+def new_stats():
+    return {
+        "samples": 0,
+        "max_ari_1": None,
+        "max_ari_2": None,
+        "max_level": NO_LEVEL,
+        "max_threshold_level": NO_LEVEL,
+        **{c: 0.0 for c in HOUR_COLUMNS.values()},
+        "threshold_cycles": 0,
+        "threshold_triggers": 0,
+        "last_threshold_level": NO_LEVEL,
+        "last_ari_time": None,
+    }
+
+
+def observe(stats, row, models=None):
+    """
+    并入一条 ARI 结果（需按 ari_time 升序调用）
+    """
+    level = combined_level(row, models)
+    threshold = row.get("threshold_level") or NO_LEVEL
+    # 周期结果才代表一个 ARI_INTERVAL_MIN 时段
+    cycle = row.get("calc_mode", "cycle") != "nowcast"
+
+    stats["samples"] += 1
+    stats["max_ari_1"] = _max(stats["max_ari_1"], safe_float(row.get("ari_1")))
+    stats["max_ari_2"] = _max(stats["max_ari_2"], safe_float(row.get("ari_2")))
+    stats["max_level"] = more_severe(stats["max_level"], level)
+    stats["max_threshold_level"] = more_severe(stats["max_threshold_level"], threshold)
+
+    if cycle and level in HOUR_COLUMNS:
+        stats[HOUR_COLUMNS[level]] += config.ARI_INTERVAL_MIN / 60.0
+
+    if level_rank(threshold) > 0:
+        if cycle:
+            stats["threshold_cycles"] += 1
+        if level_rank(stats["last_threshold_level"]) == 0:
+            stats["threshold_triggers"] += 1
+
+    stats["last_threshold_level"] = threshold
+    stats["last_ari_time"] = row["ari_time"]
+    return stats
+
+
+def merge(total, part):
+    """
+    合并两段统计（part 在时间上晚于 total），用于雪季汇总
+    """
+    total["samples"] += part["samples"]
+    total["max_ari_1"] = _max(total["max_ari_1"], part["max_ari_1"])
+    total["max_ari_2"] = _max(total["max_ari_2"], part["max_ari_2"])
+    total["max_level"] = more_severe(total["max_level"], part["max_level"])
+    total["max_threshold_level"] = more_severe(total["max_threshold_level"], part["max_threshold_level"])
+    for c in HOUR_COLUMNS.values():
+        total[c] += part[c]
+    total["threshold_cycles"] += part["threshold_cycles"]
+    total["threshold_triggers"] += part["threshold_triggers"]
+    total["last_threshold_level"] = part["last_threshold_level"]
+    total["last_ari_time"] = _max(total["last_ari_time"], part["last_ari_time"])
+    return total
+
+
+# =========================
+# 读写
+# =========================
+
+def fetch_watermarks(client):
+    """
+    device_id -> 已汇总到的 ari_time
+    """
+    rows = client.execute(
+        f"""
+        SELECT device_id, max(last_ari_time)
+        FROM {config.CLICKHOUSE_DB}.{DAILY_TABLE}
+        GROUP BY device_id
+        """
+    )
+    return dict(rows)
+
+
+def fetch_first_results(client, device_ids):
+    """
+    device_id -> 最早一条结果的 ari_time（注册表中尚无水位线的设备）
+    """
+    if not device_ids:
+        return {}
+    rows = client.execute(
+        f"""
+        SELECT device_id, min(ari_time)
+        FROM {config.CLICKHOUSE_DB}.snow_device_ari
+        WHERE device_id IN %(device_ids)s
+        GROUP BY device_id
+        """,
+        {"device_ids": list(device_ids)},
+    )
+    return dict(rows)
+
+
+def fetch_new_results(client, since, until):
+    """
+    逐块流式读取（生成器，迭代时才发出查询），回填数月时内存不随区间增长
+    """
+    keys = ["device_id", "ari_time", "ari_1", "ari_2", "ari_3", "ari_4", "ari_5", "threshold_level", "calc_mode"]
+    for block in iter_blocks(
+        client,
+        f"""
+        SELECT device_id, ari_time, ari_1, ari_2, ari_3, ari_4, ari_5, threshold_level,
+               ifNull(calc_mode, 'cycle')
+        FROM {config.CLICKHOUSE_DB}.snow_device_ari
+        WHERE ari_time > %(since)s
+          AND ari_time <= %(until)s
+        ORDER BY device_id, ari_time
+        """,
+        {"since": since, "until": until},
+    ):
+        for r in block:
+            yield dict(zip(keys, r))
+
+
+def _fetch_stats(client, table, key_column, where, params):
+    columns = ["device_id", key_column, *(["days"] if table == SEASON_TABLE else []), *STAT_COLUMNS]
+    rows = client.execute(
+        f"""
+        SELECT {", ".join(columns)}
+        FROM {config.CLICKHOUSE_DB}.{table} FINAL
+        WHERE {where}
+        ORDER BY device_id, {key_column}
+        """,
+        params,
+    )
+    return [dict(zip(columns, r)) for r in rows]
+
+
+def fetch_daily_stats(device_ids, start_day, end_day, client=None):
+    return _fetch_stats(
+        client or get_ch_client(), DAILY_TABLE, "day",
+        "device_id IN %(device_ids)s AND day >= %(start)s AND day <= %(end)s",
+        {"device_ids": list(device_ids), "start": start_day, "end": end_day},
+    )
+
+
+def fetch_season_stats(device_ids, season, client=None):
+    return _fetch_stats(
+        client or get_ch_client(), SEASON_TABLE, "season",
+        "device_id IN %(device_ids)s AND season = %(season)s",
+        {"device_ids": list(device_ids), "season": season},
+    )
+
+
+def _insert(table, columns, rows):
+    if rows:
+        get_client().insert(table, data=[[r[c] for c in columns] for r in rows], column_names=columns)
+
+
+# =========================
+# 增量任务
+# =========================
+
+def _update_daily(client, watermarks, new_rows, models):
+    """
+    :return: 本次写入的日汇总行
+    """
+    # 水位线所在日可能已有部分汇总，取出后接着累加
+    # （new_rows 为流式生成器，其他查询须在开始迭代之前完成）
+    partial_keys = sorted({(d, t.date()) for d, t in watermarks.items()})
+    existing = {}
+    if partial_keys:
+        for row in _fetch_stats(
+            client, DAILY_TABLE, "day",
+            "(device_id, day) IN %(keys)s",
+            {"keys": partial_keys},
+        ):
+            existing[(row["device_id"], row["day"])] = row
+
+    # 各设备上一条结果的阈值等级（跨天延续，用于判定触发）
+    last_threshold = {d: r["last_threshold_level"] for (d, _), r in existing.items()}
+
+    touched = {}
+    for row in new_rows:
+        device_id = row["device_id"]
+        wm = watermarks.get(device_id)
+        if wm is not None and row["ari_time"] <= wm:
+            continue
+        key = (device_id, row["ari_time"].date())
+        stats = touched.get(key)
+        if stats is None:
+            stats = existing.get(key)
+            if stats is None:
+                stats = new_stats()
+                stats.update(device_id=device_id, day=key[1])
+                stats["last_threshold_level"] = last_threshold.get(device_id, NO_LEVEL)
+            touched[key] = stats
+        observe(stats, row, models)
+        last_threshold[device_id] = stats["last_threshold_level"]
+        watermarks[device_id] = row["ari_time"]
+
+    rows = list(touched.values())
+    _insert(DAILY_TABLE, DAILY_COLUMNS, rows)
+    return rows
+
+
+def _update_seasons(client, daily_rows):
+    """
+    受影响的（设备, 雪季）由日表重新汇总（每季每设备最多 366 行）
+    """
+    affected = {}
+    for row in daily_rows:
+        affected.setdefault(season_of(row["day"]), set()).add(row["device_id"])
+
+    out = []
+    for season, device_ids in sorted(affected.items()):
+        first, last = season_range(season)
+        totals = {}
+        for day_row in fetch_daily_stats(device_ids, first, last, client=client):
+            total = totals.get(day_row["device_id"])
+            if total is None:
+                total = new_stats()
+                total.update(device_id=day_row["device_id"], season=season, days=0)
+                totals[day_row["device_id"]] = total
+            merge(total, day_row)
+            total["days"] += 1
+        out.extend(totals.values())
+
+    _insert(SEASON_TABLE, SEASON_COLUMNS, out)
+    return out
+
+
+def run_stats_job(until=None, client=None, archive=None):
+    """
+    从水位线增量汇总到 until（默认 now - ARI_STATS_LAG_MIN）
+    首次运行按 ARI_STATS_BATCH_DAYS 分批回填
+    :param archive: archive.ArchiveReader；归档已覆盖的批次从 Parquet 读取，不查线上结果表
+    :return: 写入的日汇总行数
+    """
+    client = client or get_ch_client()
+    until = until or datetime.now() - timedelta(minutes=config.ARI_STATS_LAG_MIN)
+    models = get_model_set()
+    watermarks = fetch_watermarks(client)
+
+    device_ids = registry.snapshot().device_ids
+
+    covered = None
+    if archive is not None:
+        covered = archive.coverage_end("ari", device_ids)
+
+    # 新加入注册表的设备以其第一条结果为水位线起点（回填全部历史）；
+    # 起点只看注册表内设备，已移除设备的旧水位线不再拖住每次扫描
+    # （其水位线仍保留在 watermarks 中，重叠区间内的旧结果照常跳过）
+    new_ids = [d for d in device_ids if d not in watermarks]
+    for device_id, first in fetch_first_results(client, new_ids).items():
+        watermarks[device_id] = first - timedelta(seconds=1)
+    active = [watermarks[d] for d in device_ids if d in watermarks]
+    if not active:
+        return 0
+    since = min(active)
+
+    written = 0
+    while since < until:
+        batch_until = min(until, since + timedelta(days=config.ARI_STATS_BATCH_DAYS))
+        if covered is not None and batch_until < covered:
+            new_rows = archive.ari_results(since, batch_until)
+        else:
+            new_rows = fetch_new_results(client, since, batch_until)
+        daily_rows = _update_daily(client, watermarks, new_rows, models)
+        _update_seasons(client, daily_rows)
+        written += len(daily_rows)
+        since = batch_until
+
+    print(f"[STATS] daily rows written: {written}, up to {until}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ARI daily / season statistics")
+    parser.add_argument("--loop", action="store_true", help="每个 ARI 周期运行一次")
+    parser.add_argument("--from-archive", action="store_true", help="回填时优先读取 Parquet 归档（archive.py）")
+    args = parser.parse_args()
+
+    reader = None
+    if args.from_archive:
+        from archive import ArchiveReader
+        reader = ArchiveReader()
+
+    ensure_schema()
+    while True:
+        try:
+            run_stats_job(archive=reader)
+        except Exception as e:
+            print(f"[STATS] job failed: {e}")
+        if not args.loop:
+            break
+        time.sleep(config.ARI_INTERVAL_MIN * 60)
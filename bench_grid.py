@@ -0,0 +1,74 @@
+# bench_grid.py
+"""
+取数 / 派生变量基准（读 Parquet 归档，不访问线上 ClickHouse）
+
+对归档中每个设备、每个锚点（按 --step-hours 间隔回放）：
+构建分钟网格 -> 取全部单点 / 窗口变量 -> 风吹雪指标，分别计时
+
+用法：python bench_grid.py [--device-id xxx] [--days 7] [--step-hours 6]
+先运行 python archive.py 导出传感器数据
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from archive import ArchiveReader
+from device_registry import registry
+from minute_grid import GRID_SPAN_HOURS
+from wind_stats import grid_wind_stats
+
+
+def _ms(samples):
+    return f"median {statistics.median(samples) * 1000:7.1f} ms  max {max(samples) * 1000:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="minute grid benchmark on archived data")
+    parser.add_argument("--device-id", action="append", help="默认注册表全部设备")
+    parser.add_argument("--days", type=int, default=7, help="回放最近 N 个归档日")
+    parser.add_argument("--step-hours", type=int, default=6, help="锚点间隔（小时）")
+    args = parser.parse_args()
+
+    reader = ArchiveReader()
+    snapshot = registry.snapshot()
+    device_ids = args.device_id or snapshot.device_ids
+    end = reader.coverage_end("sensor", device_ids)
+    if end is None:
+        print("[BENCH] archive does not cover all devices, run archive.py first")
+        return
+
+    anchors = []
+    t = end
+    while t > end - timedelta(days=args.days):
+        anchors.append(t)
+        t -= timedelta(hours=args.step_hours)
+
+    build, extract, wind = [], [], []
+    for device_id in device_ids:
+        ranges = snapshot.devices[device_id]["confidence_range"] if device_id in snapshot else None
+        for anchor in anchors:
+            t0 = time.perf_counter()
+            grid = reader.minute_grid(device_id, anchor, ranges)
+            t1 = time.perf_counter()
+            for hours in (0, 24, GRID_SPAN_HOURS):
+                grid.point("snow_depth", anchor - timedelta(hours=hours))
+            grid.point("wind_speed", anchor)
+            grid.window("atmospheric_temperature", anchor - timedelta(hours=24), anchor)
+            grid.window("rainfall", anchor - timedelta(hours=24), anchor)
+            t2 = time.perf_counter()
+            grid_wind_stats(grid, anchor)
+            t3 = time.perf_counter()
+            build.append(t1 - t0)
+            extract.append(t2 - t1)
+            wind.append(t3 - t2)
+
+    print(f"[BENCH] {len(device_ids)} devices x {len(anchors)} anchors (until {end:%Y-%m-%d}) "
+          f"at {datetime.now():%H:%M:%S}")
+    print(f"[BENCH] grid build   {_ms(build)}")
+    print(f"[BENCH] point/window {_ms(extract)}")
+    print(f"[BENCH] wind stats   {_ms(wind)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# bench_startup.py
+"""
+入口启动耗时基准
+
+每个入口在独立的干净子进程中 import（不复用已加载模块），取多次中位数，
+同时检查 import 阶段是否加载了重依赖（数据库驱动 / numpy / yaml / pyarrow）
+
+用法：python bench_startup.py [-n 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ENTRY_MODULES = ["app", "main"]
+
+HEAVY_MODULES = [
+    "clickhouse_driver",
+    "clickhouse_connect",
+    "numpy",
+    "yaml",
+    "pyarrow",
+    "pandas",
+]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{
+    "ms": elapsed * 1000.0,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(module, runs):
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=here, capture_output=True, text=True, check=True,
+        )
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(res["ms"])
+        heavy.update(res["heavy"])
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "max_ms": round(max(samples), 1),
+        "heavy_loaded": sorted(heavy),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="entry point import benchmark")
+    parser.add_argument("-n", type=int, default=10, help="runs per entry point")
+    args = parser.parse_args()
+
+    for module in ENTRY_MODULES:
+        res = measure(module, args.n)
+        print(f"[BENCH] import {module:<6} median {res['median_ms']:>7} ms  "
+              f"max {res['max_ms']:>7} ms  heavy={res['heavy_loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# broadcaster.py
+"""
+进程内 ARI 结果广播器
+
+- main.run_once 每产出一个周期 / API 重算出新结果时 publish
+- 只保留最近 N 条事件（环形缓冲），每个订阅者自己记游标，
+  因此订阅者数量再多也只有一份数据，不做逐个队列拷贝
+- 事件只携带变化字段（per-device delta），新订阅者先拿一次全量快照
+"""
+import threading
+import time
+from collections import deque
+
+# 推送给前端的精简字段
+DELTA_FIELDS = [
+    "ari_1", "ari_1_level",
+    "ari_2", "ari_2_level",
+    "ari_3", "ari_4", "ari_5",
+    "threshold_level",
+]
+
+LEVEL_FIELDS = [
+    "ari_1_level", "ari_2_level",
+    "ari_3", "ari_4", "ari_5",
+    "threshold_level",
+]
+
+
+def _compact(res):
+    out = {}
+    for k in DELTA_FIELDS:
+        v = res.get(k)
+        # 与入库精度一致，避免浮点抖动产生无意义的推送
+        out[k] = round(v, 2) if isinstance(v, float) else v
+    return out
+
+
+class AriBroadcaster:
+
+    def __init__(self, history=256):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._events = deque(maxlen=history)
+        self._state = {}
+
+    # =========================
+    # 发布
+    # =========================
+
+    def publish(self, ari_results, ari_time, new_cycle=True):
+        """
+        :param ari_results: compute_all_ari 的输出
+        :param new_cycle: True=调度器新周期（总是发事件）；
+                          False=API 临时重算（仅有变化时发事件）
+        :return: 发布的事件，无变化时返回 None
+        """
+        changed = {}
+        level_changed = []
+
+        with self._cond:
+            for device_id, res in ari_results.items():
+                cur = _compact(res)
+                prev = self._state.get(device_id)
+                if prev == cur:
+                    continue
+
+                if prev is None:
+                    diff = cur
+                else:
+                    diff = {k: v for k, v in cur.items() if prev.get(k) != v}
+                    if any(prev.get(k) != cur[k] for k in LEVEL_FIELDS):
+                        level_changed.append(device_id)
+
+                changed[device_id] = diff
+                self._state[device_id] = cur
+
+            if not changed and not new_cycle:
+                return None
+
+            self._seq += 1
+            event = {
+                "seq": self._seq,
+                "type": "cycle" if new_cycle else "update",
+                "ari_time": ari_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "changed": changed,
+                "level_changed": level_changed,
+            }
+            self._events.append(event)
+            self._cond.notify_all()
+            return event
+
+    # =========================
+    # 订阅
+    # =========================
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "seq": self._seq,
+                "type": "snapshot",
+                "data": {k: dict(v) for k, v in self._state.items()},
+            }
+
+    def events_since(self, last_seq, timeout=25.0):
+        """
+        阻塞直到有 seq > last_seq 的事件或超时
+
+        订阅者落后超过环形缓冲长度，或游标超前于当前序号（服务重启后带旧的
+        Last-Event-ID / since 续传）时，返回一条全量快照事件
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if last_seq > self._seq:
+                return [self.snapshot()]
+            while self._seq <= last_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+            oldest = self._events[0]["seq"] if self._events else self._seq + 1
+            if last_seq + 1 < oldest:
+                return [self.snapshot()]
+            return [e for e in self._events if e["seq"] > last_seq]
+
+    @property
+    def seq(self):
+        return self._seq
+
+
+# 全进程共享一个广播器
+ari_broadcaster = AriBroadcaster()
@@ -1,6 +1,9 @@
 from typing import Dict, Any
 import math
 
+from ari_models import get_model_set
+from wind_stats import wind_fields
+
 
 # =========================
 # 工具函数
@@ -17,175 +20,74 @@ def safe_float(x):
         return None
 
 
-def clamp_ari(v):
-    if v is None:
-        return None
-    return max(0.0, v)
-
-
-def ari_level_from_value(ari):
-    if ari is None:
-        return "无"
-    if ari >= 1.0:
-        return "I"
-    if 0.9 <= ari < 1.0:
-        return "II"
-    if 0.7 <= ari < 0.9:
-        return "III"
-    if 0.5 <= ari < 0.7:
-        return "IV"
-    return "无"
+def ari_level_from_value(ari, models=None):
+    models = models or get_model_set()
+    return models.level_tables["ari_value"].scalar(ari)
 
 
 # =========================
 # 单设备 ARI 计算
 # =========================
-def compute_ari_for_device(data: Dict[str, Any]) -> Dict[str, Any]:
+def compute_ari_for_device(data: Dict[str, Any], models=None) -> Dict[str, Any]:
+    """
+    模型与阈值见 ari_models.yaml（ari_1 ~ ari_5、一维阈值表）
+    """
+    models = models or get_model_set()
     missing = set(data.get("missing_fields", []))
 
-    # ---------- 基础变量 ----------
-    snow_depth = safe_float(data.get("snow_depth"))            # m
-    snowfall_24h = safe_float(data.get("snowfall_24h"))        # m
-    snowfall_72h = safe_float(data.get("snowfall_72h"))        # m
-    delta_snow_24h = safe_float(data.get("delta_snow_24h"))    # m（减少为负）
-
-    temp_avg_24h = safe_float(data.get("temp_avg_24h"))        # ℃
-    rainfall_24h = safe_float(data.get("rainfall_24h"))        # mm
-    wind_speed = safe_float(data.get("wind_speed"))            # m/s
-
-    # ======================================================
-    # 模型 1：降雪诱发雪崩 I
-    # ======================================================
-    ari_1 = None
-    ari_1_level = "无"
-    if snow_depth is not None and snowfall_24h is not None:
-        ari_1 = ((snow_depth / 0.6) + (snowfall_24h / 0.015)) / 2
-        ari_1 = clamp_ari(ari_1)
-        ari_1_level = ari_level_from_value(ari_1)
-
-    # ======================================================
-    # 模型 2：降雪诱发雪崩 II
-    # ======================================================
-    ari_2 = None
-    ari_2_level = "无"
-    if snow_depth is not None and delta_snow_24h is not None:
-        ari_2 = ((snow_depth / 0.6) + (abs(delta_snow_24h) / 0.2)) / 2
-        ari_2 = clamp_ari(ari_2)
-        ari_2_level = ari_level_from_value(ari_2)
-
-    # ======================================================
-    # 模型 3：增温融雪诱发雪崩 I
-    # ======================================================
-    ari_3 = "无"
-    if temp_avg_24h is not None and delta_snow_24h is not None:
-        if temp_avg_24h > 0:
-            if delta_snow_24h <= -0.25:
-                ari_3 = "I"
-            elif delta_snow_24h <= -0.2:
-                ari_3 = "II"
-            elif delta_snow_24h <= -0.15:
-                ari_3 = "III"
-            elif delta_snow_24h <= -0.1:
-                ari_3 = "IV"
-
-    # ======================================================
-    # 模型 4：增温融雪诱发雪崩 II（降雨）
-    # ======================================================
-    ari_4 = "无"
-    if snow_depth is not None and rainfall_24h is not None:
-        if snow_depth > 0.3:
-            if rainfall_24h > 5:
-                ari_4 = "I"
-            elif rainfall_24h > 0:
-                ari_4 = "II"
-
-    # ======================================================
-    # 模型 5：风吹雪诱发雪崩
-    # ======================================================
-    ari_5 = "无"
-    if wind_speed is not None:
-        if wind_speed >= 12:
-            ari_5 = "I"
-        elif wind_speed >= 10:
-            ari_5 = "II"
-        elif wind_speed >= 8:
-            ari_5 = "III"
-        elif wind_speed >= 5:
-            ari_5 = "IV"
-
-    # ======================================================
-    # 一维雪崩监测阈值模型（表 2）
-    # ======================================================
-    one_d_warning_level = "无"
-    threshold_reason = None
-
-    if snow_depth is not None and snow_depth > 0.6:
-
-        # 红色
-        if (
-            (snowfall_72h is not None and snowfall_72h >= 0.5) or
-            (delta_snow_24h is not None and delta_snow_24h <= -0.25 and temp_avg_24h is not None and temp_avg_24h > 0) or
-            (wind_speed is not None and wind_speed >= 10)
-        ):
-            one_d_warning_level = "红"
-            threshold_reason = "one_d_threshold:red"
-
-        # 橙色
-        elif (
-            (snowfall_72h is not None and 0.3 <= snowfall_72h < 0.5) or
-            (delta_snow_24h is not None and -0.25 < delta_snow_24h <= -0.2 and temp_avg_24h is not None and temp_avg_24h > 0) or
-            (wind_speed is not None and 8 <= wind_speed < 10)
-        ):
-            one_d_warning_level = "橙"
-            threshold_reason = "one_d_threshold:orange"
-
-        # 黄色
-        elif (
-            (snowfall_72h is not None and 0.2 <= snowfall_72h < 0.3) or
-            (delta_snow_24h is not None and -0.2 < delta_snow_24h <= -0.15 and temp_avg_24h is not None and temp_avg_24h > 0) or
-            (wind_speed is not None and 6 <= wind_speed < 8)
-        ):
-            one_d_warning_level = "黄"
-            threshold_reason = "one_d_threshold:yellow"
-
-        # 蓝色
-        elif (
-            (snowfall_72h is not None and 0.1 <= snowfall_72h < 0.2) or
-            (delta_snow_24h is not None and -0.15 < delta_snow_24h <= -0.05 and temp_avg_24h is not None and temp_avg_24h > 0) or
-            (wind_speed is not None and 5 <= wind_speed < 6)
-        ):
-            one_d_warning_level = "蓝"
-            threshold_reason = "one_d_threshold:blue"
-
-    # =============================
-    # 输出（方案 A：字段对齐，不删任何功能）
-    # =============================
-    return {
-        # 原有 ARI 数值与分级（完全保留）
-        "ari_1": ari_1,
-        "ari_1_level": ari_1_level,
+    out = models.evaluate(data)
 
-        "ari_2": ari_2,
-        "ari_2_level": ari_2_level,
+    return {
+        **out,
 
-        "ari_3": ari_3,
-        "ari_4": ari_4,
-        "ari_5": ari_5,
+        # 其他
+        "missing_fields": list(missing),
 
-        # 原有一维模型结果（完全保留）
-        "one_d_warning_level": one_d_warning_level,
+        # 数据质量（取数阶段扫描时累计，原样透传入库）
+        "data_quality_flag": data.get("data_quality_flag", "normal"),
+        "data_quality": data.get("data_quality"),
 
-        # ✅ 方案 A：对齐 write_result.py
-        "threshold_level": one_d_warning_level,
-        "threshold_reason": threshold_reason,
+        # 周期降级时跳过 72h 窗口（calc_window_72h = "N"）
+        "calc_window_24h": data.get("calc_window_24h", "Y"),
+        "calc_window_72h": data.get("calc_window_72h", "Y"),
 
-        # 其他
-        "missing_fields": list(missing),
+        # 产出该结果的模型版本
+        "model_version": models.version,
     }
 
 
-def compute_all_ari(fetch_result: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+def compute_all_ari(fetch_result: Dict[str, Dict[str, Any]], models=None) -> Dict[str, Dict[str, Any]]:
+    # 整个周期使用同一版本模型，热加载只在周期之间生效
+    models = models or get_model_set()
     return {
-        device_id: compute_ari_for_device(data)
+        device_id: compute_ari_for_device(data, models)
         for device_id, data in fetch_result.items()
-    }
\ No newline at end of file
+    }
+
+
+# =========================
+# 批量（向量化）ARI 计算
+# =========================
+
+# 与 compute_ari_for_device 中的输入变量一致
+BATCH_INPUT_FIELDS = [
+    "snow_depth",
+    "snowfall_24h",
+    "snowfall_72h",
+    "delta_snow_24h",
+    "temp_avg_24h",
+    "rainfall_24h",
+    "wind_speed",
+    *wind_fields(),
+]
+
+
+def compute_ari_batch(columns: Dict[str, Any], models=None) -> Dict[str, Any]:
+    """
+    与 compute_ari_for_device 逐项等价的向量化版本
+
+    :param columns: {输入变量: 一维数组}，缺失值用 NaN / None
+    :return: {输出字段: 数组}，数值字段为 float（NaN 表示无值），等级字段为 object
+    """
+    models = models or get_model_set()
+    return models.evaluate_batch(columns)
@@ -11,9 +11,18 @@ CLICKHOUSE_DB = "iot_db"
 # 默认使用 TCP
 CLICKHOUSE_PORT = CLICKHOUSE_TCP_PORT
 
+# 大结果集流式读取（execute_iter）每块行数：逐块聚合后丢弃，峰值内存只与块大小有关
+CH_STREAM_BLOCK_ROWS = 8192
+
 # ==============================
 # ARI 服务管理的设备白名单
 # ==============================
+# 设备注册表来源："file"（DEVICE_REGISTRY_FILE）或 "table"（iot_db.snow_device_registry）
+# 文件不存在时使用下方 DEVICE_IDS
+DEVICE_REGISTRY_SOURCE = "file"
+DEVICE_REGISTRY_FILE = "devices.yaml"     # 相对路径以项目目录为准
+DEVICE_REGISTRY_CHECK_SEC = 30            # API 进程检查注册表变化的最小间隔（秒）
+
 DEVICE_IDS = [
     "04672adb0c3a",
     "0a5c2c269035",
@@ -34,6 +43,124 @@ DATA_DELAY_GUARD_MIN = 2     # 写入延迟保护（分钟）
 # 最大可回溯可信时间（分钟）
 DATA_MAX_LOOKBACK_MIN = 2880
 
+# 设备最新数据早于该时长（分钟）视为停报，本周期直接跳过回溯
+DEVICE_STALE_MIN = DATA_MAX_LOOKBACK_MIN
+
+# 设备新鲜度索引（每设备最新分钟）缓存时间（秒）
+FRESHNESS_TTL_SEC = 60
+
+# 取数查询读穿缓存（设备分钟网格，72h + 回溯窗口约 1.2 MB / 设备 / 锚点）
+# 上限按 设备数 × 2 个锚点（周期计算 + API 当前锚点）估算，设备较多时相应调大
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024     # 按估算内存大小 LRU 淘汰
+QUERY_CACHE_TTL_SEC = 120                    # 仍可能写入的窗口（key 含设备水位线）
+QUERY_CACHE_IMMUTABLE_TTL_SEC = 6 * 3600     # 已过写入延迟保护的历史窗口
+
+# ==============================
+# API 准入控制（每个后端限并发 + 有界排队，相同请求合并为一次后端调用）
+#   排队已满或等待超时：有 ADMISSION_STALE_MAX_SEC 内的旧结果时返回旧结果（stale_age_sec），
+#   否则快速 503 + Retry-After
+# ==============================
+ADMISSION_BACKENDS = {
+    "clickhouse": {"max_concurrent": 8, "max_queue": 32, "queue_timeout_sec": 2.0},   # 明细 / 历史 / 统计查询
+    "ari_compute": {"max_concurrent": 2, "max_queue": 16, "queue_timeout_sec": 10.0},  # 当前 ARI（取数 + 计算）
+}
+ADMISSION_STALE_MAX_SEC = 600
+ADMISSION_STALE_MAX_BYTES = 16 * 1024 * 1024
+ADMISSION_RETRY_AFTER_SEC = 5
+
+# ==============================
+# 周期时间预算与降级（预计耗时 / 预算 达到各档时逐级降级，结果 data_quality_flag 标记）
+#   1 级：有上周期输入的设备直接复用（degraded:cached_inputs@锚点）
+#   2 级：其余设备只读 24h 网格，跳过只用 72h 窗口的指标（degraded:skip_72h，calc_window_72h=N）
+#   3 级：推迟周期后置任务（区域 ARI 入库）
+# ==============================
+ARI_CYCLE_BUDGET_SEC = ARI_INTERVAL_MIN * 60 // 2
+ARI_DEGRADE_AT = [0.6, 0.8, 0.95]
+ARI_CACHED_INPUT_MAX_AGE_MIN = 2 * ARI_INTERVAL_MIN   # 复用输入的最大年龄
+ARI_CYCLE_STATUS_FILE = ".ari_state/cycle_status.json"  # 周期状态（/healthz /readyz 跨进程读取）
+READY_MAX_CYCLE_LAG_MIN = 2 * ARI_INTERVAL_MIN        # 距上次成功周期超过该值时 /readyz 返回 503
+READY_MAX_CONSECUTIVE_FAILURES = 2                     # 连续失败周期数超过该值时 /readyz 返回 503
+READY_BACKEND_TIMEOUT_SEC = 3                          # /readyz 探测 ClickHouse 的超时
+
+# ==============================
+# 分片调度（python main.py --shard / --workers N）
+# ==============================
+SHARD_LEASE_BACKEND = "file"          # "file"（本机多进程）或 "clickhouse"（多节点）
+SHARD_LEASE_DIR = ".ari_state/leases"
+SHARD_LEASE_TTL_SEC = 60              # 超过该时间未心跳视为 worker 死亡
+SHARD_TICK_SEC = 15                   # 周期内检查成员变化 / 接管的间隔
+SHARD_VNODES = 64                     # 每个 worker 在哈希环上的虚拟节点数
+SHARD_RETRY_MAX_SEC = 300             # 周期计算失败后重试的最大退避间隔
+
+# ==============================
+# ARI 结果快照（多进程共享同一锚点的计算结果）
+# ==============================
+ARI_SNAPSHOT_DIR = ".ari_state/snapshots"
+ARI_SNAPSHOT_KEEP = 5                 # 保留最近 N 个快照文件
+ARI_SNAPSHOT_WAIT_SEC = 60            # 等待其他进程计算的最长时间，超时自行计算
+
+# API 进程内同时运行调度器（SSE / 长轮询可直接收到每个周期的推送）
+ARI_EMBED_SCHEDULER = False
+
+# ==============================
+# 分钟级 nowcast（python main.py --nowcast）
+# 监视各设备最新分钟，输入跨越阈值分档时只为这些设备补算，30 分钟周期照常运行
+# ==============================
+NOWCAST_ENABLED = False
+NOWCAST_SOURCE = "clickhouse"                    # "clickhouse"（水位线查询）或 "feed"（本地 JSONL 追加文件）
+NOWCAST_FEED_FILE = ".ari_state/nowcast_feed.jsonl"
+NOWCAST_POLL_SEC = 30
+NOWCAST_LOOKBACK_MIN = 10                        # 启动时从 now - N 分钟开始监视
+
+# 监视的模型输入：column=原始列，scale=原始值换算到模型单位，
+# 分档 = 模型阈值（ari_models.yaml 中该变量出现的全部阈值）+ 可选等步长 step
+NOWCAST_WATCH = {
+    "wind_speed": {"column": "wind_speed", "scale": 1.0},
+    "snow_depth": {"column": "snow_depth", "scale": 0.001, "step": 0.05},   # mm -> m，每 5cm 一档
+}
+
+# 限流：单设备两次补算的最小间隔；全局每小时补算设备数上限
+NOWCAST_DEVICE_COOLDOWN_SEC = 300
+NOWCAST_MAX_PER_HOUR = 60
+
+# ==============================
+# ARI 日 / 雪季统计（python ari_stats.py [--loop]）
+# ==============================
+ARI_STATS_LAG_MIN = 10               # 只处理早于 now - lag 的结果，避免漏掉正在写入的周期
+ARI_STATS_BATCH_DAYS = 31            # 首次回填时每批处理的天数
+ARI_SEASON_START_MONTH = 8           # 雪季起始月份：8 月 1 日 ~ 次年 7 月 31 日
+
+
+# ==============================
+# Parquet 归档（python archive.py，按 设备 / 天 分区，研究取数与回填读文件而非线上库）
+# ==============================
+ARCHIVE_DIR = "archive"              # 相对路径以项目目录为准
+ARCHIVE_COMPRESSION = "zstd"
+ARCHIVE_LAG_DAYS = 1                 # 只导出早于 今天 - N 天 的完整日（分区导出后不再变化）
+ARCHIVE_BATCH_DAYS = 7               # 每次运行最多导出的天数（水位线续传）
+
+
+# ==============================
+# 风吹雪指标（24h 分钟窗口，见 wind_stats.py）
+# ==============================
+WIND_SPEED_BANDS = [5, 8, 10, 12]    # 持续大风时长分档（m/s），与模型 5 阶梯一致
+WIND_SUSTAINED_MIN = 10              # 持续风速：N 分钟滑动平均
+WIND_DRIFT_THRESHOLD_MS = 5.0        # 吹雪起动风速（m/s），输运量代理只累计超过部分
+WIND_STATS_MIN_COVERAGE = 0.5        # 窗口内有效分钟占比低于该值时不给出风统计
+
+
+# ==============================
+# 区域（多站点）ARI
+# 每个区域：stations 显式成员，和 / 或 center [lat, lon] + radius_km 空间范围内的站点；
+# method："max"（成员最严重等级）或 "elevation_weighted"（ari_1 / ari_2 按海拔加权）
+# devices.yaml 中定义 regions 时以其为准；不合法的区域在加载时跳过并记录日志
+# 区域结果表 snow_region_ari 只由全量周期（非分片模式）写入：分片 worker 各自只有部分成员，
+# 分片部署下区域 ARI 仅由 /api/ari/regions 按当前结果实时合成
+# ==============================
+ARI_REGIONS = {}
+REGION_INDEX_CELL_KM = 5.0           # 站点空间索引网格边长（公里）
+STATION_DIR = "snowpack/stations"    # station.ini 所在目录（相对路径以项目目录为准）
+
 
 # ==============================
 # 超出范围 → 视为漂移
@@ -61,6 +188,18 @@ SENSOR_CONFIDENCE_RANGE = {
         "unit": "m/s",
     },
 
+    # 风向（°，来向，北=0 顺时针）
+    "wind_direction": {
+        "min": 0,
+        "max": 360,
+        "unit": "°",
+    },
+
+    # 三轴风速分量（m/s，x 向东 / y 向北 / z 向上）
+    "x_wind_speed": {"min": -60, "max": 60, "unit": "m/s"},
+    "y_wind_speed": {"min": -60, "max": 60, "unit": "m/s"},
+    "z_wind_speed": {"min": -60, "max": 60, "unit": "m/s"},
+
     # 大气温度（℃）
     "atmospheric_temperature": {
         "min": -50,
@@ -84,6 +223,13 @@ SENSOR_CONFIDENCE_RANGE = {
 }
 
 
+# ==============================
+# ARI 模型定义（阈值表）
+# ==============================
+ARI_MODEL_SPEC_FILE = "ari_models.yaml"   # 相对路径以项目目录为准
+ARI_MODEL_RELOAD_CHECK_SEC = 10           # 检查文件变化的最小间隔（秒）
+
+
 # ============================== 
 # ARI 缺失 / 漂移兜底策略
 # ==============================
@@ -91,4 +237,36 @@ ARI_FALLBACK = {
     # 超过 MAX_BACKTRACK_MIN 仍无可信数据
     "ari_value": 0.0,
     "ari_level": "I",        # 最低风险等级
-}
\ No newline at end of file
+}
+
+
+# ==============================
+# 等级变化告警
+# ==============================
+ALERT_CONFIG = {
+    # 参与告警的等级字段
+    "fields": [
+        "ari_1_level",
+        "ari_2_level",
+        "ari_3",
+        "ari_4",
+        "ari_5",
+        "threshold_level",
+    ],
+
+    # 去抖：连续 N 个周期保持新等级才确认
+    "confirm_cycles_up": 1,      # 升级立即告警
+    "confirm_cycles_down": 2,    # 降级需连续 2 个周期
+
+    # 迟滞：ari_1 / ari_2 降级时需低于原等级下限 margin
+    "ari_value_hysteresis": 0.05,
+
+    # 启动后首次看到的等级不告警（只作为基线）
+    "alert_on_first_seen": False,
+
+    # 告警输出：file / webhook / queue
+    "sinks": [
+        {"type": "file", "path": "alerts.jsonl"},
+        {"type": "webhook", "url": None},    # 填写 url 后启用
+    ],
+}
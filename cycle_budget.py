@@ -0,0 +1,155 @@
+# cycle_budget.py
+"""
+周期时间预算与逐级降级 + 周期状态（/healthz /readyz）
+
+- CycleBudget：按已完成设备数推算整周期耗时，预计耗时 / 预算达到 ARI_DEGRADE_AT 各档时
+  返回降级级别（取数阶段逐设备查询，周期后置任务结束前再查一次）
+- 周期状态写入 ARI_CYCLE_STATUS_FILE（原子替换），调度器与 API 不在同一进程时也能读取
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import config
+
+DEGRADE_NONE = 0
+DEGRADE_CACHED_INPUTS = 1
+DEGRADE_SKIP_72H = 2
+DEGRADE_DEFER_EXTRAS = 3
+
+DEGRADE_NAMES = {
+    DEGRADE_NONE: "none",
+    DEGRADE_CACHED_INPUTS: "cached_inputs",
+    DEGRADE_SKIP_72H: "skip_72h",
+    DEGRADE_DEFER_EXTRAS: "defer_extras",
+}
+
+
+def degraded_flag(name, detail=None):
+    return f"degraded:{name}@{detail}" if detail else f"degraded:{name}"
+
+
+def add_flag(flag, extra):
+    """
+    data_quality_flag 追加一项（"normal" 时直接替换）
+    """
+    if not flag or flag == "normal":
+        return extra
+    return f"{flag};{extra}"
+
+
+class CycleBudget:
+
+    def __init__(self, budget_sec=None, clock=time.monotonic):
+        self.budget_sec = config.ARI_CYCLE_BUDGET_SEC if budget_sec is None else budget_sec
+        self._clock = clock
+        self.started = clock()
+        self.max_level = DEGRADE_NONE
+        self.backend_sec = []        # 每次取数后端调用耗时
+
+    def elapsed(self):
+        return self._clock() - self.started
+
+    def projected(self, done, total):
+        """
+        按已完成比例线性外推的整周期耗时（秒）
+        """
+        elapsed = self.elapsed()
+        if done <= 0 or total <= 0:
+            return elapsed
+        return elapsed / done * total
+
+    def level(self, done=0, total=0):
+        """
+        :return: 当前应采用的降级级别（单调不降：进入降级后本周期不再恢复）
+        """
+        ratio = self.projected(done, total) / self.budget_sec if self.budget_sec else 0.0
+        level = sum(1 for at in config.ARI_DEGRADE_AT if ratio >= at)
+        self.max_level = max(self.max_level, level)
+        return self.max_level
+
+    def observe_backend(self, sec):
+        self.backend_sec.append(sec)
+
+    def backend_latency(self):
+        if not self.backend_sec:
+            return None
+        ordered = sorted(self.backend_sec)
+        return {
+            "calls": len(ordered),
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+
+
+# =========================
+# 周期状态
+# =========================
+
+_lock = threading.Lock()
+
+
+def _status_path():
+    path = config.ARI_CYCLE_STATUS_FILE
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def load_cycle_status():
+    try:
+        with open(_status_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_cycle(started_at, budget=None, error=None, devices=0, degraded=0):
+    """
+    周期结束（成功或失败）时调用，合并写入状态文件
+    """
+    now = datetime.now()
+    with _lock:
+        status = load_cycle_status()
+        status.update({
+            "last_start": started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "last_end": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "last_duration_sec": round((now - started_at).total_seconds(), 1),
+            "last_error": str(error) if error else None,
+        })
+        if budget is not None:
+            status.update({
+                "budget_sec": budget.budget_sec,
+                "degrade_level": DEGRADE_NAMES[budget.max_level],
+                "backend_latency": budget.backend_latency(),
+            })
+        if error is None:
+            status.update({
+                "last_success": now.strftime("%Y-%m-%d %H:%M:%S"),
+                "devices": devices,
+                "degraded_devices": degraded,
+                "consecutive_failures": 0,
+            })
+        else:
+            status["consecutive_failures"] = status.get("consecutive_failures", 0) + 1
+
+        path = _status_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    return status
+
+
+def cycle_lag_minutes(status, now=None):
+    """
+    距上次成功周期的分钟数（从未成功返回 None）
+    """
+    last = status.get("last_success")
+    if not last:
+        return None
+    now = now or datetime.now()
+    return round((now - datetime.strptime(last, "%Y-%m-%d %H:%M:%S")).total_seconds() / 60.0, 1)
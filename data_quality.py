@@ -0,0 +1,155 @@
+# data_quality.py
+"""
+数据质量统计（在取数扫描过程中顺带累计，不额外扫描分钟数据）
+
+README 中的处理规则对应的状态：
+- ok                            目标时刻数据可信
+- fallback                      目标时刻缺失 / 漂移，回溯到更早的可信值（fallback_used@时间）
+- out_of_range_and_no_fallback  有数据但均超出置信区间，回溯失败
+- raw_missing                   回溯窗口内无数据
+"""
+import json
+from datetime import timedelta
+
+STATUS_OK = "ok"
+STATUS_FALLBACK = "fallback"
+STATUS_OUT_OF_RANGE = "out_of_range_and_no_fallback"
+STATUS_MISSING = "raw_missing"
+
+# 窗口聚合缺失率超过该值时写入质量标记
+MISSING_RATIO_FLAG = 0.2
+
+FLAG_NORMAL = "normal"
+
+
+def _minutes(delta):
+    return round(delta.total_seconds() / 60.0, 1)
+
+
+class PointScan:
+    """
+    单点回溯的扫描累计（分钟网格 MinuteGrid.point 与逐行扫描同一口径）
+    """
+
+    def __init__(self, end_time):
+        self.end_time = end_time
+        self.rows = 0
+        self.missing = 0
+        self.out_of_range = 0
+
+    def observe(self, value, valid):
+        self.rows += 1
+        if value is None:
+            self.missing += 1
+        elif not valid:
+            self.out_of_range += 1
+
+    def observe_counts(self, rows, missing, out_of_range):
+        """
+        按计数批量累计（分钟网格上由前缀和直接得出）
+        """
+        self.rows += rows
+        self.missing += missing
+        self.out_of_range += out_of_range
+
+    def result(self, value_time):
+        """
+        :param value_time: 最终采用值的时间；None 表示回溯失败
+        """
+        target = self.end_time - timedelta(minutes=1)
+        if value_time is None:
+            status = STATUS_OUT_OF_RANGE if self.out_of_range else STATUS_MISSING
+        elif self.rows == 1 and value_time >= target:
+            # 第一条（最新）记录即可信，且就在目标分钟
+            status = STATUS_OK
+        else:
+            status = STATUS_FALLBACK
+
+        info = {
+            "status": status,
+            "rows_scanned": self.rows,
+            "missing": self.missing,
+            "out_of_range": self.out_of_range,
+        }
+        if value_time is not None:
+            info["value_time"] = value_time.strftime("%Y-%m-%d %H:%M:%S")
+            info["age_min"] = _minutes(self.end_time - value_time)
+        return info
+
+
+class WindowScan:
+    """
+    窗口聚合（24h 平均温度 / 累计降雨）的扫描累计
+    """
+
+    def __init__(self, start_time, end_time):
+        self.expected = max(1, int(_minutes(end_time - start_time)))
+        self.rows = 0
+        self.valid = 0
+        self.missing = 0
+        self.out_of_range = 0
+        self.total = 0.0    # 可信值之和（均值 / 累计量由此得出，不保留逐条值）
+
+    def observe(self, value, valid):
+        self.rows += 1
+        if value is None:
+            self.missing += 1
+        elif valid:
+            self.valid += 1
+            self.total += value
+        else:
+            self.out_of_range += 1
+
+    def observe_counts(self, rows, valid, missing, out_of_range, total):
+        self.rows += rows
+        self.valid += valid
+        self.missing += missing
+        self.out_of_range += out_of_range
+        self.total += total
+
+    def result(self):
+        return {
+            "expected": self.expected,
+            "rows": self.rows,
+            "valid": self.valid,
+            "missing": self.missing,
+            "out_of_range": self.out_of_range,
+            "missing_ratio": round(1.0 - min(self.valid, self.expected) / self.expected, 3),
+        }
+
+
+# =========================
+# 设备级汇总
+# =========================
+
+def staleness_minutes(now, latest_time):
+    return _minutes(now - latest_time) if latest_time else None
+
+
+def summarize(fields, staleness_min=None):
+    """
+    :param fields: {字段标识: PointScan.result() / WindowScan.result()}
+    :param staleness_min: 设备最新数据距当前时间（分钟）
+    :return: (data_quality_flag, data_quality)
+    """
+    flags = []
+    for name, info in fields.items():
+        status = info.get("status")
+        if status == STATUS_FALLBACK:
+            flags.append(f"{name}:fallback_used@{info['value_time']}")
+        elif status in (STATUS_OUT_OF_RANGE, STATUS_MISSING):
+            flags.append(f"{name}:{status}")
+        elif status is None and info["missing_ratio"] > MISSING_RATIO_FLAG:
+            flags.append(f"{name}:missing_ratio={info['missing_ratio']}")
+
+    quality = {
+        "fields": fields,
+        "staleness_min": staleness_min,
+    }
+    return (";".join(flags) or FLAG_NORMAL), quality
+
+
+def dumps_quality(quality):
+    if quality is None:
+        return None
+    return json.dumps(quality, ensure_ascii=False, separators=(",", ":"))
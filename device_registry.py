@@ -0,0 +1,246 @@
+# device_registry.py
+"""
+动态设备注册表
+
+- 来源：devices.yaml（默认）或 ClickHouse 表 iot_db.snow_device_registry；
+  两者都不可用时退回 config.DEVICE_IDS / config.SENSOR_CONFIDENCE_RANGE
+- 支持单设备置信区间覆盖（按字段合并到全局 SENSOR_CONFIDENCE_RANGE 之上）
+- 可选站点坐标 / 海拔（lat / lon / elevation，缺省时读 snowpack/stations/<id>/station.ini）
+  与区域定义（devices.yaml 的 regions，缺省用 config.ARI_REGIONS），见 stations.py / regions.py
+- refresh() 检测到变化后原子替换快照，并通知监听者新增 / 移除的设备，
+  只为新增设备预热状态；调度器在周期开始时调用，周期内快照不变
+- version 是进程内递增序号；跨进程共享的 key（快照 / 空间索引 / ETag）用内容签名 signature
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import config
+
+
+class RegistrySnapshot:
+
+    def __init__(self, devices, source, version, regions=None):
+        """
+        :param devices: [{"device_id", "device_name", "confidence_range"(覆盖项), "lat", "lon", "elevation"}]
+        :param regions: {区域名: {"stations", "center", "radius_km", "method"}}
+        """
+        self.source = source
+        self.version = version
+        self.regions = valid_regions(config.ARI_REGIONS if regions is None else regions)
+        self.devices = {}
+        for d in devices:
+            if d.get("enabled", True) is False:
+                continue
+            ranges = {k: dict(v) for k, v in config.SENSOR_CONFIDENCE_RANGE.items()}
+            for field, override in (d.get("confidence_range") or {}).items():
+                ranges[field] = {**ranges.get(field, {}), **override}
+            device_id = str(d["device_id"])
+            self.devices[device_id] = {
+                "device_id": device_id,
+                "device_name": d.get("device_name") or device_id,
+                "confidence_range": ranges,
+                **{k: d[k] for k in LOCATION_KEYS if d.get(k) is not None},
+            }
+        self.device_ids = list(self.devices)
+        raw = json.dumps([self.devices, self.regions], sort_keys=True, ensure_ascii=False, default=str)
+        self.signature = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    def __contains__(self, device_id):
+        return device_id in self.devices
+
+    def confidence_range(self, device_id, field):
+        dev = self.devices.get(device_id)
+        if dev is None:
+            return config.SENSOR_CONFIDENCE_RANGE.get(field)
+        return dev["confidence_range"].get(field)
+
+
+# 设备条目中的可选站点位置字段
+LOCATION_KEYS = ("lat", "lon", "elevation")
+
+# 区域合成方式（见 regions.py）
+REGION_METHODS = ("max", "elevation_weighted")
+
+
+def _check_region(region):
+    """
+    :return: 规范化后的区域定义（stations 为字符串列表，center / radius_km 为浮点数）
+    :raises ValueError: 定义不合法
+    """
+    if not isinstance(region, dict):
+        raise ValueError("definition must be a mapping")
+    out = dict(region)
+    stations = region.get("stations") or []
+    if not isinstance(stations, (list, tuple)):
+        raise ValueError("stations must be a list")
+    out["stations"] = [str(d) for d in stations]
+
+    center = region.get("center")
+    if center is not None:
+        if not isinstance(center, (list, tuple)) or len(center) != 2:
+            raise ValueError("center must be [lat, lon]")
+        out["center"] = [float(v) for v in center]
+        out["radius_km"] = float(region.get("radius_km") or 0)
+        if out["radius_km"] <= 0:
+            raise ValueError("radius_km must be positive with center")
+    if not out["stations"] and center is None:
+        raise ValueError("needs stations or center / radius_km")
+
+    method = region.get("method")
+    if method is not None and method not in REGION_METHODS:
+        raise ValueError(f"unknown method {method}")
+    return out
+
+
+def valid_regions(regions):
+    """
+    加载时校验区域定义：不合法的区域跳过并记录日志（配置错误不应变成 API 400）
+    """
+    out = {}
+    for name, region in (regions or {}).items():
+        try:
+            out[str(name)] = _check_region(region)
+        except (TypeError, ValueError) as e:
+            print(f"[REGISTRY] region {name} skipped: {e}")
+    return out
+
+
+# =========================
+# 加载
+# =========================
+
+def _registry_path():
+    path = config.DEVICE_REGISTRY_FILE
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def load_from_file(path):
+    """
+    :return: (devices, regions)，文件未定义 regions 时 regions 为 None
+    """
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or {}
+    devices = spec.get("devices") or []
+    for d in devices:
+        if "device_id" not in d:
+            raise ValueError(f"device entry without device_id: {d}")
+    return devices, spec.get("regions")
+
+
+def load_from_table(client):
+    rows = client.execute(
+        """
+        SELECT device_id, device_name, enabled, confidence_range
+        FROM iot_db.snow_device_registry FINAL
+        """
+    )
+    return [
+        {
+            "device_id": device_id,
+            "device_name": device_name,
+            "enabled": bool(enabled),
+            "confidence_range": json.loads(ranges) if ranges else None,
+        }
+        for device_id, device_name, enabled, ranges in rows
+    ]
+
+
+def load_default():
+    return [{"device_id": d} for d in config.DEVICE_IDS]
+
+
+# =========================
+# 注册表
+# =========================
+
+class DeviceRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._signature = None
+        self._checked = 0.0
+        self._listeners = []
+
+    def add_listener(self, fn):
+        """
+        fn(added: list, removed: list, snapshot)，仅在设备集合变化时调用
+        """
+        self._listeners.append(fn)
+
+    def _load(self):
+        if config.DEVICE_REGISTRY_SOURCE == "table":
+            from fetch_data import get_ch_client
+            devices = load_from_table(get_ch_client())
+            return devices, None, "table", json.dumps(devices, sort_keys=True, default=str)
+
+        path = _registry_path()
+        if os.path.exists(path):
+            devices, regions = load_from_file(path)
+            return devices, regions, "file", os.path.getmtime(path)
+        return load_default(), None, "config", None
+
+    def refresh(self):
+        """
+        重新加载（文件按修改时间判断），有变化时原子替换
+        :return: (added, removed)
+        """
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                devices, regions, source, signature = self._load()
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                print(f"[REGISTRY] reload failed, keep version {self._snapshot.version}: {e}")
+                return [], []
+
+            if self._snapshot is not None and (source, signature) == self._signature:
+                return [], []
+
+            old = self._snapshot
+            version = (old.version + 1) if old else 1
+            new = RegistrySnapshot(devices, source, version, regions)
+            self._snapshot = new
+            self._signature = (source, signature)
+
+        old_ids = set(old.device_ids) if old else set()
+        added = [d for d in new.device_ids if d not in old_ids]
+        removed = [d for d in old_ids if d not in new]
+        if old is not None and (added or removed):
+            print(f"[REGISTRY] v{new.version} ({source}): +{added} -{removed}")
+        if added or removed:
+            for fn in self._listeners:
+                try:
+                    fn(added, removed, new)
+                except Exception as e:
+                    print(f"[REGISTRY] listener failed: {e}")
+        return added, removed
+
+    def snapshot(self, max_age_sec=None):
+        """
+        当前快照；超过 max_age_sec（默认 DEVICE_REGISTRY_CHECK_SEC）时先检查更新
+        max_age_sec=float("inf") 表示只读当前快照（调度周期内使用）
+        """
+        if max_age_sec is None:
+            max_age_sec = config.DEVICE_REGISTRY_CHECK_SEC
+        if self._snapshot is None or time.monotonic() - self._checked > max_age_sec:
+            self.refresh()
+        return self._snapshot
+
+
+registry = DeviceRegistry()
+
+
+def get_device_ids():
+    return registry.snapshot().device_ids
+
+
+def get_confidence_range(device_id, field):
+    return registry.snapshot().confidence_range(device_id, field)
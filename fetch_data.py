@@ -1,39 +1,46 @@
 # fetch_data.py
-from clickhouse_driver import Client
 from datetime import datetime, timedelta
-import math
+import json
+import time
 import config
+from device_registry import registry, get_device_ids
+from data_quality import staleness_minutes, summarize
+from query_cache import query_cache
+from cycle_budget import (
+    DEGRADE_CACHED_INPUTS,
+    DEGRADE_NONE,
+    DEGRADE_SKIP_72H,
+    add_flag,
+    degraded_flag,
+)
+from wind_stats import grid_wind_stats, wind_fields
 
 # =========================
 # 基础工具
 # =========================
 
-def _to_float(v):
-    try:
-        if v is None:
-            return None
-        v = float(v)
-        if math.isnan(v):
-            return None
-        return v
-    except Exception:
-        return None
-
-
-def get_ch_client():
+def get_ch_client(**kwargs):
+    """
+    新建 ClickHouse TCP 客户端（驱动在首次调用时才导入，不在 import 阶段连库）
+    """
+    from clickhouse_driver import Client
     return Client(
         host=config.CLICKHOUSE_HOST,
         port=config.CLICKHOUSE_PORT,
         user=config.CLICKHOUSE_USER,
         password=config.CLICKHOUSE_PASSWORD,
         database=config.CLICKHOUSE_DB,
+        **kwargs,
     )
 
 
-def in_confidence_range(value, field):
+def in_confidence_range(value, field, ranges=None):
+    """
+    :param ranges: 设备级置信区间（注册表快照中已合并覆盖项），None 时用全局配置
+    """
     if value is None:
         return False
-    rule = config.SENSOR_CONFIDENCE_RANGE.get(field)
+    rule = (ranges if ranges is not None else config.SENSOR_CONFIDENCE_RANGE).get(field)
     if not rule:
         return True
     return rule["min"] <= value <= rule["max"]
@@ -43,59 +50,249 @@ def in_confidence_range(value, field):
 # 时间策略
 # =========================
 
-def get_calc_anchor_time():
-    return datetime.now() - timedelta(minutes=config.DATA_DELAY_GUARD_MIN)
-
+# 设备新鲜度索引：device_id -> 最新分钟（create_time_min）
+_freshness = {"time": 0.0, "index": {}}
 
-# =========================
-# 单字段可信回溯
-# =========================
-
-def fetch_last_valid_value(client, device_id, field, end_time):
-    start_time = end_time - timedelta(minutes=config.DATA_MAX_LOOKBACK_MIN)
 
+def fetch_device_freshness(client, device_ids):
+    """
+    一次分组查询取所有设备的最新分钟
+    只扫描停报判定窗口内的数据，窗口内无数据的设备不出现在结果中
+    """
+    since = datetime.now() - timedelta(minutes=config.DEVICE_STALE_MIN)
     rows = client.execute(
-        f"""
-        SELECT {field}, create_time_min
+        """
+        SELECT device_id, max(create_time_min)
         FROM iot_db.snow_device_data
-        WHERE device_id = %(device_id)s
-          AND create_time_min < %(end)s
-          AND create_time_min >= %(start)s
-        ORDER BY create_time_min DESC
+        WHERE device_id IN %(device_ids)s
+          AND create_time_min >= %(since)s
+        GROUP BY device_id
         """,
         {
-            "device_id": device_id,
-            "end": end_time,
-            "start": start_time,
+            "device_ids": list(device_ids),
+            "since": since,
         },
     )
+    return {device_id: latest for device_id, latest in rows}
+
+
+def get_device_freshness(client=None, device_ids=None, max_age_sec=None):
+    """
+    带缓存的新鲜度索引，max_age_sec 内重复调用不再查询
+    """
+    device_ids = list(device_ids or get_device_ids())
+    max_age_sec = config.FRESHNESS_TTL_SEC if max_age_sec is None else max_age_sec
+
+    now = time.monotonic()
+    index = _freshness["index"]
+    if now - _freshness["time"] > max_age_sec or any(d not in index for d in device_ids):
+        fetched = fetch_device_freshness(client or get_ch_client(), device_ids)
+        index = {d: fetched.get(d) for d in device_ids}
+        _freshness["index"] = index
+        _freshness["time"] = now
+
+    return {d: index.get(d) for d in device_ids}
+
+
+def warm_device_freshness(device_ids, client=None):
+    """
+    只为新增设备查询新鲜度并并入索引（注册表变更时调用）
+    """
+    if not device_ids:
+        return
+    fetched = fetch_device_freshness(client or get_ch_client(), device_ids)
+    index = dict(_freshness["index"])
+    index.update({d: fetched.get(d) for d in device_ids})
+    _freshness["index"] = index
+
+
+def note_device_freshness(latest):
+    """
+    外部观测到的设备最新分钟并入索引（只前移），nowcast 监视器使用
+    """
+    if not latest:
+        return
+    index = dict(_freshness["index"])
+    for d, t in latest.items():
+        if t is not None and (index.get(d) is None or t > index[d]):
+            index[d] = t
+    _freshness["index"] = index
+
+
+def _on_registry_change(added, removed, snapshot):
+    removed = set(removed)
+    index = {d: t for d, t in _freshness["index"].items() if d not in removed}
+    _freshness["index"] = index
+    if _freshness["time"]:
+        warm_device_freshness(added)
+
+
+registry.add_listener(_on_registry_change)
+
+
+def get_device_anchor_time(latest, now=None):
+    """
+    设备锚点：该设备最新有效分钟，但不晚于 now - DATA_DELAY_GUARD_MIN
+    :return: 锚点时间；设备停报（无数据或过旧）返回 None
+    """
+    now = now or datetime.now()
+    if latest is None:
+        return None
+    if now - latest > timedelta(minutes=config.DEVICE_STALE_MIN):
+        return None
+    guard = (now - timedelta(minutes=config.DATA_DELAY_GUARD_MIN)).replace(second=0, microsecond=0)
+    return min(latest, guard)
 
-    for v, t in rows:
-        v = _to_float(v)
-        if in_confidence_range(v, field):
-            return v, t
 
-    return None, None
+# =========================
+# 查询缓存
+# =========================
+
+def _with_watermark(key, device_id, end_time):
+    guard = datetime.now() - timedelta(minutes=config.DATA_DELAY_GUARD_MIN)
+    if end_time - timedelta(minutes=1) <= guard:
+        return key, config.QUERY_CACHE_IMMUTABLE_TTL_SEC
+    # 仍可能写入：带上设备数据水位线，新数据到达即换 key
+    return key + (_freshness["index"].get(device_id),), config.QUERY_CACHE_TTL_SEC
+
+
+def _device_grid(client, device_id, anchor_time, ranges=None, span_hours=None, budget=None):
+    """
+    设备分钟网格（读穿缓存），所有派生变量共用一次读取
+    :param span_hours: 网格覆盖的小时数（降级时 24），None 为完整 72h
+    :param budget: CycleBudget，记录未命中缓存时的后端读取耗时
+    """
+    from minute_grid import GRID_FIELDS, load_minute_grid
+
+    ranges = ranges if ranges is not None else config.SENSOR_CONFIDENCE_RANGE
+    rules = tuple((f, tuple(sorted(ranges[f].items())) if ranges.get(f) else None) for f in GRID_FIELDS)
+    key, ttl = _with_watermark(("grid", device_id, anchor_time, span_hours, rules), device_id, anchor_time)
+
+    def load():
+        t0 = time.monotonic()
+        grid = load_minute_grid(client, device_id, anchor_time, ranges, span_hours=span_hours)
+        if budget is not None:
+            budget.observe_backend(time.monotonic() - t0)
+        return grid
+
+    return query_cache.get_or_compute(key, load, ttl)
+
+
+def iter_blocks(client, query, params=None):
+    """
+    流式读取：execute_iter 每次返回一块（CH_STREAM_BLOCK_ROWS 行），
+    调用方逐块聚合后丢弃，峰值内存与窗口长度 / 设备数无关
+
+    注意：同一 client 在块迭代完之前不能执行其他查询
+    """
+    return client.execute_iter(
+        query,
+        params,
+        settings={"max_block_size": config.CH_STREAM_BLOCK_ROWS},
+        chunk_size=config.CH_STREAM_BLOCK_ROWS,
+    )
 
 
 # =========================
 # 传感器数据（供 ARI 计算）
 # =========================
 
-def fetch_sensor_data():
+STALE_FLAG = "stale_device"
+
+SENSOR_RESULT_FIELDS = [
+    "snow_depth",
+    "snowfall_24h",
+    "snowfall_72h",
+    "delta_snow_24h",
+    "wind_speed",
+    "temp_avg_24h",
+    "rainfall_24h",
+    *wind_fields(),
+]
+
+
+# 各设备最近一次完整（未降级）取数结果：(取数时间, 结果)，降级时复用
+_last_inputs = {}
+
+
+def _cached_inputs(device_id, now):
+    item = _last_inputs.get(device_id)
+    if item is None or now - item[0] > timedelta(minutes=config.ARI_CACHED_INPUT_MAX_AGE_MIN):
+        return None
+    res = dict(item[1])
+    res["data_quality_flag"] = add_flag(
+        res["data_quality_flag"], degraded_flag("cached_inputs", res["anchor_time"])
+    )
+    return res
+
+
+def _stale_result(device, latest, now):
+    """
+    停报设备：不做任何回溯查询，所有变量不可用（ARI 走兜底）
+    """
+    res = {
+        "device_id": device["device_id"],
+        "device_name": device["device_name"],
+        "anchor_time": latest.strftime("%Y-%m-%d %H:%M:%S") if latest else None,
+        "missing_fields": list(SENSOR_RESULT_FIELDS),
+        "data_quality_flag": STALE_FLAG,
+        "data_quality": {"fields": {}, "staleness_min": staleness_minutes(now, latest)},
+    }
+    res.update({k: None for k in SENSOR_RESULT_FIELDS})
+    return res
+
+
+def fetch_sensor_data(device_ids=None, budget=None):
+    """
+    :param device_ids: 只取这些设备，None 表示注册表中的全部设备
+    :param budget: CycleBudget；预计超出周期预算时逐级降级（见 config.ARI_DEGRADE_AT）
+    """
     client = get_ch_client()
-    anchor_time = get_calc_anchor_time()
+    now = datetime.now()
+
+    # 整个取数过程使用同一份注册表快照
+    snapshot = registry.snapshot()
+    device_ids = [d for d in (device_ids or snapshot.device_ids) if d in snapshot]
+    freshness = get_device_freshness(client, device_ids)
 
     results = {}
 
-    for device_id in config.DEVICE_IDS:
+    for i, device_id in enumerate(device_ids):
+        device = snapshot.devices[device_id]
+        ranges = device["confidence_range"]
+
+        # 每个设备以自己的最新分钟为锚点
+        anchor_minute = get_device_anchor_time(freshness.get(device_id), now)
+        if anchor_minute is None:
+            results[device_id] = _stale_result(device, freshness.get(device_id), now)
+            continue
+
+        # 周期预算：1 级复用上周期输入，2 级只读 24h（跳过 72h 指标）
+        level = budget.level(i, len(device_ids)) if budget is not None else DEGRADE_NONE
+        if level >= DEGRADE_CACHED_INPUTS:
+            cached = _cached_inputs(device_id, now)
+            if cached is not None:
+                results[device_id] = cached
+                continue
+        skip_72h = level >= DEGRADE_SKIP_72H
+
+        # 查询上界为开区间，+1 分钟使锚点分钟本身参与计算
+        anchor_time = anchor_minute + timedelta(minutes=1)
 
         missing_fields = []
+        quality_fields = {}
 
-        # ---------- 雪深 ----------
-        snow_depth_mm, _ = fetch_last_valid_value(
-            client, device_id, "snow_depth", anchor_time
+        # 一次读取 72h + 回溯窗口，所有变量由分钟网格索引得到
+        grid = _device_grid(
+            client, device_id, anchor_time, ranges, span_hours=24 if skip_72h else None, budget=budget
         )
+
+        def scan_point(name, field, end_time):
+            v, _, quality_fields[name] = grid.point(field, end_time)
+            return v
+
+        # ---------- 雪深 ----------
+        snow_depth_mm = scan_point("snow_depth", "snow_depth", anchor_time)
         snow_depth = snow_depth_mm / 1000.0 if snow_depth_mm is not None else None
         if snow_depth is None:
             missing_fields.append("snow_depth")
@@ -103,11 +300,11 @@ def fetch_sensor_data():
         # ---------- 历史雪深 ----------
         def snow_depth_at(hours):
             t = anchor_time - timedelta(hours=hours)
-            v, _ = fetch_last_valid_value(client, device_id, "snow_depth", t)
+            v = scan_point(f"snow_depth@{hours}h", "snow_depth", t)
             return v / 1000.0 if v is not None else None
 
         snow_24 = snow_depth_at(24)
-        snow_72 = snow_depth_at(72)
+        snow_72 = None if skip_72h else snow_depth_at(72)
 
         snowfall_24h = (
             snow_depth - snow_24
@@ -135,67 +332,35 @@ def fetch_sensor_data():
             missing_fields.append("delta_snow_24h")
 
         # ---------- 风速 ----------
-        wind_speed, _ = fetch_last_valid_value(
-            client, device_id, "wind_speed", anchor_time
-        )
+        wind_speed = scan_point("wind_speed", "wind_speed", anchor_time)
         if wind_speed is None:
             missing_fields.append("wind_speed")
 
         # ---------- 24h 平均温度 ----------
         t24 = anchor_time - timedelta(hours=24)
-        rows = client.execute(
-            """
-            SELECT atmospheric_temperature
-            FROM iot_db.snow_device_data
-            WHERE device_id = %(device_id)s
-              AND create_time_min < %(end)s
-              AND create_time_min >= %(start)s
-            """,
-            {
-                "device_id": device_id,
-                "end": anchor_time,
-                "start": t24,
-            },
-        )
-
-        temps = [
-            _to_float(r[0])
-            for r in rows
-            if in_confidence_range(_to_float(r[0]), "atmospheric_temperature")
-        ]
-        temp_avg_24h = sum(temps) / len(temps) if temps else None
+        temps, quality_fields["temp_avg_24h"] = grid.window("atmospheric_temperature", t24, anchor_time)
+        temp_avg_24h = temps.total / temps.valid if temps.valid else None
         if temp_avg_24h is None:
             missing_fields.append("temp_avg_24h")
 
         # ---------- 24h 累计降雨 ----------
-        rows = client.execute(
-            """
-            SELECT rainfall
-            FROM iot_db.snow_device_data
-            WHERE device_id = %(device_id)s
-              AND create_time_min < %(end)s
-              AND create_time_min >= %(start)s
-            """,
-            {
-                "device_id": device_id,
-                "end": anchor_time,
-                "start": t24,
-            },
-        )
-
-        rainfall_vals = [
-            _to_float(r[0])
-            for r in rows
-            if in_confidence_range(_to_float(r[0]), "rainfall")
-        ]
-        rainfall_24h = sum(rainfall_vals) if rainfall_vals else None
+        rainfall, quality_fields["rainfall_24h"] = grid.window("rainfall", t24, anchor_time)
+        rainfall_24h = rainfall.total if rainfall.valid else None
         if rainfall_24h is None:
             missing_fields.append("rainfall_24h")
 
+        # ---------- 24h 风吹雪指标（分钟网格上一次向量化计算） ----------
+        wind, wind_missing, quality_fields["wind_24h"] = grid_wind_stats(grid, anchor_time)
+        missing_fields.extend(wind_missing)
+
+        data_quality_flag, data_quality = summarize(
+            quality_fields, staleness_minutes(now, freshness.get(device_id))
+        )
+
         results[device_id] = {
             "device_id": device_id,
-            "device_name": device_id,
-            "anchor_time": anchor_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "device_name": device["device_name"],
+            "anchor_time": anchor_minute.strftime("%Y-%m-%d %H:%M:%S"),
 
             "snow_depth": snow_depth,
             "snowfall_24h": snowfall_24h,
@@ -205,10 +370,20 @@ def fetch_sensor_data():
             "wind_speed": wind_speed,
             "temp_avg_24h": temp_avg_24h,
             "rainfall_24h": rainfall_24h,
+            **wind,
 
             "missing_fields": list(set(missing_fields)),
+
+            "data_quality_flag": data_quality_flag,
+            "data_quality": data_quality,
         }
 
+        if skip_72h:
+            results[device_id]["data_quality_flag"] = add_flag(data_quality_flag, degraded_flag("skip_72h"))
+            results[device_id]["calc_window_72h"] = "N"
+        else:
+            _last_inputs[device_id] = (now, results[device_id])
+
     return results
 
 
@@ -217,6 +392,9 @@ def fetch_sensor_data():
 # =========================
 
 def fetch_ari_last_valid_n(device_id: str, n: int = 7):
+    """
+    最近 n 个周期的有效结果（nowcast 补算行不计入，否则“最近 7 次”会被压缩到几分钟内）
+    """
     client = get_ch_client()
 
     result = {f"ari_{i}": [] for i in range(1, 6)}
@@ -229,6 +407,7 @@ def fetch_ari_last_valid_n(device_id: str, n: int = 7):
             FROM iot_db.snow_device_ari
             WHERE device_id = %(device_id)s
               AND {field} IS NOT NULL
+              AND ifNull(calc_mode, 'cycle') = 'cycle'
             ORDER BY ari_time DESC
             LIMIT %(limit)s
             """,
@@ -240,3 +419,35 @@ def fetch_ari_last_valid_n(device_id: str, n: int = 7):
         result[field] = [str(r[0]) for r in reversed(rows)]
 
     return result
+
+
+# =========================
+# 数据质量汇总（读取最近一次入库结果）
+# =========================
+
+def fetch_quality_summary(device_ids=None):
+    client = get_ch_client()
+    device_ids = list(device_ids or get_device_ids())
+
+    rows = client.execute(
+        """
+        SELECT
+            device_id,
+            max(ari_time),
+            argMax(data_quality_flag, ari_time),
+            argMax(data_quality_detail, ari_time)
+        FROM iot_db.snow_device_ari
+        WHERE device_id IN %(device_ids)s
+        GROUP BY device_id
+        """,
+        {"device_ids": device_ids},
+    )
+
+    return {
+        device_id: {
+            "ari_time": ari_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "data_quality_flag": flag,
+            "data_quality": json.loads(detail) if detail else None,
+        }
+        for device_id, ari_time, flag, detail in rows
+    }
@@ -0,0 +1,200 @@
+# fetch_sensor_history.py
+"""
+原始传感器历史曲线（服务端降采样）
+
+- minmax / avg：ClickHouse 按 toStartOfInterval 分桶聚合，只返回桶结果
+- lttb：先取 4 倍目标点数的均值桶，再在本地做 LTTB 保形降采样
+- 无论时间范围多大，单字段返回点数不超过 SENSOR_HISTORY_MAX_POINTS
+- 已过写入延迟保护的历史区间不会再变化，结果放入本地 LRU 缓存
+- 风向等环形量（CIRCULAR_FIELDS）：桶内取矢量平均方向，不给 min / max，也不做 LTTB
+  （跨 0°/360° 的算术平均与三角形面积都没有意义）
+"""
+import math
+from datetime import datetime, timedelta
+
+import config
+from device_registry import registry
+from fetch_data import get_ch_client
+from fetch_sensor_realtime import FIELD_MAPPING
+from lazy_import import lazy_module
+from query_cache import QueryCache
+from time_utils import to_naive_local
+
+np = lazy_module("numpy")
+
+SENSOR_HISTORY_MAX_POINTS = 4000
+SENSOR_HISTORY_DEFAULT_POINTS = 1000
+SENSOR_HISTORY_MAX_DAYS = 400
+SENSOR_HISTORY_MAX_FIELDS = 4        # 单次请求最多字段数
+SENSOR_HISTORY_CACHE_BYTES = 32 * 1024 * 1024
+SENSOR_HISTORY_CACHE_TTL_SEC = 24 * 3600
+
+METHODS = ("minmax", "avg", "lttb")
+
+# 分桶宽度候选（秒），取不小于需求的最小值，便于缓存命中与前端对齐
+BUCKET_STEPS = [
+    60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400,
+]
+
+LTTB_OVERSAMPLE = 4
+
+# 环形量（°）
+CIRCULAR_FIELDS = {"wind_direction"}
+
+
+class HistoryQueryError(ValueError):
+    pass
+
+
+def choose_bucket_sec(start, end, points):
+    need = math.ceil((end - start).total_seconds() / max(points, 1))
+    for step in BUCKET_STEPS:
+        if step >= need:
+            return step
+    return math.ceil(need / 86400) * 86400
+
+
+def _floor_time(t, bucket_sec):
+    epoch = int(t.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % bucket_sec)
+
+
+# =========================
+# 查询
+# =========================
+
+def _query_buckets(client, device_id, column, start, end, bucket_sec, rule, circular=False):
+    # 环形量桶均值：单位矢量平均后的方向（0 ~ 360）
+    avg_sql = "avg(v)"
+    if circular:
+        deg = "degrees(atan2(avg(sin(radians(v))), avg(cos(radians(v)))))"
+        avg_sql = f"if({deg} < 0, {deg} + 360, {deg})"
+    range_sql = ""
+    params = {"device_id": device_id, "start": start, "end": end}
+    if rule:
+        range_sql = "AND v >= %(lo)s AND v <= %(hi)s"
+        params.update({"lo": rule["min"], "hi": rule["max"]})
+
+    return client.execute(
+        f"""
+        SELECT
+            toStartOfInterval(create_time_min, INTERVAL {int(bucket_sec)} SECOND) AS b,
+            min(v), max(v), {avg_sql}, count()
+        FROM (
+            SELECT create_time_min, toFloat64OrNull(toString({column})) AS v
+            FROM {config.CLICKHOUSE_DB}.snow_device_data
+            WHERE device_id = %(device_id)s
+              AND create_time_min >= %(start)s
+              AND create_time_min < %(end)s
+        )
+        WHERE v IS NOT NULL {range_sql}
+        GROUP BY b
+        ORDER BY b
+        """,
+        params,
+    )
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 降采样，保留峰谷形状
+    :return: 选中点的下标
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    every = (n - 2) / (n_out - 2)
+
+    a = 0
+    for i in range(n_out - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        nhi = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[hi:nhi].mean(), y[hi:nhi].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+# 已过写入延迟保护的区间不会再变化，按估算内存大小 LRU 淘汰
+history_cache = QueryCache(max_bytes=SENSOR_HISTORY_CACHE_BYTES, name="sensor_history")
+
+
+# =========================
+# 对外入口
+# =========================
+
+def fetch_sensor_history(device_id, field, start, end,
+                         points=SENSOR_HISTORY_DEFAULT_POINTS, method="minmax", client=None):
+    """
+    :param field: FIELD_MAPPING 中的前端字段名
+    :param start / end: 带时区时按本地时区转换
+    :return: 列式数据 {"time": [...], ...}
+        minmax / avg -> time, min, max, avg, count（环形量 min / max 为 None）
+        lttb         -> time, value（环形量按 avg 处理）
+    """
+    column = FIELD_MAPPING.get(field)
+    if column is None:
+        raise HistoryQueryError(f"unknown field: {field}")
+    if method not in METHODS:
+        raise HistoryQueryError(f"unknown method: {method}")
+    start, end = to_naive_local(start), to_naive_local(end)
+    circular = field in CIRCULAR_FIELDS
+    if circular and method == "lttb":
+        method = "avg"
+    if end <= start:
+        raise HistoryQueryError("end must be after start")
+    if end - start > timedelta(days=SENSOR_HISTORY_MAX_DAYS):
+        raise HistoryQueryError(f"range exceeds {SENSOR_HISTORY_MAX_DAYS} days")
+    points = max(3, min(int(points), SENSOR_HISTORY_MAX_POINTS))
+
+    query_points = points * LTTB_OVERSAMPLE if method == "lttb" else points
+    bucket_sec = choose_bucket_sec(start, end, query_points)
+    q_start = _floor_time(start, bucket_sec)
+    q_end = end
+
+    rule = registry.snapshot().confidence_range(device_id, column)
+    immutable = q_end <= datetime.now() - timedelta(minutes=config.DATA_DELAY_GUARD_MIN)
+    key = (device_id, column, bucket_sec, q_start, q_end, method, points)
+
+    if immutable:
+        hit, cached = history_cache.get(key)
+        if hit:
+            return cached
+
+    rows = _query_buckets(client or get_ch_client(), device_id, column, q_start, q_end, bucket_sec, rule, circular)
+
+    times = [b.strftime("%Y-%m-%d %H:%M:%S") for b, _, _, _, _ in rows]
+    if method == "lttb":
+        x = np.array([b.timestamp() for b, _, _, _, _ in rows], dtype=float)
+        y = np.array([r[3] for r in rows], dtype=float)
+        keep = lttb(x, y, points)
+        result = {
+            "time": [times[i] for i in keep],
+            "value": [float(y[i]) for i in keep],
+        }
+    else:
+        result = {
+            "time": times,
+            "min": [None if circular else r[1] for r in rows],
+            "max": [None if circular else r[2] for r in rows],
+            "avg": [r[3] for r in rows],
+            "count": [r[4] for r in rows],
+        }
+        if method == "avg":
+            result = {"time": result["time"], "value": result["avg"], "count": result["count"]}
+
+    meta = {"bucket_sec": bucket_sec, "method": method, "points": len(result["time"])}
+    if circular:
+        meta["circular_mean"] = True
+    out = {"meta": meta, "series": result}
+    if immutable:
+        history_cache.put(key, out, SENSOR_HISTORY_CACHE_TTL_SEC)
+    return out
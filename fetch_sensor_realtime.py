@@ -1,28 +1,24 @@
 # fetch_sensor_realtime.py
-from clickhouse_driver import Client
-from config import (
-    CLICKHOUSE_HOST,
-    CLICKHOUSE_PORT,
-    CLICKHOUSE_USER,
-    CLICKHOUSE_PASSWORD,
-    CLICKHOUSE_DB
-)
-from datetime import datetime
+from config import CLICKHOUSE_DB
+from fetch_data import get_ch_client
 import logging
+import threading
 
-# 配置日志（可选）
-logging.basicConfig(level=logging.INFO)
+# 日志级别由入口（app.py）统一配置，这里只取 logger
 logger = logging.getLogger(__name__)
 
-# 创建 ClickHouse 客户端（使用 TCP 协议）
-client = Client(
-    host=CLICKHOUSE_HOST,
-    port=CLICKHOUSE_PORT,
-    user=CLICKHOUSE_USER,
-    password=CLICKHOUSE_PASSWORD,
-    database=CLICKHOUSE_DB,
-    send_receive_timeout=10
-)
+# ClickHouse 客户端（使用 TCP 协议），首次查询时才创建
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = get_ch_client(send_receive_timeout=10)
+    return _client
 
 # 需要查询的字段和前端展示名称映射
 FIELD_MAPPING = {
@@ -74,7 +70,7 @@ def fetch_realtime_sensor_data(device_id: str) -> dict:
                 LIMIT 1
             """
 
-            rows = client.execute(query, {'device_id': device_id})
+            rows = get_client().execute(query, {'device_id': device_id})
 
             if rows:
                 value, create_time = rows[0]
@@ -0,0 +1,28 @@
+# lazy_import.py
+"""
+重依赖的延迟导入
+
+入口（app / main）import 阶段不加载 numpy / pyarrow 等重依赖（见 bench_startup.py），
+入口会导入的模块用 lazy_module 取得模块代理：首次访问属性时才真正导入，
+之后属性缓存在代理上，与直接使用模块没有差别
+"""
+import importlib
+
+
+class _LazyModule:
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        # 仅在常规属性查找失败时调用：导入模块并缓存该属性
+        value = getattr(importlib.import_module(self._name), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_module(name):
+    return _LazyModule(name)
@@ -1,47 +1,206 @@
 # main.py
 
+import argparse
+import multiprocessing
+import socket
+import threading
 import time
 from datetime import datetime
 from fetch_data import fetch_sensor_data
 from compute_ari import compute_all_ari
-from write_result import write_ari_results
-from config import ARI_INTERVAL_MIN, DATA_DELAY_GUARD_MIN
+from ari_models import reload_models
+from device_registry import registry, get_device_ids
+from write_result import ensure_schema, write_ari_results, write_region_results
+from regions import compute_regions
+from broadcaster import ari_broadcaster
+from alerting import get_alert_engine
+from snapshot import publish_snapshot
+from sharding import ShardWorker, retry_delay, slot_membership, takeover_devices
+from time_utils import floor_to_interval
+from nowcast import start_nowcast_watcher
+from cycle_budget import DEGRADE_DEFER_EXTRAS, DEGRADE_NAMES, CycleBudget, record_cycle
+from config import ARI_INTERVAL_MIN, DATA_DELAY_GUARD_MIN, NOWCAST_ENABLED, SHARD_TICK_SEC
 
-def run_once():
+# 周期计算与 nowcast 补算串行执行（告警状态 / 广播器按顺序更新）
+_run_lock = threading.Lock()
+
+def run_once(device_ids=None, calc_mode="cycle"):
     """
     单次抓取数据、计算 ARI 并写入数据库
+    :param device_ids: 只计算这些设备（分片模式 / nowcast），None 表示全部
+    :param calc_mode: "cycle"（周期计算）或 "nowcast"（事件触发补算）
+    """
+    with _run_lock:
+        if calc_mode != "cycle":
+            return _run_once(device_ids, calc_mode)
+
+        # 周期计算：时间预算 + 周期状态（/healthz /readyz）
+        started_at, budget = datetime.now(), CycleBudget()
+        try:
+            results = _run_once(device_ids, calc_mode, budget)
+        except Exception as e:
+            _record_cycle(started_at, budget, error=e)
+            raise
+        results = results or {}
+        degraded = sum(1 for r in results.values() if "degraded:" in (r.get("data_quality_flag") or ""))
+        _record_cycle(started_at, budget, devices=len(results), degraded=degraded)
+        if degraded or budget.elapsed() > budget.budget_sec:
+            print(f"[ARI] cycle took {budget.elapsed():.1f}s (budget {budget.budget_sec}s, "
+                  f"degrade={DEGRADE_NAMES[budget.max_level]}, {degraded} devices degraded)")
+        return results
+
+
+def _record_cycle(started_at, budget, **kwargs):
+    """
+    周期状态文件写入失败只记录日志：不影响本周期结果，也不跳过 nowcast 基线提交
     """
+    try:
+        return record_cycle(started_at, budget, **kwargs)
+    except Exception as e:
+        print(f"[ARI] cycle status write failed: {e}")
+        return None
+
+
+def _run_once(device_ids, calc_mode, budget=None):
     ari_time = datetime.now()
     print(f"[ARI] start calc at {ari_time}")
 
-    # 获取传感器数据
-    sensor_data = fetch_sensor_data()
+    # 周期开始时检查模型定义 / 设备注册表是否有更新（本周期内固定）
+    models = reload_models()
+    registry.refresh()
+    snap = registry.snapshot(max_age_sec=float("inf"))
+
+    # 获取传感器数据（预计超出周期预算时逐级降级）
+    sensor_data = fetch_sensor_data(device_ids, budget)
     if not sensor_data:
         print("[ARI] no data fetched, skip")
         return
 
     # 计算 ARI
-    ari_results = compute_all_ari(sensor_data)
+    ari_results = compute_all_ari(sensor_data, models)
+
+    # 等级变化告警（内存状态对比，不回查历史）
+    get_alert_engine().process(ari_results, ari_time, calc_mode)
 
     # 写入 ClickHouse
-    write_ari_results(ari_results, ari_time)
+    write_ari_results(ari_results, ari_time, calc_mode)
+
+    # 区域 ARI：只在全量周期合成（分片 / nowcast 只有部分成员的结果），3 级降级时推迟
+    if budget is not None and budget.level() >= DEGRADE_DEFER_EXTRAS:
+        print("[ARI] cycle budget at risk, region results deferred")
+    elif device_ids is None:
+        try:
+            write_region_results(compute_regions(ari_results, snap, models), ari_time)
+        except Exception as e:
+            print(f"[ARI] region results failed: {e}")
+
+    # 推送给 SSE / 长轮询订阅者（nowcast 只在有变化时发 update 事件）
+    ari_broadcaster.publish(ari_results, ari_time, new_cycle=calc_mode == "cycle")
+
+    # 写入共享快照，API 进程同一锚点不再重复计算
+    try:
+        publish_snapshot(sensor_data, ari_results, models, snap)
+    except Exception as e:
+        print(f"[ARI] snapshot write failed: {e}")
 
     print(f"[ARI] finished calc at {datetime.now()}")
+    return ari_results
 
 
-def scheduler_loop():
+def scheduler_loop(nowcast=None):
     """
     定时任务循环，每 ARI_INTERVAL_MIN 分钟执行一次
+    :param nowcast: 同时运行 nowcast 监视器（默认 NOWCAST_ENABLED）
     """
+    nowcast = NOWCAST_ENABLED if nowcast is None else nowcast
+    ensure_schema()
+    watcher = start_nowcast_watcher(lambda ids: run_once(ids, calc_mode="nowcast")) if nowcast else None
+
     while True:
         try:
             run_once()
+            if watcher is not None:
+                watcher.commit()
         except Exception as e:
             print(f"[ARI] Exception occurred: {e}")
         # 等待下一个时间点
         time.sleep(ARI_INTERVAL_MIN * 60)
 
 
+def sharded_scheduler_loop(worker_id=None):
+    """
+    分片模式：每个 worker 只算哈希环上属于自己的设备
+
+    周期按 ARI_INTERVAL_MIN 对齐；周期内每 SHARD_TICK_SEC 检查一次成员变化，
+    有 worker 死亡时接管其未完成的设备。区域结果不入库（见 config.ARI_REGIONS）
+    """
+    ensure_schema()
+    worker = ShardWorker(worker_id)
+    worker.start_heartbeat()
+    print(f"[ARI] shard worker {worker.worker_id} started")
+    if registry.snapshot().regions:
+        print("[ARI] shard mode does not write region results (snow_region_ari); use /api/ari/regions")
+
+    slot, slot_ring, done = None, None, set()
+    failures, retry_at = 0, 0.0
+    try:
+        while True:
+            now_slot = floor_to_interval(datetime.now(), ARI_INTERVAL_MIN)
+            if now_slot != slot:
+                registry.refresh()
+                slot, retry_at = now_slot, 0.0
+                slot_ring, done = slot_membership(worker, slot, get_device_ids())
+
+            if time.monotonic() >= retry_at:
+                try:
+                    todo = takeover_devices(worker, slot, get_device_ids(), done, slot_ring)
+                    if todo:
+                        print(f"[ARI] {worker.worker_id} slot {slot:%H:%M}: {len(todo)} devices")
+                        run_once(todo)
+                        done.update(todo)
+                        worker.mark_completed(slot)
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    delay = retry_delay(failures)
+                    retry_at = time.monotonic() + delay
+                    print(f"[ARI] Exception occurred: {e} (retry in {delay}s)")
+
+            time.sleep(SHARD_TICK_SEC)
+    finally:
+        worker.stop()
+
+
+def spawn_local_workers(n):
+    """
+    本机启动 n 个分片 worker 进程（文件租约）
+    """
+    procs = []
+    for i in range(n):
+        p = multiprocessing.Process(
+            target=sharded_scheduler_loop,
+            args=(f"{socket.gethostname()}-w{i}",),
+            name=f"ari-worker-{i}",
+        )
+        p.start()
+        procs.append(p)
+    for p in procs:
+        p.join()
+
+
 if __name__ == "__main__":
-    print("[ARI] Scheduler started")
-    scheduler_loop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ARI scheduler")
+    parser.add_argument("--shard", action="store_true", help="以分片 worker 运行")
+    parser.add_argument("--worker-id", default=None, help="分片 worker 标识（默认 主机名-pid）")
+    parser.add_argument("--workers", type=int, default=0, help="本机启动 N 个分片 worker")
+    parser.add_argument("--nowcast", action="store_true", help="同时运行分钟级 nowcast 监视器")
+    args = parser.parse_args()
+
+    if args.workers > 0:
+        print(f"[ARI] Scheduler started with {args.workers} local shard workers")
+        spawn_local_workers(args.workers)
+    elif args.shard:
+        sharded_scheduler_loop(args.worker_id)
+    else:
+        print("[ARI] Scheduler started")
+        scheduler_loop(nowcast=args.nowcast or None)
\ No newline at end of file
@@ -0,0 +1,245 @@
+# minute_grid.py
+"""
+单设备分钟网格：一次读取，所有派生变量由索引 / 前缀和得到
+
+- 读取 [锚点 - 72h - DATA_MAX_LOOKBACK_MIN, 锚点) 全部所需字段（一次查询，逐块流式）
+- 每个字段对齐到稠密分钟网格：
+    value       该分钟的可信值（缺失 / 超出置信区间为 NaN）
+    last_valid  该分钟及之前最近一个可信分钟的下标（前向填充，-1 表示无，int32）
+    prefix      缺失 / 超范围 / 可信条数（int32，行数为三者之和）与可信值之和的前缀和
+  只按逐分钟序列读取的字段（SERIES_FIELDS）只保留 value
+  （72h + 48h 回溯约 1.2 MB / 设备，计入 QUERY_CACHE_MAX_BYTES）
+- 单点回溯：last_valid 查表，限制在 DATA_MAX_LOOKBACK_MIN 内，O(1)
+- 窗口均值 / 累计：前缀和相减，O(1)
+数据质量计数与逐行扫描（PointScan / WindowScan）口径一致
+"""
+from datetime import timedelta
+
+import numpy as np
+
+import config
+from data_quality import PointScan, WindowScan
+
+GRID_FIELDS = [
+    "snow_depth",
+    "wind_speed",
+    "atmospheric_temperature",
+    "rainfall",
+    # 风吹雪指标（wind_stats.py）
+    "wind_direction",
+    "x_wind_speed",
+    "y_wind_speed",
+    "z_wind_speed",
+]
+
+# 只经 values() 读取逐分钟序列的字段（风吹雪指标），不建前向填充 / 前缀和
+SERIES_FIELDS = {"wind_direction", "x_wind_speed", "y_wind_speed", "z_wind_speed"}
+
+COUNT_KEYS = ("missing", "out_of_range", "valid")
+
+# 最早用到的时刻：72h 前的雪深，再向前回溯 DATA_MAX_LOOKBACK_MIN
+GRID_SPAN_HOURS = 72
+
+
+class MinuteGrid:
+
+    def __init__(self, start, end, fields, ranges=None):
+        self.start = start
+        self.end = end
+        self.fields = list(fields)
+        self.n = int((end - start).total_seconds() // 60)
+        self._start64 = np.datetime64(start, "s")
+
+        ranges = ranges if ranges is not None else config.SENSOR_CONFIDENCE_RANGE
+        self.rules = {f: ranges.get(f) for f in self.fields}
+
+        n = self.n
+        self.value = {f: np.full(n, np.nan) for f in self.fields}
+        self._counts = {
+            f: {**{k: np.zeros(n, dtype=np.int32) for k in COUNT_KEYS}, "total": np.zeros(n)}
+            for f in self.fields if f not in SERIES_FIELDS
+        }
+
+    @property
+    def nbytes(self):
+        """
+        数组占用字节数（查询缓存按此计入内存上限）
+        """
+        arrays = list(self.value.values())
+        if hasattr(self, "prefix"):
+            arrays += list(self.last_valid.values())
+            arrays += [a for p in self.prefix.values() for a in p.values()]
+        return int(sum(a.nbytes for a in arrays))
+
+    def index(self, t):
+        return int((t - self.start).total_seconds() // 60)
+
+    # =========================
+    # 构建
+    # =========================
+
+    def observe_block(self, block):
+        """
+        :param block: [(create_time_min, 字段1, 字段2, ...)]，字段顺序同 self.fields
+        """
+        if not block:
+            return
+        cols = list(zip(*block))
+        times = np.array(cols[0], dtype="datetime64[s]")
+        idx = ((times - self._start64) // np.timedelta64(60, "s")).astype(np.int64)
+        keep = (idx >= 0) & (idx < self.n)
+        idx = idx[keep]
+
+        for field, raw in zip(self.fields, cols[1:]):
+            v = np.array([_to_float(x) for x in raw], dtype=float)[keep]
+            missing = np.isnan(v)
+            valid = ~missing
+            rule = self.rules[field]
+            if rule:
+                with np.errstate(invalid="ignore"):
+                    valid &= (v >= rule["min"]) & (v <= rule["max"])
+
+            self.value[field][idx[valid]] = v[valid]
+            c = self._counts.get(field)
+            if c is None:
+                continue
+            np.add.at(c["missing"], idx, missing)
+            np.add.at(c["out_of_range"], idx, ~missing & ~valid)
+            np.add.at(c["valid"], idx, valid)
+            np.add.at(c["total"], idx, np.where(valid, v, 0.0))
+
+    def finalize(self):
+        positions = np.arange(self.n, dtype=np.int32)
+        self.last_valid = {}
+        self.prefix = {}
+        for field, c in self._counts.items():
+            self.last_valid[field] = np.maximum.accumulate(np.where(c["valid"] > 0, positions, np.int32(-1)))
+            self.prefix[field] = {k: _prefix_sum(a) for k, a in c.items()}
+        del self._counts
+        return self
+
+    # =========================
+    # 取值
+    # =========================
+
+    def _between(self, field, lo, hi, key):
+        if key == "rows":
+            return sum(self._between(field, lo, hi, k) for k in COUNT_KEYS)
+        p = self.prefix[field][key]
+        return p[hi] - p[lo]
+
+    def point(self, field, end_time, lookback_min=None):
+        """
+        end_time 之前（不含）最近的可信值，最多回溯 lookback_min 分钟
+        :return: (value, time, quality_info)，质量口径同 PointScan 逐行扫描
+        """
+        lookback_min = config.DATA_MAX_LOOKBACK_MIN if lookback_min is None else lookback_min
+        e = min(max(self.index(end_time), 0), self.n)
+        s = min(max(self.index(end_time - timedelta(minutes=lookback_min)), 0), e)
+        j = int(self.last_valid[field][e - 1]) if e > 0 else -1
+
+        scan = PointScan(end_time)
+        if j >= s:
+            # 可信分钟之后的行全部不可信，加上命中的这一行
+            scan.observe_counts(
+                int(self._between(field, j + 1, e, "rows")) + 1,
+                int(self._between(field, j + 1, e, "missing")),
+                int(self._between(field, j + 1, e, "out_of_range")),
+            )
+            t = self.start + timedelta(minutes=j)
+            return float(self.value[field][j]), t, scan.result(t)
+
+        scan.observe_counts(
+            int(self._between(field, s, e, "rows")),
+            int(self._between(field, s, e, "missing")),
+            int(self._between(field, s, e, "out_of_range")),
+        )
+        return None, None, scan.result(None)
+
+    def values(self, field, start_time, end_time):
+        """
+        [start_time, end_time) 内逐分钟可信值（不可信 / 无数据为 NaN），只读视图
+        """
+        e = min(max(self.index(end_time), 0), self.n)
+        s = min(max(self.index(start_time), 0), e)
+        return self.value[field][s:e]
+
+    def window(self, field, start_time, end_time):
+        """
+        [start_time, end_time) 内可信值的条数与之和
+        :return: (WindowScan, quality_info)，质量口径同 WindowScan 逐行扫描
+        """
+        e = min(max(self.index(end_time), 0), self.n)
+        s = min(max(self.index(start_time), 0), e)
+        scan = WindowScan(start_time, end_time)
+        scan.observe_counts(
+            int(self._between(field, s, e, "rows")),
+            int(self._between(field, s, e, "valid")),
+            int(self._between(field, s, e, "missing")),
+            int(self._between(field, s, e, "out_of_range")),
+            float(self._between(field, s, e, "total")),
+        )
+        return scan, scan.result()
+
+
+def _prefix_sum(a):
+    """
+    前缀和（首位补 0），保持输入的 dtype
+    """
+    out = np.zeros(len(a) + 1, dtype=a.dtype)
+    np.cumsum(a, out=out[1:])
+    return out
+
+
+def _to_float(v):
+    try:
+        return float(v) if v is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def grid_span(anchor_time, span_hours=None):
+    """
+    anchor_time（开区间上界）所需的网格起点
+    :param span_hours: 最早取值时刻距锚点的小时数，默认 GRID_SPAN_HOURS（降级时只读 24h）
+    """
+    span_hours = GRID_SPAN_HOURS if span_hours is None else span_hours
+    return anchor_time - timedelta(hours=span_hours, minutes=config.DATA_MAX_LOOKBACK_MIN)
+
+
+def load_minute_grid(client, device_id, anchor_time, ranges=None, fields=None, span_hours=None):
+    """
+    一次查询读取设备整个所需区间并构建网格
+    """
+    from fetch_data import iter_blocks
+
+    fields = fields or GRID_FIELDS
+    start = grid_span(anchor_time, span_hours)
+    blocks = iter_blocks(
+        client,
+        f"""
+        SELECT create_time_min, {", ".join(fields)}
+        FROM iot_db.snow_device_data
+        WHERE device_id = %(device_id)s
+          AND create_time_min < %(end)s
+          AND create_time_min >= %(start)s
+        """,
+        {
+            "device_id": device_id,
+            "end": anchor_time,
+            "start": start,
+        },
+    )
+    return build_minute_grid(blocks, anchor_time, ranges, fields, span_hours)
+
+
+def build_minute_grid(blocks, anchor_time, ranges=None, fields=None, span_hours=None):
+    """
+    由任意块来源构建网格（ClickHouse 流式查询 / Parquet 归档）
+    :param blocks: 可迭代的 [(create_time_min, 字段1, ...)] 块，字段顺序同 fields
+    """
+    fields = fields or GRID_FIELDS
+    grid = MinuteGrid(grid_span(anchor_time, span_hours), anchor_time, fields, ranges)
+    for block in blocks:
+        grid.observe_block(block)
+    return grid.finalize()
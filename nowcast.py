@@ -0,0 +1,271 @@
+# nowcast.py
+"""
+分钟级 nowcast：事件触发的增量重算
+
+- 监视器每 NOWCAST_POLL_SEC 秒只读取各设备水位线之后的新分钟
+  （ClickHouse 水位线查询，或追加写入的本地 JSONL 数据流）
+- 每个监视变量按模型阈值（+ 可选等步长）分档；最新有效值所在分档
+  与上次计算时不同，则该设备进入待算集合
+- 限流：单设备冷却时间 + 全局每小时上限；被限流的设备保留待算，冷却后再算
+- 补算只针对触发的设备（run_once(device_ids, calc_mode="nowcast")），
+  30 分钟周期照常运行，周期结束后以其结果为新的分档基线
+- 补算结果只在有变化时推送 update 事件，不推进告警去抖计数（只确认升级），
+  也不计入“最近 N 次有效结果”（fetch_ari_last_valid_n）
+"""
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime, timedelta
+
+import config
+from ari_models import get_model_set
+from device_registry import registry
+from fetch_data import get_ch_client, in_confidence_range, note_device_freshness
+
+
+# =========================
+# 数据源
+# =========================
+
+def _watch_columns():
+    return {field: spec.get("column", field) for field, spec in config.NOWCAST_WATCH.items()}
+
+
+class ClickHouseSource:
+    """
+    水位线查询：每次只扫描上次水位线之后的新分钟
+    """
+
+    def __init__(self, client=None, lookback_min=None):
+        self.client = client
+        lookback_min = config.NOWCAST_LOOKBACK_MIN if lookback_min is None else lookback_min
+        self.watermark = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=lookback_min)
+
+    def poll(self, device_ids):
+        """
+        :return: [(device_id, create_time_min, {column: 原始值})]，按时间升序
+        """
+        if not device_ids:
+            return []
+        self.client = self.client or get_ch_client()
+        columns = sorted(set(_watch_columns().values()))
+        # 最近 DATA_DELAY_GUARD_MIN 分钟可能尚未写完，留到下次
+        until = (datetime.now() - timedelta(minutes=config.DATA_DELAY_GUARD_MIN)).replace(second=0, microsecond=0)
+        if self.watermark >= until:
+            return []
+
+        rows = self.client.execute(
+            f"""
+            SELECT device_id, create_time_min,
+                   {", ".join(f"toFloat64OrNull(toString({c}))" for c in columns)}
+            FROM {config.CLICKHOUSE_DB}.snow_device_data
+            WHERE device_id IN %(device_ids)s
+              AND create_time_min > %(since)s
+              AND create_time_min <= %(until)s
+            ORDER BY create_time_min
+            """,
+            {"device_ids": list(device_ids), "since": self.watermark, "until": until},
+        )
+
+        self.watermark = until
+        return [(device_id, minute, dict(zip(columns, values))) for device_id, minute, *values in rows]
+
+
+class FeedFileSource:
+    """
+    追加写入的 JSONL 数据流（网关本地转发），每行：
+    {"device_id": "...", "create_time": "2024-12-01 10:07:00", "wind_speed": 9.3, ...}
+    """
+
+    def __init__(self, path=None):
+        path = path or config.NOWCAST_FEED_FILE
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+        self.path = path
+        # 从文件末尾开始，只看启动之后的新数据
+        self.offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def poll(self, device_ids):
+        if not os.path.exists(self.path):
+            return []
+        if os.path.getsize(self.path) < self.offset:
+            self.offset = 0  # 文件被轮转
+        wanted = set(device_ids)
+        columns = set(_watch_columns().values())
+
+        out = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # 半行，等下次
+                self.offset += len(line.encode("utf-8"))
+                try:
+                    item = json.loads(line)
+                    minute = datetime.fromisoformat(item["create_time"]).replace(second=0, microsecond=0)
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if item.get("device_id") not in wanted:
+                    continue
+                out.append((item["device_id"], minute, {c: item.get(c) for c in columns if c in item}))
+        return out
+
+
+def build_source():
+    if config.NOWCAST_SOURCE == "feed":
+        return FeedFileSource()
+    return ClickHouseSource()
+
+
+# =========================
+# 限流
+# =========================
+
+class RateLimiter:
+
+    def __init__(self, cooldown_sec=None, max_per_hour=None):
+        self.cooldown_sec = config.NOWCAST_DEVICE_COOLDOWN_SEC if cooldown_sec is None else cooldown_sec
+        self.max_per_hour = config.NOWCAST_MAX_PER_HOUR if max_per_hour is None else max_per_hour
+        self._last = {}
+        self._window = deque()
+
+    def acquire(self, device_ids, now=None):
+        """
+        :return: 本次允许补算的设备
+        """
+        now = time.monotonic() if now is None else now
+        while self._window and now - self._window[0] > 3600:
+            self._window.popleft()
+
+        allowed = []
+        for d in device_ids:
+            if len(self._window) >= self.max_per_hour:
+                break
+            if now - self._last.get(d, -math.inf) < self.cooldown_sec:
+                continue
+            self._last[d] = now
+            self._window.append(now)
+            allowed.append(d)
+        return allowed
+
+
+# =========================
+# 监视器
+# =========================
+
+class NowcastWatcher:
+
+    def __init__(self, recompute, source=None, limiter=None):
+        """
+        :param recompute: fn(device_ids)，只为这些设备重算 ARI
+        """
+        self.recompute = recompute
+        self.source = source or build_source()
+        self.limiter = limiter or RateLimiter()
+        self._lock = threading.Lock()
+        self._current = {}      # device_id -> {field: 分档}
+        self._committed = {}    # device_id -> {field: 上次计算时的分档}
+        self._pending = set()
+        self._thresholds = {"version": None, "fields": {}}
+
+    def _field_thresholds(self, field):
+        models = get_model_set()
+        if self._thresholds["version"] != models.version:
+            self._thresholds = {
+                "version": models.version,
+                "fields": {f: models.thresholds(f) for f in config.NOWCAST_WATCH},
+            }
+        return self._thresholds["fields"][field]
+
+    def band(self, field, value):
+        """
+        模型单位下的分档：(所在阈值区间, 等步长档位)
+        """
+        step = config.NOWCAST_WATCH[field].get("step")
+        return (
+            bisect_right(self._field_thresholds(field), value),
+            math.floor(value / step) if step else None,
+        )
+
+    def observe(self, observations):
+        """
+        :param observations: 数据源 poll() 的输出
+        :return: 各设备最新分钟
+        """
+        snapshot = registry.snapshot()
+        latest = {}
+        for device_id, minute, values in observations:
+            if device_id not in snapshot:
+                continue
+            ranges = snapshot.devices[device_id]["confidence_range"]
+            latest[device_id] = max(minute, latest.get(device_id, minute))
+            for field, spec in config.NOWCAST_WATCH.items():
+                column = spec.get("column", field)
+                raw = values.get(column)
+                try:
+                    raw = None if raw is None else float(raw)
+                except (TypeError, ValueError):
+                    raw = None
+                if raw is None or not in_confidence_range(raw, column, ranges):
+                    continue
+                band = self.band(field, raw * spec.get("scale", 1.0))
+                with self._lock:
+                    self._current.setdefault(device_id, {})[field] = band
+                    # 首次看到：作为基线
+                    self._committed.setdefault(device_id, {}).setdefault(field, band)
+
+        # 以最新值判断：窗口内冲高又回落到原分档的不触发
+        with self._lock:
+            for device_id in latest:
+                if self._current.get(device_id, {}) != self._committed.get(device_id, {}):
+                    self._pending.add(device_id)
+                else:
+                    self._pending.discard(device_id)
+        return latest
+
+    def commit(self, device_ids=None):
+        """
+        这些设备刚完成计算：当前分档即新基线
+        """
+        with self._lock:
+            for d in (self._current if device_ids is None else device_ids):
+                self._committed[d] = dict(self._current.get(d, {}))
+                self._pending.discard(d)
+
+    def poll_once(self):
+        """
+        :return: 本次补算的设备
+        """
+        latest = self.observe(self.source.poll(registry.snapshot().device_ids))
+        # 让补算直接锚定在刚看到的分钟上，不等新鲜度索引过期
+        note_device_freshness(latest)
+
+        with self._lock:
+            pending = sorted(self._pending)
+        ready = self.limiter.acquire(pending)
+        if not ready:
+            return []
+
+        print(f"[NOWCAST] band crossed, recompute {ready}")
+        self.recompute(ready)
+        self.commit(ready)
+        return ready
+
+    def run(self, stop=None):
+        stop = stop or threading.Event()
+        while not stop.wait(config.NOWCAST_POLL_SEC):
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"[NOWCAST] poll failed: {e}")
+
+
+def start_nowcast_watcher(recompute):
+    watcher = NowcastWatcher(recompute)
+    t = threading.Thread(target=watcher.run, name="ari-nowcast", daemon=True)
+    t.start()
+    return watcher
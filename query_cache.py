@@ -0,0 +1,123 @@
+# query_cache.py
+"""
+取数查询的进程内读穿缓存（LRU + TTL，按估算内存大小淘汰）
+
+- 已过写入延迟保护的历史窗口不会再变化：长 TTL，key 不含水位线
+- 仍可能有数据写入的窗口：key 带设备数据水位线（新鲜度索引中的最新分钟），
+  水位线前移即自然失效，并用短 TTL 兜底
+- 命中 / 未命中 / 淘汰计数通过 stats() 暴露（/api/metrics）
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+def estimate_size(obj, _depth=0):
+    """
+    粗略估算对象占用字节数（容器递归三层；带 nbytes 的对象如 numpy 数组 / 分钟网格直接取其值）
+    """
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return sys.getsizeof(obj) + nbytes
+    size = sys.getsizeof(obj)
+    if _depth >= 3:
+        return size
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(estimate_size(v, _depth + 1) for v in obj)
+    return size
+
+
+class QueryCache:
+
+    def __init__(self, max_bytes=None, name="query"):
+        self.name = name
+        self.max_bytes = config.QUERY_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self._data = OrderedDict()   # key -> (expire_at, size, value)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key):
+        """
+        :return: (命中, 值)
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < now:
+                self._remove(key)
+                self.expired += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, item[2]
+
+    def peek(self, key):
+        """
+        :return: (估算字节数, 值)，不存在时 None；不计入命中统计、不调整 LRU 顺序、不检查过期
+        """
+        with self._lock:
+            item = self._data.get(key)
+            return (item[1], item[2]) if item is not None else None
+
+    def put(self, key, value, ttl_sec, size=None):
+        """
+        :param size: 已知的估算字节数（调用方确认值未变时复用，省去逐次 estimate_size）
+        """
+        size = estimate_size(key) + estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl_sec, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_key = next(iter(self._data))
+                self._remove(old_key)
+                self.evictions += 1
+
+    def get_or_compute(self, key, fn, ttl_sec):
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = fn()
+        self.put(key, value, ttl_sec)
+        return value
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+
+query_cache = QueryCache()
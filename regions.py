@@ -0,0 +1,116 @@
+# regions.py
+"""
+区域（多站点）ARI：把覆盖同一雪崩路径的多个站点结果合成一个区域视图
+
+成员：区域定义中 stations 显式列出的站点 + center / radius_km 空间范围内的站点（SpatialIndex）
+合成方式：
+- max                 综合等级、阈值等级取成员中最严重；ari_1 / ari_2 取最大值
+- elevation_weighted  ari_1 / ari_2 按成员海拔加权平均（缺海拔的成员不参与加权，
+                      全部缺失时退化为等权）；ari_3 ~ ari_5、阈值等级仍取最严重
+停报 / 无值成员不参与合成，reporting 给出实际参与的成员数
+"""
+from alerting import level_rank, more_severe
+from ari_models import NO_LEVEL, get_model_set
+from ari_stats import combined_level
+from device_registry import REGION_METHODS, registry
+from fetch_data import STALE_FLAG
+from stations import get_station_index
+
+METHOD_MAX = "max"
+METHOD_ELEVATION = "elevation_weighted"
+METHODS = REGION_METHODS
+
+NUMERIC_FIELDS = ("ari_1", "ari_2")
+LEVEL_FIELDS = ("ari_3", "ari_4", "ari_5")
+
+
+def resolve_members(region, snapshot, index):
+    """
+    :return: 成员 device_id 列表（仅注册表中的设备，保持定义顺序，空间成员按距离）
+    """
+    members = [d for d in region.get("stations") or [] if d in snapshot]
+    center = region.get("center")
+    if center and region.get("radius_km"):
+        lat, lon = center
+        for device_id, _ in index.within(float(lat), float(lon), float(region["radius_km"])):
+            if device_id not in members:
+                members.append(device_id)
+    return members
+
+
+def _reporting(res):
+    if res is None or STALE_FLAG in (res.get("data_quality_flag") or ""):
+        return False
+    return any(res.get(f) is not None for f in NUMERIC_FIELDS + LEVEL_FIELDS)
+
+
+def aggregate_region(name, region, members, results, meta, models=None):
+    """
+    :param results: {device_id: ARI 结果}（compute_all_ari 输出）
+    :param meta: station_meta()
+    """
+    models = models or get_model_set()
+    method = region.get("method") or METHOD_MAX
+    if method not in METHODS:
+        raise ValueError(f"region {name}: unknown method {method}")
+
+    live = [d for d in members if _reporting(results.get(d))]
+    stations = {}
+    agg = {f: None for f in NUMERIC_FIELDS}
+    agg.update({f: NO_LEVEL for f in LEVEL_FIELDS})
+    threshold_level = NO_LEVEL
+    worst, worst_level = None, NO_LEVEL
+
+    for d in live:
+        res = results[d]
+        level = combined_level(res, models)
+        stations[d] = level
+        if worst is None or level_rank(level) > level_rank(worst_level):
+            worst, worst_level = d, level
+        for f in LEVEL_FIELDS:
+            agg[f] = more_severe(agg[f], res.get(f))
+        threshold_level = more_severe(threshold_level, res.get("threshold_level"))
+
+    for f in NUMERIC_FIELDS:
+        values = [(d, results[d][f]) for d in live if results[d].get(f) is not None]
+        if not values:
+            continue
+        if method == METHOD_MAX:
+            agg[f] = max(v for _, v in values)
+        else:
+            pairs = [(meta.get(d, {}).get("elevation"), v) for d, v in values]
+            pairs = [(w, v) for w, v in pairs if w and w > 0] or [(1.0, v) for _, v in values]
+            agg[f] = sum(w * v for w, v in pairs) / sum(w for w, _ in pairs)
+
+    if method == METHOD_MAX:
+        level = worst_level
+    else:
+        level = combined_level(agg, models)
+
+    return {
+        "region": name,
+        "method": method,
+        "members": members,
+        "reporting": len(live),
+        "ari_level": level,
+        **agg,
+        "threshold_level": threshold_level,
+        "worst_station": worst,
+        "stations": stations,
+    }
+
+
+def compute_regions(results, snapshot=None, models=None, names=None):
+    """
+    :param names: 只合成这些区域，None 表示全部
+    :return: {区域名: 区域结果}
+    """
+    snapshot = snapshot or registry.snapshot()
+    meta, index = get_station_index(snapshot)
+    out = {}
+    for name, region in snapshot.regions.items():
+        if names is not None and name not in names:
+            continue
+        members = resolve_members(region, snapshot, index)
+        out[name] = aggregate_region(name, region, members, results, meta, models)
+    return out
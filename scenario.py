@@ -0,0 +1,210 @@
+# scenario.py
+"""
+情景 / what-if 评估
+
+以当前各站输入（ARI 快照或调用方给定）为基准，按参数网格做扰动，
+所有 “站点 × 情景” 组合一次性交给 compute_ari_batch 向量化计算，返回等级分布。
+
+网格写法（每个轴取笛卡尔积）：
+    {
+        "new_snow_24h": [0, 0.1, 0.3],                    # 24h 新增降雪（m），联动雪深 / 增雪量（只支持 add）
+        "wind_speed": [5, 10],                            # 直接赋值（op 默认 set）
+        "temp_avg_24h": {"op": "add", "values": [-2, 2]}, # 在当前值上加减
+        "rainfall_24h": {"op": "scale", "values": [1, 2]} # 按比例缩放
+    }
+"""
+import itertools
+
+from admission import admitted
+from compute_ari import BATCH_INPUT_FIELDS, compute_ari_batch
+from lazy_import import lazy_module
+from snapshot import get_current_ari
+
+np = lazy_module("numpy")
+
+# 单次请求允许的最大评估次数（站点数 × 情景数）
+SCENARIO_MAX_EVALS = 200000
+
+LEVEL_OUTPUTS = [
+    "ari_1_level",
+    "ari_2_level",
+    "ari_3",
+    "ari_4",
+    "ari_5",
+    "threshold_level",
+]
+
+# 派生扰动：24h 新增降雪同时影响以下变量（delta_snow_24h 以减少为正，取反）
+NEW_SNOW_EFFECT = {
+    "snow_depth": 1.0,
+    "snowfall_24h": 1.0,
+    "snowfall_72h": 1.0,
+    "delta_snow_24h": -1.0,
+}
+
+OPS = ("set", "add", "scale")
+
+class ScenarioError(ValueError):
+    pass
+
+
+# =========================
+# 基准输入
+# =========================
+
+def get_base_inputs():
+    """
+    当前锚点的输入快照：与 /api/ari 共用 ari_compute 闸门（并发合并，过载时用上次结果）
+    :return: (inputs, stale_age)
+    """
+    (sensor_data, _), stale_age = admitted("ari_compute", "current", get_current_ari)
+    return sensor_data, stale_age
+
+
+# =========================
+# 网格解析
+# =========================
+
+def _parse_axis(name, spec):
+    # new_snow_24h 本身就是增量：默认 add，不支持 set / scale
+    default_op = "add" if name == "new_snow_24h" else "set"
+    if isinstance(spec, dict):
+        op = spec.get("op", default_op)
+        values = spec.get("values")
+    else:
+        op, values = default_op, spec
+
+    if name != "new_snow_24h" and name not in BATCH_INPUT_FIELDS:
+        raise ScenarioError(f"unknown scenario field: {name}")
+    if op not in OPS or (name == "new_snow_24h" and op != "add"):
+        raise ScenarioError(f"unsupported op for {name}: {op}")
+    if not isinstance(values, (list, tuple)) or not values:
+        raise ScenarioError(f"values for {name} must be a non-empty list")
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        raise ScenarioError(f"values for {name} must be numbers")
+
+    return name, op, np.asarray(values, dtype=float)
+
+
+def _base_value(device_id, field, v):
+    if v is None:
+        return float("nan")
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        raise ScenarioError(f"input {field} of {device_id} is not a number: {v!r}")
+
+
+def _check_request(grid, base_inputs, device_ids):
+    if grid is not None and not isinstance(grid, dict):
+        raise ScenarioError("grid must be an object")
+    if base_inputs is not None and (
+        not isinstance(base_inputs, dict) or not all(isinstance(v, dict) for v in base_inputs.values())
+    ):
+        raise ScenarioError("inputs must be an object of {device_id: {field: value}}")
+    if device_ids is not None and (
+        not isinstance(device_ids, list) or not all(isinstance(d, str) for d in device_ids)
+    ):
+        raise ScenarioError("device_ids must be a list of strings")
+
+
+def _apply(columns, name, op, values):
+    """
+    columns: {变量: (站点数, 情景数) 数组}；values: 每个情景对应的扰动值
+    """
+    if name == "new_snow_24h":
+        for field, sign in NEW_SNOW_EFFECT.items():
+            columns[field] = columns[field] + sign * values
+        return
+
+    if op == "set":
+        columns[name] = np.broadcast_to(values, columns[name].shape).copy()
+    elif op == "add":
+        columns[name] = columns[name] + values
+    else:
+        columns[name] = columns[name] * values
+
+
+# =========================
+# 评估
+# =========================
+
+def run_scenarios(grid, base_inputs=None, device_ids=None):
+    """
+    :param grid: 参数网格（见模块说明）
+    :param base_inputs: {device_id: 输入dict}，None 时使用当前 ARI 快照
+    :param device_ids: 只评估这些站点
+    :return: {"scenarios": 情景数, "devices": {device_id: 分布}, "overall": 分布}
+    """
+    _check_request(grid, base_inputs, device_ids)
+    if base_inputs is None:
+        base_inputs, _ = get_base_inputs()
+    if device_ids:
+        wanted = set(device_ids)
+        base_inputs = {k: v for k, v in base_inputs.items() if k in wanted}
+    if not base_inputs:
+        raise ScenarioError("no base inputs")
+
+    axes = [_parse_axis(name, spec) for name, spec in (grid or {}).items()]
+    n_scen = int(np.prod([len(a[2]) for a in axes])) if axes else 1
+    devices = list(base_inputs)
+    n_dev = len(devices)
+    if n_scen * n_dev > SCENARIO_MAX_EVALS:
+        raise ScenarioError(
+            f"too many evaluations: {n_dev} devices x {n_scen} scenarios > {SCENARIO_MAX_EVALS}"
+        )
+
+    # (站点, 1) 基准列
+    columns = {}
+    for f in BATCH_INPUT_FIELDS:
+        base = np.array([_base_value(d, f, base_inputs[d].get(f)) for d in devices], dtype=float)
+        columns[f] = np.broadcast_to(base[:, None], (n_dev, n_scen))
+
+    # 每个轴展开到情景维（笛卡尔积）
+    if axes:
+        mesh = np.meshgrid(*[a[2] for a in axes], indexing="ij")
+        for (name, op, _), vals in zip(axes, mesh):
+            _apply(columns, name, op, vals.reshape(-1)[None, :])
+
+    out = compute_ari_batch({k: v.reshape(-1) for k, v in columns.items()})
+
+    result = {"scenarios": n_scen, "devices": {}, "overall": {}}
+    for field in LEVEL_OUTPUTS:
+        levels = out[field].reshape(n_dev, n_scen)
+        result["overall"][field] = _distribution(levels.reshape(-1))
+        for i, device_id in enumerate(devices):
+            result["devices"].setdefault(device_id, {})[field] = _distribution(levels[i])
+
+    ari_1 = out["ari_1"].reshape(n_dev, n_scen)
+    for i, device_id in enumerate(devices):
+        row = ari_1[i]
+        result["devices"][device_id]["ari_1_max"] = (
+            None if np.isnan(row).all() else round(float(np.nanmax(row)), 4)
+        )
+
+    result["axes"] = [
+        {"field": name, "op": op, "values": vals.tolist()} for name, op, vals in axes
+    ]
+    return result
+
+
+def _distribution(levels):
+    """
+    等级 -> 占比
+    """
+    labels, counts = np.unique(levels.astype(str), return_counts=True)
+    total = int(counts.sum())
+    return {str(l): round(int(c) / total, 4) for l, c in zip(labels, counts)}
+
+
+def scenario_combinations(grid):
+    """
+    按顺序列出每个情景的参数组合（与 run_scenarios 的情景维一一对应）
+    """
+    if grid is not None and not isinstance(grid, dict):
+        raise ScenarioError("grid must be an object")
+    axes = [_parse_axis(name, spec) for name, spec in (grid or {}).items()]
+    return [
+        dict(zip([a[0] for a in axes], combo))
+        for combo in itertools.product(*[a[2].tolist() for a in axes])
+    ]
@@ -0,0 +1,314 @@
+# sharding.py
+"""
+多 worker 分片调度
+
+- 设备按一致性哈希环分给当前存活的 worker（每个 worker 多个虚拟节点）
+- 存活判定走租约：worker 定期心跳，超过 SHARD_LEASE_TTL_SEC 未续约视为死亡
+  - 本地：租约目录下每个 worker 一个文件（fcntl 文件锁保护）
+  - 多节点：ClickHouse 表 iot_db.ari_worker_lease
+- 故障转移：worker 死亡后哈希环重算，接管者在当前周期内补算
+  原 owner 尚未完成的设备（租约里记录了 completed_slot）
+- 周期中途加入（滚动重启）：按周期开始时的成员判断原 owner，不重算原 owner 已负责的设备
+- 周期计算失败后按 retry_delay 指数退避重试
+"""
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+import config
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class HashRing:
+
+    def __init__(self, workers, vnodes=None):
+        vnodes = vnodes or config.SHARD_VNODES
+        self.workers = sorted(workers)
+        points = sorted(
+            (_hash(f"{w}#{i}"), w) for w in self.workers for i in range(vnodes)
+        )
+        self._keys = [p for p, _ in points]
+        self._owners = [w for _, w in points]
+
+    def owner(self, device_id):
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(device_id)) % len(self._keys)
+        return self._owners[i]
+
+    def assign(self, device_ids, worker_id):
+        return [d for d in device_ids if self.owner(d) == worker_id]
+
+
+# =========================
+# 租约存储
+# =========================
+
+class FileLeaseStore:
+    """
+    本地多进程：租约目录下 <worker_id>.lease
+    """
+
+    def __init__(self, lease_dir=None):
+        self.lease_dir = lease_dir or config.SHARD_LEASE_DIR
+        if not os.path.isabs(self.lease_dir):
+            self.lease_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.lease_dir)
+        os.makedirs(self.lease_dir, exist_ok=True)
+        self._lock_path = os.path.join(self.lease_dir, ".lock")
+
+    def _locked(self, fn):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return fn()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def heartbeat(self, lease):
+        path = os.path.join(self.lease_dir, f"{lease['worker_id']}.lease")
+
+        def write():
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(lease, f)
+            os.replace(tmp, path)
+
+        self._locked(write)
+
+    def release(self, worker_id):
+        path = os.path.join(self.lease_dir, f"{worker_id}.lease")
+        self._locked(lambda: os.path.exists(path) and os.remove(path))
+
+    def leases(self):
+        def read():
+            out = {}
+            for name in os.listdir(self.lease_dir):
+                if not name.endswith(".lease"):
+                    continue
+                try:
+                    with open(os.path.join(self.lease_dir, name)) as f:
+                        lease = json.load(f)
+                    out[lease["worker_id"]] = lease
+                except (OSError, ValueError, KeyError):
+                    continue
+            return out
+
+        return self._locked(read)
+
+
+class ClickHouseLeaseStore:
+    """
+    多节点：ReplacingMergeTree 租约表 iot_db.ari_worker_lease
+    （建表语句见 write_result.MIGRATIONS，分片调度启动时由 ensure_schema 执行）
+    """
+
+    def __init__(self, client=None):
+        from fetch_data import get_ch_client
+        self.client = client or get_ch_client()
+
+    def heartbeat(self, lease, released=0):
+        self.client.execute(
+            """
+            INSERT INTO iot_db.ari_worker_lease
+            (worker_id, heartbeat, host, pid, completed_slot, released) VALUES
+            """,
+            [(
+                lease["worker_id"],
+                lease["heartbeat"],
+                lease["host"],
+                lease["pid"],
+                lease.get("completed_slot") or "",
+                released,
+            )],
+        )
+
+    def release(self, worker_id):
+        self.heartbeat(
+            {"worker_id": worker_id, "heartbeat": time.time(), "host": "", "pid": 0},
+            released=1,
+        )
+
+    def leases(self):
+        since = time.time() - 10 * config.SHARD_LEASE_TTL_SEC
+        rows = self.client.execute(
+            """
+            SELECT
+                worker_id,
+                max(heartbeat),
+                argMax(completed_slot, heartbeat),
+                argMax(released, heartbeat)
+            FROM iot_db.ari_worker_lease
+            WHERE heartbeat >= %(since)s
+            GROUP BY worker_id
+            """,
+            {"since": since},
+        )
+        return {
+            worker_id: {
+                "worker_id": worker_id,
+                "heartbeat": hb,
+                "completed_slot": slot or None,
+            }
+            for worker_id, hb, slot, released in rows
+            if not released
+        }
+
+
+def build_lease_store():
+    if config.SHARD_LEASE_BACKEND == "clickhouse":
+        return ClickHouseLeaseStore()
+    return FileLeaseStore()
+
+
+# =========================
+# Worker
+# =========================
+
+class ShardWorker:
+
+    def __init__(self, worker_id=None, store=None, ttl_sec=None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.store = store or build_lease_store()
+        self.ttl_sec = ttl_sec or config.SHARD_LEASE_TTL_SEC
+        self.completed_slot = None
+        self.started_at = datetime.now()
+        self.previous_lease = None     # 同一 worker_id 上一次运行留下的租约（崩溃重启时）
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _lease(self):
+        return {
+            "worker_id": self.worker_id,
+            "heartbeat": time.time(),
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "completed_slot": self.completed_slot,
+        }
+
+    def heartbeat(self):
+        self.store.heartbeat(self._lease())
+
+    def start_heartbeat(self):
+        """
+        后台线程按 TTL/3 续约；周期计算耗时较长时租约也不会过期
+        """
+        self.previous_lease = self.store.leases().get(self.worker_id)
+        self.heartbeat()
+
+        def loop():
+            while not self._stop.wait(self.ttl_sec / 3.0):
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    print(f"[SHARD] {self.worker_id} heartbeat failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="ari-shard-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.store.release(self.worker_id)
+        except Exception as e:
+            print(f"[SHARD] {self.worker_id} release failed: {e}")
+
+    def live_leases(self):
+        now = time.time()
+        leases = {
+            w: l for w, l in self.store.leases().items()
+            if now - l["heartbeat"] <= self.ttl_sec
+        }
+        leases.setdefault(self.worker_id, self._lease())
+        return leases
+
+    def ring(self, leases=None):
+        return HashRing(list(leases or self.live_leases()))
+
+    def mark_completed(self, slot):
+        self.completed_slot = slot_key(slot)
+        self.heartbeat()
+
+
+def slot_key(slot):
+    return slot.strftime("%Y-%m-%d %H:%M") if isinstance(slot, datetime) else slot
+
+
+def slot_membership(worker, slot, device_ids):
+    """
+    周期开始时的哈希环，以及本 worker 在该周期已完成的设备
+
+    周期开始后才启动的 worker 不属于该周期的成员：原 owner 存活或已完成时不重算，
+    避免重复写入；同一 worker_id 崩溃后重启时沿用上一次运行的成员身份与 completed_slot
+    :return: (slot_ring, done)
+    """
+    leases = worker.live_leases()
+    if worker.started_at <= slot:
+        return worker.ring(leases), set()
+
+    members = [w for w in leases if w != worker.worker_id]
+    prev = worker.previous_lease
+    restarted = prev is not None and worker.started_at.timestamp() - prev["heartbeat"] <= worker.ttl_sec
+    if restarted:
+        members.append(worker.worker_id)
+    if not members:
+        return worker.ring(leases), set()
+
+    ring = HashRing(members)
+    done = set()
+    if restarted and prev.get("completed_slot") == slot_key(slot):
+        done = set(ring.assign(device_ids, worker.worker_id))
+    return ring, done
+
+
+def retry_delay(failures):
+    """
+    连续失败 failures 次后下一次重试前的等待秒数
+    """
+    return min(config.SHARD_TICK_SEC * 2 ** max(failures - 1, 0), config.SHARD_RETRY_MAX_SEC)
+
+
+def takeover_devices(worker, slot, device_ids, done, slot_ring):
+    """
+    当前周期内本 worker 需要（补）算的设备
+
+    - 周期开始时的哈希环分给本 worker 的设备：始终由本 worker 负责（含失败后的重试），
+      即使周期中途有 worker 加入、当前环已把它们分给别人（加入者按周期开始时的成员不会接手）
+    - 当前环分给本 worker、而周期开始时的 owner 已死亡且未完成本周期的设备：接管补算
+
+    :param slot_ring: 周期开始时的哈希环，None 表示以当前环为准
+    :param done: 本周期本 worker 已算完的设备
+    """
+    leases = worker.live_leases()
+    current = worker.ring(leases)
+    slot_ring = slot_ring or current
+    mine = set(slot_ring.assign(device_ids, worker.worker_id))
+    owned_now = set(current.assign(device_ids, worker.worker_id))
+    key = slot_key(slot)
+
+    todo = []
+    for d in device_ids:
+        if d in done:
+            continue
+        if d not in mine:
+            if d not in owned_now:
+                continue
+            # 原 owner 仍存活或已完成本周期，则不重复计算
+            prev = slot_ring.owner(d)
+            if prev in leases or _completed_by_dead(worker, prev, key):
+                continue
+        todo.append(d)
+    return todo
+
+
+def _completed_by_dead(worker, worker_id, key):
+    lease = worker.store.leases().get(worker_id)
+    return lease is not None and lease.get("completed_slot") == key
@@ -0,0 +1,220 @@
+# snapshot.py
+"""
+ARI 结果快照：进程内 single-flight + 跨进程文件快照
+
+同一锚点（各设备锚点时间 + 模型版本 + 注册表内容签名）只计算一次：
+- 进程内：并发请求共享同一次 fetch_sensor_data + compute_all_ari
+- 跨进程（gunicorn 多 worker / 与 main.py 并存）：抢到文件锁的进程计算并写快照，
+  其余进程等待并读取快照；调度器每个周期也会写入快照供 API 直接复用
+"""
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import config
+from ari_models import get_model_set
+from compute_ari import compute_all_ari
+from device_registry import registry
+from fetch_data import STALE_FLAG, fetch_sensor_data, get_device_anchor_time, get_device_freshness
+
+
+class SingleFlight:
+    """
+    同一 key 的并发调用只执行一次，其余调用等待并共享结果（或异常）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0      # 共享他人结果的调用次数
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if not leader:
+                self.shared += 1
+            else:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not leader:
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["event"].set()
+
+
+class SnapshotStore:
+
+    def __init__(self, snapshot_dir=None, keep=None):
+        self.snapshot_dir = snapshot_dir or config.ARI_SNAPSHOT_DIR
+        if not os.path.isabs(self.snapshot_dir):
+            self.snapshot_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.snapshot_dir)
+        self.keep = keep or config.ARI_SNAPSHOT_KEEP
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def _path(self, key, suffix=".json"):
+        return os.path.join(self.snapshot_dir, f"ari_{key}{suffix}")
+
+    def load(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key, data):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+        self._cleanup()
+
+    def _cleanup(self):
+        files = sorted(
+            (os.path.getmtime(os.path.join(self.snapshot_dir, n)), n)
+            for n in os.listdir(self.snapshot_dir)
+            if n.startswith("ari_") and n.endswith(".json")
+        )
+        for _, name in files[:-self.keep]:
+            base = os.path.join(self.snapshot_dir, name[:-len(".json")])
+            for p in (base + ".json", base + ".lock"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    def compute_once(self, key, fn, wait_sec=None):
+        """
+        跨进程选举：拿到锁的进程计算并写快照；其他进程轮询等待快照出现，
+        超时后自行计算（不会因为计算者卡住而一直等待）
+        """
+        wait_sec = config.ARI_SNAPSHOT_WAIT_SEC if wait_sec is None else wait_sec
+
+        data = self.load(key)
+        if data is not None:
+            return data
+
+        with open(self._path(key, ".lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                deadline = time.monotonic() + wait_sec
+                while time.monotonic() < deadline:
+                    time.sleep(0.2)
+                    data = self.load(key)
+                    if data is not None:
+                        return data
+                return fn()
+
+            try:
+                # 可能在抢锁期间已被别的进程写好
+                data = self.load(key)
+                if data is None:
+                    data = fn()
+                    self.save(key, data)
+                return data
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+_flight = SingleFlight()
+_store = None
+
+
+def get_snapshot_store():
+    global _store
+    if _store is None:
+        _store = SnapshotStore()
+    return _store
+
+
+def hash_anchors(anchors, model_version, signature):
+    """
+    快照 key：[(device_id, 锚点字符串 / None)] + 模型版本 + 注册表内容签名
+    （不用进程内递增的 snapshot.version，否则各进程 reload 次数不同时 key 不一致）
+    """
+    raw = json.dumps([sorted(anchors), model_version, signature], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def _fmt(t):
+    return t.strftime("%Y-%m-%d %H:%M:%S") if t is not None else None
+
+
+def anchor_key(device_ids=None, models=None):
+    """
+    当前锚点的快照 key（按新鲜度索引计算各设备锚点）
+    """
+    snap = registry.snapshot()
+    device_ids = list(device_ids or snap.device_ids)
+    freshness = get_device_freshness(device_ids=device_ids)
+    now = datetime.now()
+    anchors = [(d, _fmt(get_device_anchor_time(freshness.get(d), now))) for d in device_ids]
+    return hash_anchors(anchors, (models or get_model_set()).version, snap.signature)
+
+
+def computed_anchor_key(sensor_data, models, snap):
+    """
+    已算结果的快照 key：取 sensor_data 中实际使用的锚点（停报设备为 None），
+    而不是发布时重新读取的新鲜度索引（周期内有新分钟到达时后者已前移）
+    """
+    anchors = [
+        (d, None if STALE_FLAG in (res.get("data_quality_flag") or "") else res.get("anchor_time"))
+        for d, res in sensor_data.items()
+    ]
+    return hash_anchors(anchors, models.version, snap.signature)
+
+
+def _compute():
+    models = get_model_set()
+    sensor_data = fetch_sensor_data()
+    return {
+        "computed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "model_version": models.version,
+        "sensor_data": sensor_data,
+        "ari": compute_all_ari(sensor_data, models),
+    }
+
+
+def get_current_ari():
+    """
+    当前全部设备的 (sensor_data, ari_results)，同一锚点只计算一次
+    """
+    key = anchor_key()
+    data = _flight.do(key, lambda: get_snapshot_store().compute_once(key, _compute))
+    return data["sensor_data"], data["ari"]
+
+
+def publish_snapshot(sensor_data, ari_results, models, snap=None):
+    """
+    调度器周期结果写入快照（仅全量设备时），API 进程同一锚点直接读取
+    :param snap: 本周期使用的注册表快照，None 时取当前快照
+    """
+    snap = snap or registry.snapshot(max_age_sec=float("inf"))
+    if set(sensor_data) != set(snap.device_ids):
+        return
+    key = computed_anchor_key(sensor_data, models, snap)
+    get_snapshot_store().save(key, {
+        "computed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "model_version": models.version,
+        "sensor_data": sensor_data,
+        "ari": ari_results,
+    })
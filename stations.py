@@ -0,0 +1,184 @@
+# stations.py
+"""
+站点元数据（坐标 / 海拔）与空间索引
+
+- 位置来源：devices.yaml 设备条目的 lat / lon / elevation，
+  缺省时读 STATION_DIR/<device_id>/station.ini（或 <device_id>.ini）：
+    latitude / longitude / altitude 键，或 MeteoIO 的 POSITION = latlon (lat, lon, alt)
+- SpatialIndex：按 REGION_INDEX_CELL_KM 网格分桶，半径 / 最近邻查询只检查邻近格
+- 按注册表快照版本缓存，注册表变化后自动重建
+"""
+import configparser
+import math
+import os
+import re
+import threading
+
+import config
+from device_registry import LOCATION_KEYS, registry
+
+EARTH_RADIUS_KM = 6371.0
+
+# station.ini 中可识别的键 -> 字段
+INI_KEYS = {
+    "latitude": "lat",
+    "lat": "lat",
+    "longitude": "lon",
+    "lon": "lon",
+    "altitude": "elevation",
+    "elevation": "elevation",
+}
+
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# =========================
+# station.ini
+# =========================
+
+def _station_dir():
+    path = config.STATION_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def read_station_ini(device_id):
+    """
+    :return: {"lat", "lon", "elevation"} 中能读到的部分；文件缺失 / 为空返回 {}
+    """
+    folder = os.path.join(_station_dir(), device_id)
+    for name in ("station.ini", f"{device_id}.ini"):
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            break
+    else:
+        return {}
+
+    parser = configparser.ConfigParser(strict=False, interpolation=None)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            parser.read_string("[DEFAULT]\n" + f.read())
+    except (configparser.Error, UnicodeDecodeError) as e:
+        print(f"[STATION] cannot parse {path}: {e}")
+        return {}
+
+    meta = {}
+    for section in [parser.defaults(), *(parser[s] for s in parser.sections())]:
+        for key, raw in section.items():
+            key = key.lower()
+            if key in INI_KEYS:
+                try:
+                    meta.setdefault(INI_KEYS[key], float(raw.split()[0]))
+                except (ValueError, IndexError):
+                    pass
+            elif key.startswith("position") and "latlon" in raw.lower():
+                nums = [float(x) for x in _NUMBER.findall(raw)]
+                for field, v in zip(("lat", "lon", "elevation"), nums):
+                    meta.setdefault(field, v)
+    return meta
+
+
+def station_meta(snapshot):
+    """
+    :return: {device_id: {"device_name", "lat", "lon", "elevation"}}，设备条目优先于 station.ini
+    """
+    meta = {}
+    for device_id, dev in snapshot.devices.items():
+        item = read_station_ini(device_id)
+        item.update({k: float(dev[k]) for k in LOCATION_KEYS if k in dev})
+        item["device_name"] = dev["device_name"]
+        meta[device_id] = item
+    return meta
+
+
+# =========================
+# 空间索引
+# =========================
+
+class SpatialIndex:
+
+    def __init__(self, meta, cell_km=None):
+        """
+        :param meta: station_meta() 的结果，无坐标的站点不入索引
+        """
+        self.cell_km = config.REGION_INDEX_CELL_KM if cell_km is None else cell_km
+        # 纬度方向 1° ≈ 111km；经度格宽按最高纬度收缩，保证邻近格覆盖查询半径
+        self._dlat = self.cell_km / 111.0
+        lats = [m["lat"] for m in meta.values() if "lat" in m and "lon" in m]
+        cos_lat = math.cos(math.radians(max((abs(x) for x in lats), default=0.0)))
+        self._dlon = self.cell_km / (111.0 * max(cos_lat, 0.01))
+
+        self.points = {}
+        self._cells = {}
+        for device_id, m in meta.items():
+            if "lat" not in m or "lon" not in m:
+                continue
+            self.points[device_id] = (m["lat"], m["lon"])
+            self._cells.setdefault(self._cell(m["lat"], m["lon"]), []).append(device_id)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self._dlat)), int(math.floor(lon / self._dlon))
+
+    def within(self, lat, lon, radius_km):
+        """
+        :return: [(device_id, 距离km)]，按距离升序
+        """
+        reach = int(math.ceil(radius_km / self.cell_km))
+        ci, cj = self._cell(lat, lon)
+        if (2 * reach + 1) ** 2 < len(self._cells):
+            cells = [
+                self._cells.get((i, j), ())
+                for i in range(ci - reach, ci + reach + 1)
+                for j in range(cj - reach, cj + reach + 1)
+            ]
+        else:
+            # 半径覆盖的格比已占用的格还多：直接遍历已占用格
+            cells = [ids for (i, j), ids in self._cells.items()
+                     if abs(i - ci) <= reach and abs(j - cj) <= reach]
+
+        found = []
+        for ids in cells:
+            for device_id in ids:
+                d = haversine_km(lat, lon, *self.points[device_id])
+                if d <= radius_km:
+                    found.append((device_id, d))
+        return sorted(found, key=lambda x: x[1])
+
+    def nearest(self, lat, lon, k=1):
+        """
+        逐圈扩大搜索，直到找到 k 个站点或覆盖全部格
+        """
+        if not self.points:
+            return []
+        radius = self.cell_km
+        while radius < math.pi * EARTH_RADIUS_KM:
+            found = self.within(lat, lon, radius)
+            if len(found) >= min(k, len(self.points)):
+                return found[:k]
+            radius *= 2
+        return self.within(lat, lon, math.pi * EARTH_RADIUS_KM)[:k]
+
+
+_cache = {"signature": None, "meta": None, "index": None}
+_lock = threading.Lock()
+
+
+def get_station_index(snapshot=None):
+    """
+    :return: (station_meta, SpatialIndex)，按注册表内容签名缓存
+    """
+    snapshot = snapshot or registry.snapshot()
+    with _lock:
+        if _cache["signature"] != snapshot.signature:
+            meta = station_meta(snapshot)
+            _cache.update(signature=snapshot.signature, meta=meta, index=SpatialIndex(meta))
+        return _cache["meta"], _cache["index"]
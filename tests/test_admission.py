@@ -0,0 +1,140 @@
+# tests/test_admission.py
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import Backend, Overloaded
+
+
+def _hold(backend, key, release, started=None):
+    """
+    后台线程占住一个名额，直到 release 被 set
+    """
+    def fn():
+        if started is not None:
+            started.set()
+        release.wait(5)
+        return key
+
+    t = threading.Thread(target=lambda: backend.call(key, fn), daemon=True)
+    t.start()
+    return t
+
+
+def test_identical_requests_share_one_backend_call():
+    backend = Backend("t", max_concurrent=1, max_queue=0, queue_timeout_sec=1, stale_max_sec=0)
+    release, calls, results = threading.Event(), [], []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return {"v": 1}
+
+    threads = [threading.Thread(target=lambda: results.append(backend.call("k", fn))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    while backend.stats()["coalesced"] < 7:
+        time.sleep(0.005)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == [({"v": 1}, None)] * 8
+    stats = backend.stats()
+    assert stats["admitted"] == 1 and stats["coalesced"] == 7
+    assert stats["shed_queue_full"] == 0 and stats["in_flight"] == 0
+
+
+def test_sheds_when_queue_full_or_wait_too_long():
+    backend = Backend("t", max_concurrent=1, max_queue=1, queue_timeout_sec=0.05, stale_max_sec=0)
+    release, started = threading.Event(), threading.Event()
+    holder = _hold(backend, "a", release, started)
+    started.wait(5)
+
+    # 排队等待超时
+    with pytest.raises(Overloaded) as e:
+        backend.call("b", lambda: "b")
+    assert e.value.reason == "queue_timeout"
+
+    # 排队已满：立即拒绝
+    backend.queue_timeout_sec = 5
+    waiter = threading.Thread(target=lambda: backend.call("c", lambda: "c"), daemon=True)
+    waiter.start()
+    while backend.stats()["waiting"] < 1:
+        time.sleep(0.005)
+    t0 = time.monotonic()
+    with pytest.raises(Overloaded) as e:
+        backend.call("d", lambda: "d")
+    assert e.value.reason == "queue_full"
+    assert time.monotonic() - t0 < 0.5
+
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    stats = backend.stats()
+    assert stats["shed_timeout"] == 1 and stats["shed_queue_full"] == 1
+    assert stats["admitted"] == 2 and stats["in_flight"] == 0
+    assert stats["queue_wait_ms"]["max"] >= 50
+
+
+def test_overload_serves_stale_result():
+    backend = Backend("t", max_concurrent=1, max_queue=0, queue_timeout_sec=0.01, stale_max_sec=60)
+    assert backend.call("k", lambda: "fresh") == ("fresh", None)
+
+    release, started = threading.Event(), threading.Event()
+    holder = _hold(backend, "other", release, started)
+    started.wait(5)
+
+    result, age = backend.call("k", lambda: "never")
+    assert result == "fresh" and age is not None and age >= 0
+    with pytest.raises(Overloaded):
+        backend.call("unknown", lambda: "x")
+
+    release.set()
+    holder.join(5)
+    assert backend.stats()["served_stale"] == 1
+
+
+def test_api_returns_503_with_retry_after(monkeypatch):
+    import api.sensor_api as sensor_api
+    from app import create_app
+    from device_registry import RegistrySnapshot
+
+    def overloaded(backend, key, fn):
+        raise Overloaded(backend, "queue_full")
+
+    snap = RegistrySnapshot([{"device_id": "d1"}], "file", 1)
+    monkeypatch.setattr(sensor_api.registry, "snapshot", lambda *a, **kw: snap)
+    monkeypatch.setattr(sensor_api, "admitted", overloaded)
+
+    resp = create_app().test_client().get("/api/sensor?device_id=d1")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(admission.config.ADMISSION_RETRY_AFTER_SEC)
+    assert resp.get_json()["reason"] == "queue_full"
+
+
+def test_unchanged_result_is_not_resized(monkeypatch):
+    import query_cache
+
+    backend = Backend("t", max_concurrent=1, max_queue=0, queue_timeout_sec=1, stale_max_sec=60)
+    sized = []
+    real = query_cache.estimate_size
+
+    def estimate(obj, _depth=0):
+        if _depth == 0:
+            sized.append(obj)
+        return real(obj, _depth)
+
+    monkeypatch.setattr(query_cache, "estimate_size", estimate)
+
+    data = {"d1": {"ari_1": 0.5}}
+    for _ in range(3):
+        backend.call("k", lambda: (data, "anchor"))    # 每次新元组，内容为同一份数据
+    assert len(sized) == 2                              # 只在第一次估算（key + 结果）
+
+    backend.call("k", lambda: ({"d1": {"ari_1": 0.6}}, "anchor"))
+    assert len(sized) == 4
+    assert backend._stale.get("k")[1][1][0]["d1"]["ari_1"] == 0.6
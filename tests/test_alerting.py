@@ -0,0 +1,89 @@
+# tests/test_alerting.py
+from datetime import datetime, timedelta
+
+from alerting import AlertEngine, QueueSink, WebhookSink
+
+T0 = datetime(2024, 12, 1, 0, 0)
+
+CONFIG = {
+    "fields": ["ari_1_level", "ari_3"],
+    "confirm_cycles_up": 1,
+    "confirm_cycles_down": 2,
+    "ari_value_hysteresis": 0.05,
+    "alert_on_first_seen": False,
+}
+
+
+def _run(engine, cycles):
+    """
+    cycles: [(ari_1, ari_1_level, ari_3)]，返回每个周期确认的 (字段, 旧等级, 新等级)
+    """
+    out = []
+    for i, (ari_1, level, ari_3) in enumerate(cycles):
+        res = {"d1": {"ari_1": ari_1, "ari_1_level": level, "ari_3": ari_3}}
+        alerts = engine.process(res, T0 + timedelta(minutes=30 * i))
+        out.append([(a["field"], a["previous"], a["current"]) for a in alerts])
+    return out
+
+
+def test_upgrade_immediate_downgrade_debounced():
+    engine = AlertEngine(CONFIG, sinks=[])
+    out = _run(engine, [
+        (0.3, "无", "无"),       # 基线，不告警
+        (0.75, "III", "无"),     # 升级立即确认
+        (0.4, "无", "无"),       # 降级第 1 个周期
+        (0.75, "III", "无"),     # 回到原等级：待确认清零
+        (0.4, "无", "无"),
+        (0.4, "无", "无"),       # 连续 2 个周期才确认
+    ])
+    assert out == [
+        [], [("ari_1_level", "无", "III")], [], [], [], [("ari_1_level", "III", "无")],
+    ]
+
+
+def test_hysteresis_holds_level_near_floor():
+    engine = AlertEngine(CONFIG, sinks=[])
+    # III 下限 0.7，margin 0.05：0.66 仍保持 III
+    out = _run(engine, [
+        (0.75, "III", "无"),
+        (0.66, "IV", "无"),
+        (0.66, "IV", "无"),
+        (0.6, "IV", "无"),
+        (0.6, "IV", "无"),
+    ])
+    assert out == [[], [], [], [], [("ari_1_level", "III", "IV")]]
+
+
+def test_fields_without_values_use_plain_debounce_and_batch_to_sinks():
+    sink = QueueSink()
+    engine = AlertEngine({**CONFIG, "alert_on_first_seen": True}, sinks=[sink, WebhookSink()])
+    out = _run(engine, [(0.95, "II", "黄")])
+    assert sorted(out[0]) == [("ari_1_level", "无", "II"), ("ari_3", "无", "黄")]
+    assert len(sink.queue.get_nowait()) == 2
+
+    engine.forget("d1")
+    assert engine._state == {}
+
+
+def test_webhook_without_url_is_silent(capsys):
+    WebhookSink().send([{"device_id": "d1", "field": "ari_3", "previous": "无", "current": "黄"}])
+    assert capsys.readouterr().out == ""
+
+
+def test_nowcast_does_not_advance_debounce():
+    engine = AlertEngine(CONFIG, sinks=[])
+    _run(engine, [(0.75, "III", "无"), (0.4, "无", "无")])     # 降级待确认 1/2
+
+    def nowcast(ari_1, level, minute):
+        res = {"d1": {"ari_1": ari_1, "ari_1_level": level, "ari_3": "无"}}
+        alerts = engine.process(res, T0 + timedelta(minutes=minute), calc_mode="nowcast")
+        return [(a["field"], a["previous"], a["current"]) for a in alerts]
+
+    # nowcast 降级不计入去抖，也不清零周期计数
+    assert nowcast(0.4, "无", 65) == []
+    assert nowcast(0.4, "无", 70) == []
+    assert engine._state[("d1", "ari_1_level")]["level"] == "III"
+    assert engine._state[("d1", "ari_1_level")]["count"] == 1
+
+    # nowcast 升级立即确认
+    assert nowcast(0.95, "II", 75) == [("ari_1_level", "III", "II")]
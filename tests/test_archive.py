@@ -0,0 +1,104 @@
+# tests/test_archive.py
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import archive
+from archive import DATASETS, Manifest, partition_columns, plan_days
+from device_registry import RegistrySnapshot
+
+DAY = date(2024, 12, 1)
+SENSOR_COLUMNS = DATASETS["sensor"]["columns"]
+
+
+def _sensor_row(t, **values):
+    return (t, *(values.get(c) for c in SENSOR_COLUMNS))
+
+
+def test_partition_columns_quality_flags():
+    t0 = datetime(2024, 12, 1, 0, 0)
+    rows = [
+        _sensor_row(t0, snow_depth="500", wind_speed="99"),
+        _sensor_row(t0 + timedelta(minutes=1), snow_depth=None, wind_speed="4.5"),
+    ]
+    cols = partition_columns("sensor", rows)
+    assert cols["create_time_min"] == [t0, t0 + timedelta(minutes=1)]
+    assert cols["snow_depth"] == [500.0, None]
+    assert cols["snow_depth_qc"] == ["ok", "missing"]
+    assert cols["wind_speed_qc"] == ["out_of_range", "ok"]
+
+    # 设备覆盖的置信区间
+    cols = partition_columns("sensor", rows, {"snow_depth": {"min": 0, "max": 100}})
+    assert cols["snow_depth_qc"] == ["out_of_range", "missing"]
+
+
+def test_plan_days_resumes_from_watermarks(tmp_path):
+    manifest = Manifest(str(tmp_path))
+    manifest.record("sensor", "a", DAY + timedelta(days=1))
+    plan = plan_days(manifest, "sensor", ["a", "b", "c"], {"b": DAY}, DAY + timedelta(days=3), max_days=10)
+
+    assert plan == [
+        (DAY, ["b"]),
+        (DAY + timedelta(days=1), ["b"]),
+        (DAY + timedelta(days=2), ["a", "b"]),
+        (DAY + timedelta(days=3), ["a", "b"]),
+    ]
+    assert len(plan_days(manifest, "sensor", ["a", "b"], {"b": DAY}, DAY + timedelta(days=3), 2)) == 2
+
+    manifest.save()
+    reloaded = Manifest(str(tmp_path))
+    assert reloaded.watermark("sensor", "a") == DAY + timedelta(days=1)
+    assert reloaded.coverage_end("sensor", ["a"]) == DAY + timedelta(days=1)
+    assert reloaded.coverage_end("sensor", ["a", "b"]) is None
+
+
+class ArchiveClient:
+
+    def __init__(self, rows):
+        self.rows = rows    # {device_id: [sensor_row]}
+
+    def execute(self, query, params=None):
+        return [(d, rows[0][0].date()) for d, rows in self.rows.items() if d in params["device_ids"]]
+
+    def execute_iter(self, query, params=None, settings=None, chunk_size=1):
+        out = [
+            (d, *r) for d in sorted(self.rows) if d in params["device_ids"]
+            for r in self.rows[d] if params["start"] <= r[0] < params["end"]
+        ]
+        for i in range(0, len(out), chunk_size):
+            yield out[i:i + chunk_size]
+
+
+def test_export_and_read_back(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from minute_grid import GRID_FIELDS, build_minute_grid, grid_span
+
+    t0 = datetime.combine(DAY, datetime.min.time())
+    rows = [
+        _sensor_row(t0 + timedelta(minutes=i), snow_depth=str(500 + i % 7), wind_speed=str(i % 13),
+                    atmospheric_temperature="-2.0", rainfall="0")
+        for i in range(4 * 1440)
+    ]
+    snap = RegistrySnapshot([{"device_id": "d1"}], "file", 1)
+    monkeypatch.setattr(archive.registry, "snapshot", lambda *a, **kw: snap)
+
+    totals = archive.run_export(["sensor"], until_day=DAY + timedelta(days=3), max_days=2,
+                                client=ArchiveClient({"d1": rows}), root=str(tmp_path))
+    assert totals == {"sensor": 2 * 1440}
+    totals = archive.run_export(["sensor"], until_day=DAY + timedelta(days=3),
+                                client=ArchiveClient({"d1": rows}), root=str(tmp_path))
+    assert totals == {"sensor": 2 * 1440}
+
+    reader = archive.ArchiveReader(str(tmp_path))
+    assert reader.coverage_end("sensor", ["d1"]) == t0 + timedelta(days=4)
+
+    anchor = t0 + timedelta(days=3, hours=12)
+    grid = reader.minute_grid("d1", anchor)
+    idx = {c: i + 1 for i, c in enumerate(SENSOR_COLUMNS)}
+    expected = build_minute_grid(
+        [[(r[0], *(r[idx[f]] for f in GRID_FIELDS)) for r in rows if grid_span(anchor) <= r[0] < anchor]],
+        anchor,
+    )
+    assert grid.point("snow_depth", anchor) == expected.point("snow_depth", anchor)
+    assert grid.window("wind_speed", anchor - timedelta(hours=24), anchor)[1] == \
+        expected.window("wind_speed", anchor - timedelta(hours=24), anchor)[1]
@@ -0,0 +1,161 @@
+# tests/test_ari_models.py
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+import ari_models
+from ari_models import ModelSpecError, compile_spec, load_spec_file
+from compute_ari import BATCH_INPUT_FIELDS
+
+SPEC_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ari_models.yaml")
+
+
+@pytest.fixture(scope="module")
+def models():
+    return load_spec_file(SPEC_FILE)
+
+
+def _base(**kw):
+    data = {f: None for f in BATCH_INPUT_FIELDS}
+    data.update(kw)
+    return data
+
+
+@pytest.mark.parametrize("ari, level", [
+    (None, "无"), (0.49, "无"), (0.5, "IV"), (0.7, "III"), (0.9, "II"), (1.0, "I"), (3.0, "I"),
+])
+def test_ari_value_table(models, ari, level):
+    assert models.level_tables["ari_value"].scalar(ari) == level
+
+
+@pytest.mark.parametrize("wind, level", [(4.9, "无"), (5, "IV"), (8, "III"), (10, "II"), (12, "I")])
+def test_ari_5_boundaries(models, wind, level):
+    assert models.evaluate(_base(wind_speed=wind))["ari_5"] == level
+
+
+@pytest.mark.parametrize("delta, temp, level", [
+    (-0.25, 1, "I"), (-0.2, 1, "II"), (-0.15, 1, "III"), (-0.1, 1, "IV"), (-0.05, 1, "无"), (-0.3, 0, "无"),
+])
+def test_ari_3_boundaries(models, delta, temp, level):
+    assert models.evaluate(_base(delta_snow_24h=delta, temp_avg_24h=temp))["ari_3"] == level
+
+
+@pytest.mark.parametrize("rain, depth, level", [(0, 0.5, "无"), (5, 0.5, "II"), (5.1, 0.5, "I"), (6, 0.3, "无")])
+def test_ari_4_boundaries(models, rain, depth, level):
+    assert models.evaluate(_base(rainfall_24h=rain, snow_depth=depth))["ari_4"] == level
+
+
+def test_one_d_table_takes_most_severe(models):
+    out = models.evaluate(_base(snow_depth=0.8, snowfall_72h=0.2, wind_speed=9))
+    assert out["threshold_level"] == out["one_d_warning_level"] == "橙"
+    assert out["threshold_reason"] == "one_d_threshold:orange"
+
+    out = models.evaluate(_base(snow_depth=0.6, snowfall_72h=0.6))
+    assert out["threshold_level"] == "无"
+    assert out["threshold_reason"] is None
+
+
+def test_index_model_missing_term(models):
+    out = models.evaluate(_base(snow_depth=0.6))
+    assert out["ari_1"] is None and out["ari_1_level"] == "无"
+
+    out = models.evaluate(_base(snow_depth=0.6, snowfall_24h=-0.1))
+    assert out["ari_1"] == 0.0
+
+
+def test_scalar_and_vector_agree(models):
+    rng = np.random.default_rng(7)
+    n = 5000
+    cols = {
+        "snow_depth": rng.choice([0.3, 0.6, 0.61, 1.5], n),
+        "snowfall_24h": rng.uniform(-0.05, 0.05, n),
+        "snowfall_72h": rng.choice([0.1, 0.2, 0.3, 0.5, 0.05], n),
+        "delta_snow_24h": rng.choice([-0.25, -0.2, -0.15, -0.1, -0.05, 0.02], n),
+        "temp_avg_24h": rng.choice([-1.0, 0.0, 2.0], n),
+        "rainfall_24h": rng.choice([0.0, 3.0, 5.0, 8.0], n),
+        "wind_speed": rng.choice([4.0, 5.0, 6.0, 8.0, 10.0, 12.0], n),
+    }
+    for v in cols.values():
+        v[rng.random(n) < 0.1] = np.nan
+
+    batch = models.evaluate_batch(cols)
+    for i in range(n):
+        row = {k: (None if np.isnan(v[i]) else float(v[i])) for k, v in cols.items()}
+        scalar = models.evaluate(row)
+        for k, sv in scalar.items():
+            bv = batch[k][i]
+            if isinstance(sv, float) or (sv is None and isinstance(bv, float)):
+                assert (sv is None and np.isnan(bv)) or sv == pytest.approx(bv)
+            else:
+                assert sv == bv, (k, row)
+
+
+def test_levels_must_be_ordered():
+    with pytest.raises(ModelSpecError):
+        compile_spec({
+            "version": "x",
+            "models": [{"name": "m", "type": "ladder", "field": "wind_speed", "op": ">=",
+                        "levels": [[5, "IV"], [12, "I"]]}],
+        })
+
+
+def test_hot_reload_keeps_last_good(tmp_path, monkeypatch):
+    with open(SPEC_FILE, encoding="utf-8") as f:
+        spec = yaml.safe_load(f)
+
+    path = tmp_path / "models.yaml"
+    path.write_text(yaml.safe_dump(spec, allow_unicode=True), encoding="utf-8")
+    monkeypatch.setattr(ari_models.config, "ARI_MODEL_SPEC_FILE", str(path))
+    monkeypatch.setattr(ari_models, "_current", {"models": None, "mtime": None, "checked": 0.0})
+
+    assert ari_models.reload_models().version == spec["version"]
+
+    spec["version"] = "next"
+    path.write_text(yaml.safe_dump(spec, allow_unicode=True), encoding="utf-8")
+    os.utime(path, (1, 1))
+    assert ari_models.reload_models().version == "next"
+
+    path.write_text("models: [{type: bogus}]", encoding="utf-8")
+    os.utime(path, (2, 2))
+    assert ari_models.reload_models().version == "next"
+
+    # 原子保存过程中文件短暂不存在：保留当前模型，恢复后照常重载
+    path.unlink()
+    assert ari_models.reload_models().version == "next"
+    spec["version"] = "after-save"
+    path.write_text(yaml.safe_dump(spec, allow_unicode=True), encoding="utf-8")
+    os.utime(path, (3, 3))
+    assert ari_models.reload_models().version == "after-save"
+
+
+def test_model_reload_changes_ari_etag(tmp_path, monkeypatch):
+    from api import ari_api
+    from app import create_app
+
+    with open(SPEC_FILE, encoding="utf-8") as f:
+        spec = yaml.safe_load(f)
+    path = tmp_path / "models.yaml"
+    path.write_text(yaml.safe_dump(spec, allow_unicode=True), encoding="utf-8")
+    monkeypatch.setattr(ari_models.config, "ARI_MODEL_SPEC_FILE", str(path))
+    monkeypatch.setattr(ari_models, "_current", {"models": None, "mtime": None, "checked": 0.0})
+    ari_models.reload_models()
+
+    sensor_data = {"d1": {"anchor_time": "2024-12-01 12:00:00"}}
+    monkeypatch.setattr(ari_api, "_current_ari", lambda: (sensor_data, {"d1": {"ari_1": 0.5}}, None))
+    client = create_app().test_client()
+
+    etags = {}
+    for route in ("/api/ari", "/api/ari/wind"):
+        etags[route] = client.get(route).headers["ETag"]
+        assert client.get(route, headers={"If-None-Match": etags[route]}).status_code == 304
+
+    # 同一锚点，模型热更新后不再命中旧 ETag
+    spec["version"] = "next"
+    path.write_text(yaml.safe_dump(spec, allow_unicode=True), encoding="utf-8")
+    os.utime(path, (1, 1))
+    ari_models.reload_models()
+    for route, etag in etags.items():
+        resp = client.get(route, headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and resp.headers["ETag"] != etag
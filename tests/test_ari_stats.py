@@ -0,0 +1,189 @@
+# tests/test_ari_stats.py
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import ari_stats
+import config
+from ari_stats import merge, new_stats, observe, season_of, season_range
+
+
+def _row(t, ari_1=None, threshold="无", **kw):
+    row = {"device_id": "d1", "ari_time": t, "ari_1": ari_1, "ari_2": None,
+           "ari_3": "无", "ari_4": "无", "ari_5": "无", "threshold_level": threshold}
+    row.update(kw)
+    return row
+
+
+def test_observe_hours_and_triggers():
+    t0 = datetime(2024, 12, 1, 0, 0)
+    stats = new_stats()
+    levels = ["无", "蓝", "黄", "无", "红", "红"]
+    for i, lv in enumerate(levels):
+        observe(stats, _row(t0 + timedelta(minutes=30 * i), ari_1="1.20" if i == 4 else "0.55", threshold=lv))
+
+    assert stats["samples"] == 6
+    assert stats["max_ari_1"] == 1.2
+    assert stats["max_level"] == "I"
+    assert stats["hours_i"] == 0.5 and stats["hours_iv"] == 2.5
+    assert stats["threshold_cycles"] == 4
+    assert stats["threshold_triggers"] == 2
+    assert stats["max_threshold_level"] == "红"
+    assert stats["last_threshold_level"] == "红"
+
+
+def test_merge_is_order_preserving():
+    t0 = datetime(2024, 12, 1, 23, 0)
+    a, b = new_stats(), new_stats()
+    observe(a, _row(t0, ari_5="III"))
+    observe(b, _row(t0 + timedelta(hours=2), ari_2="0.95", threshold="橙"))
+
+    total = merge(merge(new_stats(), a), b)
+    assert total["samples"] == 2
+    assert total["max_level"] == "II"
+    assert total["max_ari_2"] == 0.95
+    assert total["last_ari_time"] == t0 + timedelta(hours=2)
+
+
+@pytest.mark.parametrize("day, season", [
+    (date(2024, 12, 1), "2024-2025"),
+    (date(2025, 3, 1), "2024-2025"),
+    (date(2025, 8, 1), "2025-2026"),
+])
+def test_season_of(day, season):
+    assert season_of(day) == season
+    first, last = season_range(season)
+    assert first <= day <= last
+
+
+def test_update_daily_continues_partial_day(monkeypatch):
+    wm = datetime(2024, 12, 1, 23, 0)
+    partial = new_stats()
+    observe(partial, _row(wm, threshold="蓝"))
+    partial.update(device_id="d1", day=wm.date())
+
+    class Client:
+        def execute(self, sql, params=None):
+            return [tuple(partial[c] for c in ari_stats.DAILY_COLUMNS)]
+
+    written = []
+    monkeypatch.setattr(ari_stats, "_insert", lambda table, cols, rows: written.extend(rows))
+
+    new_rows = [
+        _row(wm, threshold="蓝"),                               # 已汇总，跳过
+        _row(wm + timedelta(minutes=30), threshold="蓝"),
+        _row(wm + timedelta(minutes=60), threshold="黄"),       # 次日，延续“蓝”不算新触发
+        _row(wm + timedelta(minutes=90)),
+    ]
+    watermarks = {"d1": wm}
+    rows = ari_stats._update_daily(Client(), watermarks, new_rows, None)
+
+    by_day = {r["day"]: r for r in rows}
+    assert by_day[date(2024, 12, 1)]["samples"] == 2
+    assert by_day[date(2024, 12, 1)]["threshold_triggers"] == 1
+    assert by_day[date(2024, 12, 2)]["samples"] == 2
+    assert by_day[date(2024, 12, 2)]["threshold_triggers"] == 0
+    assert watermarks["d1"] == wm + timedelta(minutes=90)
+    assert written == rows
+
+
+def test_nowcast_rows_do_not_add_hours():
+    t0 = datetime(2024, 12, 1, 10, 0)
+    stats = new_stats()
+    observe(stats, _row(t0, ari_1="0.95"))
+    observe(stats, _row(t0 + timedelta(minutes=7), ari_1="1.10", threshold="橙", calc_mode="nowcast"))
+
+    assert stats["max_level"] == "I"
+    assert stats["hours_ii"] == 0.5 and stats["hours_i"] == 0.0
+    assert stats["threshold_cycles"] == 0 and stats["threshold_triggers"] == 1
+
+
+def _patch_job(monkeypatch, device_ids, watermarks, first_results):
+    """
+    替换 run_stats_job 的读写依赖，返回实际扫描的 (since, until) 区间
+    """
+    class Snapshot:
+        pass
+
+    snap = Snapshot()
+    snap.device_ids = list(device_ids)
+    monkeypatch.setattr(ari_stats.registry, "snapshot", lambda: snap)
+    monkeypatch.setattr(ari_stats, "get_model_set", lambda: None)
+    monkeypatch.setattr(ari_stats, "fetch_watermarks", lambda client: dict(watermarks))
+    monkeypatch.setattr(ari_stats, "fetch_first_results",
+                        lambda client, ids: {d: t for d, t in first_results.items() if d in ids})
+    scanned = []
+    monkeypatch.setattr(ari_stats, "fetch_new_results",
+                        lambda client, since, until: scanned.append((since, until)) or [])
+    monkeypatch.setattr(ari_stats, "_update_daily", lambda client, wm, rows, models: list(rows))
+    monkeypatch.setattr(ari_stats, "_update_seasons", lambda client, rows: [])
+    return scanned
+
+
+def test_stats_job_ignores_removed_devices(monkeypatch):
+    until = datetime(2024, 12, 10, 12, 0)
+    scanned = _patch_job(
+        monkeypatch, ["d1"],
+        {"d1": until - timedelta(hours=1), "gone": datetime(2024, 1, 1)},
+        {},
+    )
+    ari_stats.run_stats_job(until=until, client=object())
+    assert scanned == [(until - timedelta(hours=1), until)]
+
+
+def test_stats_job_backfills_new_device(monkeypatch):
+    until = datetime(2024, 12, 10, 12, 0)
+    first = datetime(2024, 12, 8, 0, 0)
+    scanned = _patch_job(monkeypatch, ["d1", "new"], {"d1": until - timedelta(hours=1)}, {"new": first})
+
+    seen = {}
+    monkeypatch.setattr(ari_stats, "_update_daily",
+                        lambda client, wm, rows, models: seen.update(wm) or [])
+    ari_stats.run_stats_job(until=until, client=object())
+
+    assert scanned[0][0] == first - timedelta(seconds=1)
+    assert seen["new"] == first - timedelta(seconds=1)
+    assert seen["d1"] == until - timedelta(hours=1)
+
+
+def test_stats_job_without_results(monkeypatch):
+    scanned = _patch_job(monkeypatch, ["d1"], {}, {})
+    assert ari_stats.run_stats_job(until=datetime(2024, 12, 10), client=object()) == 0
+    assert scanned == []
+
+
+def test_stats_job_reads_archived_batches(monkeypatch):
+    until = datetime(2024, 12, 10, 0, 0)
+    wm = datetime(2024, 12, 1, 0, 0)
+    scanned = _patch_job(monkeypatch, ["d1"], {"d1": wm}, {})
+    monkeypatch.setattr(config, "ARI_STATS_BATCH_DAYS", 3)
+
+    class Reader:
+        def __init__(self):
+            self.batches = []
+
+        def coverage_end(self, dataset, device_ids):
+            assert dataset == "ari" and device_ids == ["d1"]
+            return datetime(2024, 12, 7, 12, 0)
+
+        def ari_results(self, since, until):
+            self.batches.append((since, until))
+            return [_row(since + timedelta(hours=1))]
+
+    reader = Reader()
+    written = ari_stats.run_stats_job(until=until, client=object(), archive=reader)
+
+    # 归档覆盖到 12-07 12:00：前两批读 Parquet，跨过覆盖终点的批次回到线上表
+    assert reader.batches == [(wm, wm + timedelta(days=3)), (wm + timedelta(days=3), wm + timedelta(days=6))]
+    assert scanned == [(wm + timedelta(days=6), until)]
+    assert written == 2
+
+
+def test_stats_tables_in_migrations():
+    import write_result
+
+    for table, columns in ((ari_stats.DAILY_TABLE, ari_stats.DAILY_COLUMNS),
+                           (ari_stats.SEASON_TABLE, ari_stats.SEASON_COLUMNS)):
+        sql = next(sql for sql in write_result.MIGRATIONS if f".{table} (" in sql)
+        body = sql.split("(", 1)[1].rsplit(") ENGINE", 1)[0]
+        assert [c.split()[0] for c in body.split(",")] == columns
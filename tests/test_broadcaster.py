@@ -0,0 +1,84 @@
+# tests/test_broadcaster.py
+from datetime import datetime
+
+import pytest
+
+import api.stream_api as stream_api
+from broadcaster import AriBroadcaster
+
+T = datetime(2024, 12, 1, 12, 0)
+
+
+def _res(ari_1, level="低"):
+    return {"ari_1": ari_1, "ari_1_level": level}
+
+
+def test_events_since_returns_deltas_after_cursor():
+    b = AriBroadcaster()
+    b.publish({"d1": _res(0.1), "d2": _res(0.2)}, T)
+    b.publish({"d1": _res(0.1), "d2": _res(0.5, "高")}, T)
+
+    events = b.events_since(1, timeout=0)
+    assert [e["seq"] for e in events] == [2]
+    assert events[0]["changed"] == {"d2": {"ari_1": 0.5, "ari_1_level": "高"}}
+    assert events[0]["level_changed"] == ["d2"]
+    assert b.events_since(2, timeout=0.01) == []
+
+    # 无变化的 API 重算不发事件
+    assert b.publish({"d1": _res(0.1), "d2": _res(0.5, "高")}, T, new_cycle=False) is None
+
+
+def test_cursor_ahead_of_restarted_server_gets_snapshot():
+    b = AriBroadcaster()
+    b.publish({"d1": _res(0.1)}, T)
+
+    events = b.events_since(500, timeout=5)
+    assert len(events) == 1 and events[0]["type"] == "snapshot"
+    assert events[0]["seq"] == 1 and events[0]["data"]["d1"]["ari_1"] == 0.1
+
+
+def test_lagging_cursor_gets_snapshot():
+    b = AriBroadcaster(history=2)
+    for i in range(5):
+        b.publish({"d1": _res(i / 10)}, T)
+    events = b.events_since(1, timeout=0)
+    assert events[0]["type"] == "snapshot" and events[0]["seq"] == 5
+
+
+@pytest.fixture
+def poll_client(monkeypatch):
+    from flask import Flask
+
+    b = AriBroadcaster()
+    monkeypatch.setattr(stream_api, "ari_broadcaster", b)
+    app = Flask(__name__)
+    app.register_blueprint(stream_api.stream_bp, url_prefix="/api")
+    return b, app.test_client()
+
+
+def test_poll_cursor_is_last_returned_event(poll_client, monkeypatch):
+    b, client = poll_client
+    b.publish({"d1": _res(0.1)}, T)
+
+    events_since = b.events_since
+
+    def racing(since, timeout):
+        # 返回之后、响应生成之前又发布了一条
+        events = events_since(since, timeout)
+        b.publish({"d1": _res(0.9)}, T)
+        return events
+
+    monkeypatch.setattr(b, "events_since", racing)
+    body = client.get("/api/ari/poll?since=0&timeout=0").get_json()
+    assert [e["seq"] for e in body["events"]] == [1]
+    assert body["seq"] == 1
+
+    body = client.get("/api/ari/poll?since=1&timeout=0").get_json()
+    assert [e["seq"] for e in body["events"]] == [2] and body["seq"] == 2
+
+
+def test_poll_after_restart_returns_snapshot(poll_client):
+    b, client = poll_client
+    b.publish({"d1": _res(0.1)}, T)
+    body = client.get("/api/ari/poll?since=42&timeout=5").get_json()
+    assert body["events"][0]["type"] == "snapshot" and body["seq"] == 1
@@ -0,0 +1,151 @@
+# tests/test_cycle_budget.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import fetch_data
+from cycle_budget import CycleBudget, record_cycle
+from device_registry import RegistrySnapshot
+
+NOW = datetime.now().replace(second=0, microsecond=0)
+
+
+class Clock:
+
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class GridClient:
+    """
+    每分钟一行的固定数据，记录网格读取的起点
+    """
+
+    def __init__(self):
+        self.starts = []
+
+    def execute_iter(self, query, params=None, settings=None, chunk_size=1):
+        self.starts.append(params["start"])
+        t, rows = params["start"], []
+        while t < params["end"]:
+            rows.append((t, "500", "6.0", "-3.0", "0", "270", None, None, None))
+            t += timedelta(minutes=1)
+        yield rows
+
+
+def test_budget_levels_follow_projection(monkeypatch):
+    monkeypatch.setattr(config, "ARI_DEGRADE_AT", [0.6, 0.8, 0.95])
+    clock = Clock()
+    budget = CycleBudget(budget_sec=100, clock=clock)
+    assert budget.level(0, 10) == 0
+
+    clock.t = 20
+    assert budget.level(5, 10) == 0        # 预计 40s
+    clock.t = 35
+    assert budget.level(5, 10) == 1        # 预计 70s
+    clock.t = 45
+    assert budget.level(5, 10) == 2        # 预计 90s
+    clock.t = 46
+    assert budget.level(9, 10) == 2        # 不回退
+
+
+@pytest.fixture
+def env(monkeypatch):
+    client = GridClient()
+    snap = RegistrySnapshot([{"device_id": "d1"}, {"device_id": "d2"}], "file", 1)
+    monkeypatch.setattr(fetch_data, "get_ch_client", lambda **kw: client)
+    monkeypatch.setattr(fetch_data.registry, "snapshot", lambda *a, **kw: snap)
+    monkeypatch.setattr(fetch_data, "get_device_freshness",
+                        lambda c, ids: {d: NOW - timedelta(minutes=5) for d in ids})
+    monkeypatch.setattr(fetch_data, "_last_inputs", {})
+    fetch_data.query_cache.clear()
+    return client
+
+
+def _degraded_budget(level):
+    budget = CycleBudget(budget_sec=100, clock=Clock())
+    budget.max_level = level
+    return budget
+
+
+def test_skip_72h_reads_24h_grid(env):
+    data = fetch_data.fetch_sensor_data(["d1"], _degraded_budget(2))["d1"]
+
+    assert env.starts[0] >= NOW - timedelta(hours=24, minutes=config.DATA_MAX_LOOKBACK_MIN + 10)
+    assert data["snowfall_72h"] is None and data["snowfall_24h"] == 0.0
+    assert data["calc_window_72h"] == "N"
+    assert "degraded:skip_72h" in data["data_quality_flag"]
+    assert "d1" not in fetch_data._last_inputs
+
+
+def test_cached_inputs_reused(env):
+    full = fetch_data.fetch_sensor_data(["d1"])["d1"]
+    assert len(env.starts) == 1
+
+    data = fetch_data.fetch_sensor_data(["d1", "d2"], _degraded_budget(1))
+    assert data["d1"]["snow_depth"] == full["snow_depth"]
+    assert data["d1"]["data_quality_flag"].endswith(f"degraded:cached_inputs@{full['anchor_time']}")
+    assert full["data_quality_flag"] == "normal"
+    # d2 没有上周期输入，照常读取
+    assert len(env.starts) == 2 and "degraded" not in data["d2"]["data_quality_flag"]
+
+
+def test_health_endpoints(tmp_path, monkeypatch):
+    from api import health_api
+    from app import create_app
+
+    monkeypatch.setattr(config, "ARI_CYCLE_STATUS_FILE", str(tmp_path / "status.json"))
+    record_cycle(datetime.now() - timedelta(hours=3), devices=7)
+    client = create_app().test_client()
+
+    monkeypatch.setattr(health_api, "ping_backend", lambda: (True, 1.5, None))
+    body = client.get("/healthz").get_json()
+    assert body["status"] == "ok"
+    assert body["cycle"]["last_success"] is not None and body["cycle"]["cycle_lag_min"] < 1
+
+    resp = client.get("/readyz")
+    assert resp.status_code == 200
+
+    monkeypatch.setattr(config, "READY_MAX_CYCLE_LAG_MIN", -1)
+    monkeypatch.setattr(health_api, "ping_backend", lambda: (False, 3000.0, "timeout"))
+    resp = client.get("/readyz")
+    assert resp.status_code == 503
+    assert len(resp.get_json()["reasons"]) == 2
+
+
+def test_readyz_reports_failing_cycles(tmp_path, monkeypatch):
+    from api import health_api
+    from app import create_app
+
+    monkeypatch.setattr(config, "ARI_CYCLE_STATUS_FILE", str(tmp_path / "status.json"))
+    monkeypatch.setattr(health_api, "ping_backend", lambda: (True, 1.5, None))
+    client = create_app().test_client()
+
+    # 从未成功：第一次失败即未就绪
+    record_cycle(datetime.now(), error=RuntimeError("boom"))
+    resp = client.get("/readyz")
+    assert resp.status_code == 503 and "no successful cycle" in resp.get_json()["reasons"][0]
+
+    # 成功过：连续失败超过阈值才未就绪
+    record_cycle(datetime.now(), devices=7)
+    for _ in range(config.READY_MAX_CONSECUTIVE_FAILURES):
+        record_cycle(datetime.now(), error=RuntimeError("boom"))
+    assert client.get("/readyz").status_code == 200
+    record_cycle(datetime.now(), error=RuntimeError("boom"))
+    resp = client.get("/readyz")
+    assert resp.status_code == 503 and "consecutive failed cycles" in resp.get_json()["reasons"][0]
+
+
+def test_status_write_failure_does_not_fail_cycle(monkeypatch):
+    import main
+
+    def broken(*args, **kwargs):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(main, "record_cycle", broken)
+    monkeypatch.setattr(main, "_run_once", lambda device_ids, calc_mode, budget=None: {"d1": {}})
+    assert main.run_once() == {"d1": {}}
@@ -0,0 +1,102 @@
+# tests/test_data_quality.py
+import json
+from datetime import datetime, timedelta
+
+import fetch_data
+import write_result
+from data_quality import (
+    STATUS_FALLBACK,
+    STATUS_MISSING,
+    STATUS_OK,
+    STATUS_OUT_OF_RANGE,
+    PointScan,
+    WindowScan,
+    dumps_quality,
+    summarize,
+)
+
+END = datetime(2024, 12, 1, 12, 0)
+
+
+def test_point_scan_statuses():
+    scan = PointScan(END)
+    scan.observe(500.0, True)
+    assert scan.result(END - timedelta(minutes=1))["status"] == STATUS_OK
+
+    scan = PointScan(END)
+    scan.observe(None, False)
+    scan.observe(-5.0, False)
+    scan.observe(500.0, True)
+    info = scan.result(END - timedelta(minutes=3))
+    assert info["status"] == STATUS_FALLBACK
+    assert (info["rows_scanned"], info["missing"], info["out_of_range"]) == (3, 1, 1)
+    assert info["age_min"] == 3.0
+
+    scan = PointScan(END)
+    scan.observe(-5.0, False)
+    assert scan.result(None)["status"] == STATUS_OUT_OF_RANGE
+    assert PointScan(END).result(None)["status"] == STATUS_MISSING
+
+
+def test_window_scan_missing_ratio():
+    scan = WindowScan(END - timedelta(minutes=10), END)
+    for v, ok in [(1.0, True), (2.0, True), (None, False), (99.0, False)]:
+        scan.observe(v, ok)
+    scan.observe_counts(rows=4, valid=4, missing=0, out_of_range=0, total=4.0)
+
+    info = scan.result()
+    assert scan.total == 7.0
+    assert info == {
+        "expected": 10, "rows": 8, "valid": 6, "missing": 1, "out_of_range": 1, "missing_ratio": 0.4,
+    }
+
+
+def test_summarize_flags():
+    fields = {
+        "snow_depth": {"status": STATUS_FALLBACK, "value_time": "2024-12-01 11:50:00"},
+        "wind_speed": {"status": STATUS_OK},
+        "rainfall": {"status": STATUS_MISSING},
+        "temp_24h": {"missing_ratio": 0.5},
+        "rain_24h": {"missing_ratio": 0.1},
+    }
+    flag, quality = summarize(fields, staleness_min=3.0)
+    assert flag == "snow_depth:fallback_used@2024-12-01 11:50:00;rainfall:raw_missing;temp_24h:missing_ratio=0.5"
+    assert quality["staleness_min"] == 3.0
+    assert summarize({"wind_speed": {"status": STATUS_OK}})[0] == "normal"
+    assert json.loads(dumps_quality(quality)) == quality
+    assert dumps_quality(None) is None
+
+
+def test_fetch_quality_summary(monkeypatch):
+    detail = dumps_quality({"fields": {}, "staleness_min": 1.0})
+
+    class Client:
+        def execute(self, query, params):
+            assert "data_quality_detail" in query and params["device_ids"] == ["d1", "d2"]
+            return [("d1", END, "normal", detail), ("d2", END, "rainfall:raw_missing", None)]
+
+    monkeypatch.setattr(fetch_data, "get_ch_client", lambda **kw: Client())
+    summary = fetch_data.fetch_quality_summary(["d1", "d2"])
+    assert summary["d1"] == {
+        "ari_time": "2024-12-01 12:00:00",
+        "data_quality_flag": "normal",
+        "data_quality": {"fields": {}, "staleness_min": 1.0},
+    }
+    assert summary["d2"]["data_quality"] is None
+
+
+def test_ensure_schema_runs_migrations_and_tolerates_failure():
+    class Client:
+        def __init__(self, fail=False):
+            self.sql, self.fail = [], fail
+
+        def command(self, sql):
+            if self.fail:
+                raise RuntimeError("no ALTER privilege")
+            self.sql.append(sql)
+
+    client = Client()
+    assert write_result.ensure_schema(client)
+    assert len(client.sql) == len(write_result.MIGRATIONS)
+    assert all("IF NOT EXISTS" in s for s in client.sql)
+    assert not write_result.ensure_schema(Client(fail=True))
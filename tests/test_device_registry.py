@@ -0,0 +1,89 @@
+# tests/test_device_registry.py
+import os
+
+import pytest
+import yaml
+
+import config
+from device_registry import DeviceRegistry, RegistrySnapshot
+
+
+def test_overrides_merge_per_field_and_disabled_entries_skipped():
+    snap = RegistrySnapshot([
+        {"device_id": "d1", "confidence_range": {"snow_depth": {"max": 3000}}},
+        {"device_id": 2, "device_name": "站点2", "lat": 31.0, "lon": None},
+        {"device_id": "d3", "enabled": False},
+    ], "file", 1)
+
+    assert snap.device_ids == ["d1", "2"]
+    assert "d3" not in snap
+    base = config.SENSOR_CONFIDENCE_RANGE["snow_depth"]
+    assert snap.confidence_range("d1", "snow_depth") == {**base, "max": 3000}
+    assert snap.confidence_range("2", "snow_depth") == base
+    assert snap.confidence_range("unknown", "snow_depth") == base
+    assert snap.devices["2"]["device_name"] == "站点2" and snap.devices["d1"]["device_name"] == "d1"
+    assert snap.devices["2"]["lat"] == 31.0 and "lon" not in snap.devices["2"]
+    # 覆盖项不影响全局配置
+    assert config.SENSOR_CONFIDENCE_RANGE["snow_depth"] == base
+
+
+def test_signature_is_content_based():
+    devices = [{"device_id": "d1"}, {"device_id": "d2"}]
+    a = RegistrySnapshot(devices, "file", 1)
+    b = RegistrySnapshot(devices, "table", 7)
+    assert a.signature == b.signature
+    assert RegistrySnapshot(devices[:1], "file", 1).signature != a.signature
+    assert RegistrySnapshot(devices, "file", 1, regions={"r": {"stations": ["d1"]}}).signature != a.signature
+
+
+@pytest.fixture
+def registry_file(tmp_path, monkeypatch):
+    path = tmp_path / "devices.yaml"
+    monkeypatch.setattr(config, "DEVICE_REGISTRY_SOURCE", "file")
+    monkeypatch.setattr(config, "DEVICE_REGISTRY_FILE", str(path))
+
+    def write(devices, mtime):
+        path.write_text(yaml.safe_dump({"devices": devices}), encoding="utf-8")
+        os.utime(path, (mtime, mtime))
+
+    return write
+
+
+def test_refresh_notifies_added_and_removed(registry_file):
+    registry_file([{"device_id": "d1"}, {"device_id": "d2"}], 1)
+    reg = DeviceRegistry()
+    events = []
+    reg.add_listener(lambda added, removed, snap: events.append((sorted(added), sorted(removed), snap.version)))
+
+    assert reg.refresh() == (["d1", "d2"], [])
+    assert reg.refresh() == ([], [])           # 修改时间未变：不重新加载
+
+    registry_file([{"device_id": "d2"}, {"device_id": "d3"}, {"device_id": "d4", "enabled": False}], 2)
+    added, removed = reg.refresh()
+    assert (added, removed) == (["d3"], ["d1"])
+    assert reg.snapshot(max_age_sec=float("inf")).device_ids == ["d2", "d3"]
+
+    # 只改区间不改设备集合：换快照但不通知
+    registry_file([{"device_id": "d2", "confidence_range": {"snow_depth": {"max": 1}}}, {"device_id": "d3"}], 3)
+    assert reg.refresh() == ([], [])
+    assert reg.snapshot(max_age_sec=float("inf")).confidence_range("d2", "snow_depth")["max"] == 1
+
+    assert events == [(["d1", "d2"], [], 1), (["d3"], ["d1"], 2)]
+
+
+def test_bad_reload_keeps_snapshot_and_listener_errors_are_isolated(registry_file):
+    registry_file([{"device_id": "d1"}], 1)
+    reg = DeviceRegistry()
+    calls = []
+
+    def broken(added, removed, snap):
+        raise RuntimeError("boom")
+
+    reg.add_listener(broken)
+    reg.add_listener(lambda added, removed, snap: calls.append(added))
+    reg.refresh()
+    assert calls == [["d1"]]
+
+    registry_file([{"device_name": "no id"}], 2)
+    assert reg.refresh() == ([], [])
+    assert reg.snapshot(max_age_sec=float("inf")).device_ids == ["d1"]
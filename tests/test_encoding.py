@@ -0,0 +1,76 @@
+# tests/test_encoding.py
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from api import encoding
+from api.encoding import _pad_columns, encoded_response
+
+HISTORY = {"ari_1": ["1", "2", "3"], "ari_2": ["4"], "ari_3": []}
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/t")
+    def t():
+        return encoded_response({"success": True, "data": "x" * 2000}, etag_parts=["d1", "2024-12-01 00:00"])
+
+    @app.route("/series")
+    def series():
+        return encoded_response({"success": True, "data": HISTORY}, table=HISTORY)
+
+    return app.test_client()
+
+
+def test_json_default_and_unavailable_format(client):
+    resp = client.get("/t")
+    assert resp.status_code == 200 and resp.mimetype == encoding.MEDIA_JSON
+    assert {"Accept", "Accept-Encoding"} <= set(resp.vary)
+
+    # 非列式响应不提供 arrow
+    resp = client.get("/t?format=arrow")
+    assert resp.status_code == 406
+
+
+def test_weak_etag_shared_across_content_encodings(client):
+    plain = client.get("/t")
+    gz = client.get("/t", headers={"Accept-Encoding": "gzip"})
+
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(gz.get_data())) == plain.get_json()
+    assert plain.headers["ETag"].startswith('W/"')
+    assert plain.headers["ETag"] == gz.headers["ETag"]
+
+    for etag in (plain.headers["ETag"], plain.headers["ETag"][2:]):
+        resp = client.get("/t", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+        assert resp.status_code == 304 and resp.headers["ETag"] == plain.headers["ETag"]
+        assert {"Accept", "Accept-Encoding"} <= set(resp.vary)
+
+
+def test_stale_response_has_no_etag():
+    app = Flask(__name__)
+    with app.test_request_context("/t"):
+        resp = encoded_response({"success": True}, etag_parts=["d1"], stale_age=12.5)
+    assert "ETag" not in resp.headers
+    assert json.loads(resp.get_data())["stale_age_sec"] == 12.5
+
+
+def test_pad_columns_aligns_latest_values():
+    padded = _pad_columns(HISTORY)
+    assert padded == {
+        "ari_1": ["1", "2", "3"],
+        "ari_2": [None, None, "4"],
+        "ari_3": [None, None, None],
+    }
+
+
+def test_arrow_output_with_ragged_history(client):
+    pa = pytest.importorskip("pyarrow")
+    resp = client.get("/series?format=arrow")
+    assert resp.status_code == 200 and resp.mimetype == encoding.MEDIA_ARROW
+    table = pa.ipc.open_stream(resp.get_data()).read_all()
+    assert table.column("ari_2").to_pylist() == [None, None, "4"]
@@ -0,0 +1,38 @@
+# tests/test_fetch_stream.py
+from datetime import datetime, timedelta
+
+import config
+from minute_grid import load_minute_grid
+
+
+class BlockClient:
+    """
+    模拟 execute_iter：按 chunk_size 分块返回
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.chunk_sizes = []
+
+    def execute_iter(self, query, params=None, settings=None, chunk_size=1):
+        self.chunk_sizes.append(chunk_size)
+        for i in range(0, len(self.rows), chunk_size):
+            yield self.rows[i:i + chunk_size]
+
+
+def test_grid_window_by_blocks(monkeypatch):
+    monkeypatch.setattr(config, "CH_STREAM_BLOCK_ROWS", 100)
+    end = datetime(2024, 12, 1, 12, 0)
+    start = end - timedelta(hours=24)
+
+    values = ["-2.5"] * 1000 + [None] * 200 + ["999"] * 40 + ["1.5"] * 200
+    rows = [(start + timedelta(minutes=i), v) for i, v in enumerate(values)]
+    client = BlockClient(rows)
+    grid = load_minute_grid(client, "d1", end, fields=["atmospheric_temperature"], span_hours=24)
+    scan, info = grid.window("atmospheric_temperature", start, end)
+
+    assert client.chunk_sizes == [100]
+    assert scan.valid == 1200
+    assert scan.total == -2.5 * 1000 + 1.5 * 200
+    assert info["rows"] == 1440 and info["missing"] == 200 and info["out_of_range"] == 40
+    assert info["missing_ratio"] == round(1 - 1200 / 1440, 3)
@@ -0,0 +1,76 @@
+# tests/test_freshness.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import fetch_data
+from device_registry import RegistrySnapshot
+
+NOW = datetime(2024, 12, 1, 12, 0, 30)
+
+
+class FreshnessClient:
+
+    def __init__(self, latest):
+        self.latest = latest
+        self.queries = []
+
+    def execute(self, query, params=None):
+        assert "max(create_time_min)" in query
+        self.queries.append(list(params["device_ids"]))
+        return [(d, t) for d, t in self.latest.items() if d in params["device_ids"]]
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(fetch_data, "_freshness", {"time": 0.0, "index": {}})
+
+
+def test_freshness_index_cached_until_ttl_or_new_device():
+    client = FreshnessClient({"d1": NOW, "d2": NOW - timedelta(minutes=5)})
+
+    assert fetch_data.get_device_freshness(client, ["d1", "d2"]) == {"d1": NOW, "d2": NOW - timedelta(minutes=5)}
+    assert fetch_data.get_device_freshness(client, ["d1"]) == {"d1": NOW}
+    assert len(client.queries) == 1
+
+    # 索引中没有的设备触发重新查询；查询不到的设备记为 None
+    assert fetch_data.get_device_freshness(client, ["d1", "d3"]) == {"d1": NOW, "d3": None}
+    assert len(client.queries) == 2
+
+    fetch_data.get_device_freshness(client, ["d1"], max_age_sec=-1)
+    assert len(client.queries) == 3
+
+
+def test_note_device_freshness_only_moves_forward():
+    client = FreshnessClient({"d1": NOW})
+    fetch_data.get_device_freshness(client, ["d1"])
+    fetch_data.note_device_freshness({"d1": NOW - timedelta(minutes=1)})
+    assert fetch_data.get_device_freshness(client, ["d1"]) == {"d1": NOW}
+    fetch_data.note_device_freshness({"d1": NOW + timedelta(minutes=1)})
+    assert fetch_data.get_device_freshness(client, ["d1"]) == {"d1": NOW + timedelta(minutes=1)}
+
+
+def test_device_anchor_time():
+    guard = (NOW - timedelta(minutes=config.DATA_DELAY_GUARD_MIN)).replace(second=0)
+    assert fetch_data.get_device_anchor_time(None, NOW) is None
+    assert fetch_data.get_device_anchor_time(NOW - timedelta(minutes=config.DEVICE_STALE_MIN + 1), NOW) is None
+    assert fetch_data.get_device_anchor_time(NOW, NOW) == guard
+    assert fetch_data.get_device_anchor_time(NOW - timedelta(hours=1), NOW) == NOW - timedelta(hours=1)
+
+
+def test_stale_device_skips_grid_queries(monkeypatch):
+    snap = RegistrySnapshot([{"device_id": "d1", "device_name": "站点1"}], "file", 1)
+    monkeypatch.setattr(fetch_data.registry, "snapshot", lambda *a, **kw: snap)
+    monkeypatch.setattr(fetch_data, "get_ch_client", lambda **kw: FreshnessClient({}))
+
+    def no_grid(*args, **kwargs):
+        raise AssertionError("stale device must not be scanned")
+
+    monkeypatch.setattr(fetch_data, "_device_grid", no_grid)
+    res = fetch_data.fetch_sensor_data()["d1"]
+
+    assert res["data_quality_flag"] == fetch_data.STALE_FLAG
+    assert res["anchor_time"] is None
+    assert set(res["missing_fields"]) == set(fetch_data.SENSOR_RESULT_FIELDS)
+    assert all(res[k] is None for k in fetch_data.SENSOR_RESULT_FIELDS)
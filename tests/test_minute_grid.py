@@ -0,0 +1,161 @@
+# tests/test_minute_grid.py
+import random
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from data_quality import PointScan, WindowScan
+from fetch_data import in_confidence_range
+from minute_grid import GRID_FIELDS, SERIES_FIELDS, grid_span, load_minute_grid
+
+ANCHOR = datetime(2024, 12, 4, 12, 0)
+
+
+def _rows(seed=7):
+    """
+    带缺测、超范围、整段断报的分钟数据
+    """
+    rnd = random.Random(seed)
+    rows = []
+    t = grid_span(ANCHOR)
+    while t < ANCHOR:
+        gap = ANCHOR - timedelta(hours=30) <= t < ANCHOR - timedelta(hours=23)
+        if not gap and rnd.random() > 0.1:
+            rows.append({
+                "create_time_min": t,
+                "snow_depth": rnd.choice([None, "-5", str(rnd.uniform(400, 600))] + ["500.5"] * 5),
+                "wind_speed": rnd.choice([None, "99.0", "4.2", "8.1", "12.5"]),
+                "atmospheric_temperature": rnd.choice([None, "-2.5", "1.5", "999"]),
+                "rainfall": rnd.choice([None, "0", "0.2", "-1"]),
+                "wind_direction": rnd.choice([None, "270", "315.5", "400"]),
+            })
+        t += timedelta(minutes=1)
+    return rows
+
+
+def _value(raw):
+    return float(raw) if raw is not None else None
+
+
+def _query_last_valid(rows, field, end_time):
+    """
+    参照实现：逐行倒序回溯 DATA_MAX_LOOKBACK_MIN 内最近的可信值
+    """
+    start_time = end_time - timedelta(minutes=config.DATA_MAX_LOOKBACK_MIN)
+    scan = PointScan(end_time)
+    for r in sorted(rows, key=lambda r: r["create_time_min"], reverse=True):
+        if not start_time <= r["create_time_min"] < end_time:
+            continue
+        v = _value(r.get(field))
+        valid = in_confidence_range(v, field)
+        scan.observe(v, valid)
+        if valid:
+            return v, r["create_time_min"], scan.result(r["create_time_min"])
+    return None, None, scan.result(None)
+
+
+def _query_window(rows, field, start_time, end_time):
+    """
+    参照实现：逐行累加窗口内可信值
+    """
+    scan = WindowScan(start_time, end_time)
+    for r in rows:
+        if start_time <= r["create_time_min"] < end_time:
+            v = _value(r.get(field))
+            scan.observe(v, in_confidence_range(v, field))
+    return scan, scan.result()
+
+
+class RowClient:
+    """
+    按 WHERE 时间条件过滤的内存表，支持 execute / execute_iter
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def _select(self, query, params):
+        self.queries += 1
+        cols = [c.strip() for c in re.search(r"SELECT (.*?)\s+FROM", query, re.S).group(1).split(",")]
+        rows = [r for r in self.rows if params["start"] <= r["create_time_min"] < params["end"]]
+        if "DESC" in query:
+            rows = rows[::-1]
+        return [tuple(r.get(c) for c in cols) for r in rows]
+
+    def execute(self, query, params=None):
+        return self._select(query, params)
+
+    def execute_iter(self, query, params=None, settings=None, chunk_size=1):
+        rows = self._select(query, params)
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i:i + chunk_size]
+
+
+@pytest.fixture(scope="module")
+def grid_and_client():
+    client = RowClient(_rows())
+    grid = load_minute_grid(client, "d1", ANCHOR)
+    assert client.queries == 1
+    return grid, client
+
+
+@pytest.mark.parametrize("field", [f for f in GRID_FIELDS if f not in SERIES_FIELDS])
+@pytest.mark.parametrize("hours", [0, 24, 72])
+def test_point_matches_row_scan(grid_and_client, field, hours):
+    grid, client = grid_and_client
+    end = ANCHOR - timedelta(hours=hours)
+    assert grid.point(field, end) == _query_last_valid(client.rows, field, end)
+
+
+@pytest.mark.parametrize("field", ["atmospheric_temperature", "rainfall"])
+@pytest.mark.parametrize("hours", [0, 24, 48])
+def test_window_matches_row_scan(grid_and_client, field, hours):
+    grid, client = grid_and_client
+    end = ANCHOR - timedelta(hours=hours)
+    start = end - timedelta(hours=24)
+    scan, info = grid.window(field, start, end)
+    expected, expected_info = _query_window(client.rows, field, start, end)
+
+    assert info == expected_info
+    assert scan.valid == expected.valid
+    assert scan.total == pytest.approx(expected.total)
+
+
+def test_point_forward_fill_and_lookback():
+    rows = [
+        {"create_time_min": ANCHOR - timedelta(minutes=90), "snow_depth": "500",
+         "wind_speed": "5.0", "atmospheric_temperature": None, "rainfall": None},
+        {"create_time_min": ANCHOR - timedelta(minutes=2), "snow_depth": "-5",
+         "wind_speed": None, "atmospheric_temperature": None, "rainfall": None},
+    ]
+    grid = load_minute_grid(RowClient(rows), "d1", ANCHOR)
+
+    v, t, info = grid.point("snow_depth", ANCHOR)
+    assert (v, t) == (500.0, ANCHOR - timedelta(minutes=90))
+    assert info["status"] == "fallback"
+    assert info["rows_scanned"] == 2 and info["out_of_range"] == 1
+
+    # 可信值早于回溯窗口：不再前向填充
+    v, t, info = grid.point("snow_depth", ANCHOR, lookback_min=60)
+    assert v is None and info["status"] == "out_of_range_and_no_fallback"
+
+    v, t, info = grid.point("atmospheric_temperature", ANCHOR)
+    assert v is None and info["status"] == "raw_missing" and info["missing"] == 2
+
+
+def test_series_fields_keep_values_only(grid_and_client):
+    grid, client = grid_and_client
+    assert SERIES_FIELDS.isdisjoint(grid.prefix)
+    end = ANCHOR - timedelta(hours=1)
+    minutes = grid.values("wind_direction", end - timedelta(minutes=30), end)
+    expected = {
+        r["create_time_min"]: _value(r["wind_direction"]) for r in client.rows
+        if end - timedelta(minutes=30) <= r["create_time_min"] < end
+        and in_confidence_range(_value(r["wind_direction"]), "wind_direction")
+    }
+    for i, v in enumerate(minutes):
+        t = end - timedelta(minutes=30 - i)
+        assert (v == expected[t]) if t in expected else v != v
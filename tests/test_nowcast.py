@@ -0,0 +1,84 @@
+# tests/test_nowcast.py
+from datetime import datetime, timedelta
+
+from nowcast import NowcastWatcher, RateLimiter
+
+DEVICE = "04672adb0c3a"
+
+
+class ListSource:
+
+    def __init__(self):
+        self.batches = []
+
+    def poll(self, device_ids):
+        return self.batches.pop(0) if self.batches else []
+
+
+def _obs(minute, wind=None, depth_mm=None):
+    t = datetime(2024, 12, 1, 10, 0) + timedelta(minutes=minute)
+    return (DEVICE, t, {"wind_speed": wind, "snow_depth": depth_mm})
+
+
+def _watcher(cooldown_sec=0, max_per_hour=100):
+    calls = []
+    source = ListSource()
+    w = NowcastWatcher(calls.append, source=source,
+                       limiter=RateLimiter(cooldown_sec=cooldown_sec, max_per_hour=max_per_hour))
+    return w, source, calls
+
+
+def test_band_crossing_triggers_recompute():
+    w, source, calls = _watcher()
+    source.batches = [
+        [_obs(0, wind=4.0, depth_mm=500)],          # 基线
+        [_obs(1, wind=4.5, depth_mm=510)],          # 同一分档
+        [_obs(2, wind=8.2, depth_mm=510)],          # 跨过 8 m/s
+        [_obs(3, wind=8.5, depth_mm=560)],          # 雪深跨过 0.55 m 步长档
+    ]
+    assert w.poll_once() == []
+    assert w.poll_once() == []
+    assert w.poll_once() == [DEVICE]
+    assert w.poll_once() == [DEVICE]
+    assert calls == [[DEVICE], [DEVICE]]
+
+
+def test_spike_back_to_baseline_within_poll_is_ignored():
+    w, source, calls = _watcher()
+    source.batches = [
+        [_obs(0, wind=4.0)],
+        [_obs(1, wind=13.0), _obs(2, wind=4.2)],
+    ]
+    w.poll_once()
+    assert w.poll_once() == []
+
+
+def test_cooldown_keeps_device_pending():
+    w, source, calls = _watcher(cooldown_sec=3600)
+    source.batches = [
+        [_obs(0, wind=4.0)],
+        [_obs(1, wind=6.0)],
+        [_obs(2, wind=9.0)],
+    ]
+    w.poll_once()
+    assert w.poll_once() == [DEVICE]
+    assert w.poll_once() == []
+    assert DEVICE in w._pending
+
+    # 周期计算完成后以当前分档为基线，不再补算
+    w.commit()
+    assert DEVICE not in w._pending
+
+
+def test_out_of_range_values_are_ignored():
+    w, source, calls = _watcher()
+    source.batches = [[_obs(0, wind=4.0)], [_obs(1, wind=99.0)]]
+    w.poll_once()
+    assert w.poll_once() == []
+
+
+def test_rate_limiter_hourly_budget():
+    limiter = RateLimiter(cooldown_sec=0, max_per_hour=2)
+    assert limiter.acquire(["a", "b", "c"], now=0.0) == ["a", "b"]
+    assert limiter.acquire(["c"], now=10.0) == []
+    assert limiter.acquire(["c"], now=3601.0) == ["c"]
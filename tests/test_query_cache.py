@@ -0,0 +1,66 @@
+# tests/test_query_cache.py
+from datetime import datetime, timedelta
+
+import config
+import fetch_data
+from query_cache import QueryCache, estimate_size
+
+
+def test_lru_eviction_by_bytes():
+    item = "x" * 1000
+    per_entry = estimate_size(("k", 0)) + estimate_size(item)
+    cache = QueryCache(max_bytes=per_entry * 3)
+
+    for i in range(3):
+        cache.put(("k", i), item, 60)
+    assert cache.get(("k", 0))[0]           # 0 变为最近使用
+    cache.put(("k", 3), item, 60)
+
+    assert not cache.get(("k", 1))[0]       # 最久未用的被淘汰
+    assert cache.get(("k", 0))[0] and cache.get(("k", 3))[0]
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 3
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_ttl_expiry_counts_as_miss():
+    cache = QueryCache(max_bytes=10 ** 6)
+    cache.put("a", 1, ttl_sec=-1)
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["expired"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_mutable_grid_key_follows_watermark(monkeypatch):
+    now = datetime.now().replace(second=0, microsecond=0)
+    old_end = now - timedelta(hours=1)
+    recent_end = now + timedelta(minutes=1)
+
+    key, ttl = fetch_data._with_watermark(("grid", "d1", old_end), "d1", old_end)
+    assert ttl == config.QUERY_CACHE_IMMUTABLE_TTL_SEC
+
+    monkeypatch.setitem(fetch_data._freshness, "index", {"d1": now - timedelta(minutes=1)})
+    k1, ttl = fetch_data._with_watermark(("grid", "d1", recent_end), "d1", recent_end)
+    assert ttl == config.QUERY_CACHE_TTL_SEC
+    monkeypatch.setitem(fetch_data._freshness, "index", {"d1": now})
+    k2, _ = fetch_data._with_watermark(("grid", "d1", recent_end), "d1", recent_end)
+    assert k1 != k2
+
+
+def test_device_grid_is_read_through(monkeypatch):
+    import minute_grid
+
+    monkeypatch.setattr(fetch_data, "query_cache", QueryCache(max_bytes=10 ** 8))
+    end = datetime(2024, 12, 1, 12, 0)
+    loads = []
+
+    def load(client, device_id, anchor_time, ranges=None, span_hours=None):
+        loads.append(device_id)
+        return minute_grid.build_minute_grid([], anchor_time, ranges, span_hours=span_hours)
+
+    monkeypatch.setattr(minute_grid, "load_minute_grid", load)
+    for _ in range(3):
+        grid = fetch_data._device_grid(object(), "d1", end)
+    assert loads == ["d1"]
+    assert fetch_data.query_cache.stats()["hits"] == 2
+    # 72h + 回溯窗口的完整网格约 1.2 MB
+    assert grid.nbytes < 1.5 * 1024 * 1024
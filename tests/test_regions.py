@@ -0,0 +1,96 @@
+# tests/test_regions.py
+import pytest
+
+import config
+from device_registry import RegistrySnapshot
+from regions import aggregate_region, compute_regions
+from stations import SpatialIndex, read_station_ini, station_meta
+
+META = {
+    "a": {"lat": 31.00, "lon": 103.40, "elevation": 3000.0},
+    "b": {"lat": 31.03, "lon": 103.42, "elevation": 1000.0},
+    "c": {"lat": 31.50, "lon": 104.00, "elevation": 2000.0},
+    "d": {"elevation": 2500.0},                       # 无坐标，不入索引
+}
+
+
+def _res(ari_1=None, ari_2=None, ari_5="无", threshold="无", **kw):
+    return {"ari_1": ari_1, "ari_2": ari_2, "ari_3": "无", "ari_4": "无", "ari_5": ari_5,
+            "threshold_level": threshold, "data_quality_flag": "normal", **kw}
+
+
+def test_spatial_index_within_and_nearest():
+    index = SpatialIndex(META, cell_km=2.0)
+    assert [d for d, _ in index.within(31.0, 103.4, 5)] == ["a", "b"]
+    assert index.within(31.0, 103.4, 0.5)[0][0] == "a"
+    assert [d for d, _ in index.nearest(31.49, 103.99, k=2)] == ["c", "b"]
+    assert "d" not in index.points
+
+
+def test_read_station_ini(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "STATION_DIR", str(tmp_path))
+    (tmp_path / "s1").mkdir()
+    (tmp_path / "s1" / "station.ini").write_text(
+        "[INPUT]\nSTATION1 = s1\nPOSITION1 = latlon (31.2, 103.5, 2750)\n", encoding="utf-8")
+    (tmp_path / "s2").mkdir()
+    (tmp_path / "s2" / "s2.ini").write_text("latitude = 30.9\nlongitude = 103.1\n", encoding="utf-8")
+    (tmp_path / "s3").mkdir()
+    (tmp_path / "s3" / "station.ini").write_text("", encoding="utf-8")
+
+    assert read_station_ini("s1") == {"lat": 31.2, "lon": 103.5, "elevation": 2750.0}
+    assert read_station_ini("s2") == {"lat": 30.9, "lon": 103.1}
+    assert read_station_ini("s3") == {}
+    assert read_station_ini("missing") == {}
+
+    snap = RegistrySnapshot([{"device_id": "s1", "elevation": 2800}], "file", 1)
+    assert station_meta(snap)["s1"]["elevation"] == 2800.0
+
+
+def test_max_region_takes_worst_member():
+    results = {
+        "a": _res(ari_1=0.55, ari_2=0.3),
+        "b": _res(ari_1=1.2, ari_2=0.4, threshold="黄"),
+        "c": _res(data_quality_flag="stale_device"),
+    }
+    out = aggregate_region("r", {"method": "max"}, ["a", "b", "c"], results, META)
+    assert out["ari_1"] == 1.2 and out["ari_2"] == 0.4
+    assert out["worst_station"] == "b" and out["ari_level"] == out["stations"]["b"]
+    assert out["threshold_level"] == "黄"
+    assert out["reporting"] == 2
+
+
+def test_elevation_weighted_region():
+    results = {"a": _res(ari_1=0.4, ari_5="III"), "b": _res(ari_1=1.2), "d": _res(ari_1=9.0)}
+    meta = {k: v for k, v in META.items() if k != "d"}
+    out = aggregate_region("r", {"method": "elevation_weighted"}, ["a", "b", "d"], results, meta)
+    # d 缺海拔不参与加权
+    assert out["ari_1"] == pytest.approx((0.4 * 3000 + 1.2 * 1000) / 4000)
+    assert out["ari_5"] == "III"
+    assert out["reporting"] == 3
+
+
+def test_compute_regions_resolves_spatial_members(monkeypatch):
+    import regions
+    snap = RegistrySnapshot(
+        [{"device_id": d, **m} for d, m in META.items()], "file", 7,
+        regions={"north": {"center": [31.01, 103.41], "radius_km": 5}, "c_only": {"stations": ["c", "zz"]}},
+    )
+    monkeypatch.setattr(regions, "get_station_index", lambda s: (META, SpatialIndex(META)))
+    out = compute_regions({d: _res(ari_1=0.5) for d in META}, snap)
+    assert sorted(out["north"]["members"]) == ["a", "b"]
+    assert out["c_only"]["members"] == ["c"]
+
+
+def test_invalid_regions_skipped_at_load(capsys):
+    snap = RegistrySnapshot([{"device_id": "a"}], "file", 1, regions={
+        "ok": {"stations": ["a"], "method": "max"},
+        "bad_method": {"stations": ["a"], "method": "mean"},
+        "bad_center": {"center": [31.0], "radius_km": 5},
+        "no_radius": {"center": [31.0, 103.4]},
+        "empty": {},
+        "not_a_dict": ["a"],
+    })
+    assert list(snap.regions) == ["ok"]
+    assert capsys.readouterr().out.count("[REGISTRY] region") == 5
+    # 区域结果可直接合成，不再因定义错误抛出
+    assert compute_regions({"a": _res(0.5)}, snap)["ok"]["reporting"] == 1
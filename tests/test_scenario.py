@@ -0,0 +1,74 @@
+# tests/test_scenario.py
+import pytest
+
+from scenario import ScenarioError, run_scenarios, scenario_combinations
+
+BASE = {
+    "d1": {"snow_depth": 0.5, "snowfall_24h": 0.1, "snowfall_72h": 0.2, "delta_snow_24h": 0.0,
+           "temp_avg_24h": -3.0, "rainfall_24h": 0.0, "wind_speed": 4.0},
+    "d2": {"snow_depth": 0.8, "snowfall_24h": None, "snowfall_72h": 0.4, "delta_snow_24h": 0.0,
+           "temp_avg_24h": -1.0, "rainfall_24h": 1.0, "wind_speed": 9.0},
+}
+
+
+def test_grid_is_cartesian_product():
+    grid = {"new_snow_24h": [0, 0.3], "wind_speed": {"op": "scale", "values": [1, 2, 3]}}
+    result = run_scenarios(grid, base_inputs=BASE)
+
+    assert result["scenarios"] == 6
+    assert set(result["devices"]) == {"d1", "d2"}
+    for dist in result["overall"].values():
+        assert sum(dist.values()) == pytest.approx(1.0, abs=1e-3)
+    assert result["axes"][0] == {"field": "new_snow_24h", "op": "add", "values": [0.0, 0.3]}
+    assert scenario_combinations(grid)[1] == {"new_snow_24h": 0.0, "wind_speed": 2.0}
+
+
+def test_device_filter():
+    result = run_scenarios({"wind_speed": [5]}, base_inputs=BASE, device_ids=["d2"])
+    assert list(result["devices"]) == ["d2"]
+
+
+@pytest.mark.parametrize("kwargs, msg", [
+    ({"grid": ["wind_speed"]}, "grid must be"),
+    ({"grid": {"wind_speed": "fast"}}, "non-empty list"),
+    ({"grid": {"wind_speed": [5, "x"]}}, "must be numbers"),
+    ({"grid": {"wind_speed": {"op": "pow", "values": [2]}}}, "unsupported op"),
+    ({"grid": {"new_snow_24h": {"op": "scale", "values": [2]}}}, "unsupported op"),
+    ({"grid": {"new_snow_24h": {"op": "set", "values": [0.1]}}}, "unsupported op"),
+    ({"grid": {"unknown": [1]}}, "unknown scenario field"),
+    ({"grid": {}, "base_inputs": ["d1"]}, "inputs must be"),
+    ({"grid": {}, "base_inputs": {"d1": 5}}, "inputs must be"),
+    ({"grid": {}, "base_inputs": {"d1": {"wind_speed": "abc"}}}, "not a number"),
+    ({"grid": {}, "base_inputs": BASE, "device_ids": "d1"}, "device_ids must be"),
+])
+def test_invalid_requests_raise_scenario_error(kwargs, msg):
+    kwargs.setdefault("base_inputs", BASE)
+    with pytest.raises(ScenarioError, match=msg):
+        run_scenarios(**kwargs)
+
+
+def test_endpoint_rejects_non_object_body():
+    from app import create_app
+
+    resp = create_app().test_client().post("/api/ari/scenario", json=[1, 2])
+    assert resp.status_code == 400
+    resp = create_app().test_client().post(
+        "/api/ari/scenario", json={"grid": {"wind_speed": [1]}, "inputs": "x"})
+    assert resp.status_code == 400
+
+
+def test_endpoint_base_inputs_go_through_admission(monkeypatch):
+    import scenario
+    from app import create_app
+
+    calls = []
+
+    def admitted(backend, key, fn):
+        calls.append((backend, key))
+        return (BASE, {}), 12.0
+
+    monkeypatch.setattr(scenario, "admitted", admitted)
+    resp = create_app().test_client().post("/api/ari/scenario", json={"grid": {"wind_speed": [5]}})
+    body = resp.get_json()
+    assert calls == [("ari_compute", "current")]
+    assert body["success"] and body["stale_age_sec"] == 12.0
@@ -0,0 +1,87 @@
+# tests/test_sensor_history.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import api.sensor_api as sensor_api
+import fetch_sensor_history
+from device_registry import RegistrySnapshot
+from fetch_sensor_history import SENSOR_HISTORY_MAX_FIELDS, fetch_sensor_history as fetch_history
+
+START = datetime(2024, 12, 1, 0, 0)
+
+
+class BucketClient:
+
+    def __init__(self, n=100):
+        self.n = n
+        self.queries = []
+
+    def execute(self, query, params):
+        self.queries.append((query, params))
+        bucket = 60
+        return [
+            (params["start"] + timedelta(seconds=bucket * i), 1.0, 359.0, float(i % 360), 1)
+            for i in range(self.n)
+        ]
+
+
+@pytest.fixture(autouse=True)
+def registry_and_cache(monkeypatch):
+    snap = RegistrySnapshot([{"device_id": "d1"}], "file", 1)
+    monkeypatch.setattr(fetch_sensor_history.registry, "snapshot", lambda *a, **kw: snap)
+    monkeypatch.setattr(sensor_api.registry, "snapshot", lambda *a, **kw: snap)
+    fetch_sensor_history.history_cache.clear()
+
+
+def test_aware_times_are_converted_to_naive_local():
+    client = BucketClient()
+    start = START.replace(tzinfo=timezone.utc)
+    out = fetch_history("d1", "snow_depth", start, start + timedelta(hours=2), points=100, client=client)
+
+    _, params = client.queries[0]
+    assert params["start"].tzinfo is None and params["end"].tzinfo is None
+    assert params["end"] == start.astimezone().replace(tzinfo=None) + timedelta(hours=2)
+    assert out["meta"]["points"] == 100
+
+
+def test_wind_direction_uses_vector_mean_without_lttb():
+    client = BucketClient(n=400)
+    out = fetch_history("d1", "wind_direction", START, START + timedelta(hours=8), points=50,
+                        method="lttb", client=client)
+    query, _ = client.queries[0]
+    assert "atan2" in query
+    assert out["meta"]["method"] == "avg" and out["meta"]["circular_mean"] is True
+    assert len(out["series"]["value"]) == 400    # 未做 LTTB
+
+    out = fetch_history("d1", "wind_direction", START, START + timedelta(hours=8), points=50,
+                        method="minmax", client=BucketClient())
+    assert set(out["series"]["min"]) == {None} and set(out["series"]["max"]) == {None}
+
+    out = fetch_history("d1", "wind_speed", START, START + timedelta(hours=8), points=50,
+                        method="minmax", client=BucketClient())
+    assert out["series"]["max"][0] == 359.0 and "circular_mean" not in out["meta"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from app import create_app
+
+    monkeypatch.setattr(fetch_sensor_history, "get_ch_client", lambda **kw: BucketClient())
+    return create_app().test_client()
+
+
+def test_endpoint_accepts_utc_suffix(client):
+    resp = client.get("/api/sensor/history?device_id=d1&field=snow_depth"
+                      "&start=2024-12-01T00:00:00Z&end=2024-12-01T06:00:00Z")
+    assert resp.status_code == 200
+    assert resp.get_json()["data"]["snow_depth"]["meta"]["points"] == 100
+
+
+def test_endpoint_limits_field_count(client):
+    fields = ",".join(list(fetch_sensor_history.FIELD_MAPPING)[:SENSOR_HISTORY_MAX_FIELDS + 1])
+    resp = client.get(f"/api/sensor/history?device_id=d1&field={fields}")
+    assert resp.status_code == 400
+
+    resp = client.get("/api/sensor/history?device_id=d1&field=snow_depth,snow_depth,nope")
+    assert resp.status_code == 400 and "unknown field" in resp.get_json()["msg"]
@@ -0,0 +1,137 @@
+# tests/test_sharding.py
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import config
+from sharding import HashRing, ShardWorker, retry_delay, slot_key, slot_membership, takeover_devices
+
+DEVICES = [f"dev{i:03d}" for i in range(300)]
+SLOT = datetime(2024, 12, 1, 12, 0)
+
+
+class MemoryLeaseStore:
+
+    def __init__(self):
+        self.data = {}
+
+    def heartbeat(self, lease):
+        self.data[lease["worker_id"]] = dict(lease)
+
+    def release(self, worker_id):
+        self.data.pop(worker_id, None)
+
+    def leases(self):
+        return {k: dict(v) for k, v in self.data.items()}
+
+
+def _worker(store, worker_id, started_at=SLOT - timedelta(minutes=5)):
+    w = ShardWorker(worker_id, store=store, ttl_sec=60)
+    w.started_at = started_at
+    w.previous_lease = store.leases().get(worker_id)
+    w.heartbeat()
+    return w
+
+
+def test_ring_assignment_is_stable_and_balanced():
+    ring = HashRing(["a", "b", "c"], vnodes=64)
+    owners = {d: ring.owner(d) for d in DEVICES}
+    assert owners == {d: HashRing(["c", "a", "b"], vnodes=64).owner(d) for d in DEVICES}
+    assert min(Counter(owners.values()).values()) > len(DEVICES) / 3 * 0.6
+
+    # 去掉一个 worker：只有它的设备换 owner
+    smaller = HashRing(["a", "c"], vnodes=64)
+    moved = [d for d in DEVICES if smaller.owner(d) != owners[d]]
+    assert moved and all(owners[d] == "b" for d in moved)
+
+    # 加入一个 worker：只有被新 worker 接走的设备换 owner
+    larger = HashRing(["a", "b", "c", "d"], vnodes=64)
+    assert all(larger.owner(d) == "d" for d in DEVICES if larger.owner(d) != owners[d])
+    assert HashRing([]).owner("x") is None
+
+
+def test_failover_takes_over_only_unfinished_devices():
+    store = MemoryLeaseStore()
+    a, b = _worker(store, "a"), _worker(store, "b")
+    slot_ring, _ = slot_membership(a, SLOT, DEVICES)
+    owned_by_b = slot_ring.assign(DEVICES, "b")
+
+    # b 存活：a 只算自己的设备
+    assert set(takeover_devices(a, SLOT, DEVICES, set(), slot_ring)) == set(slot_ring.assign(DEVICES, "a"))
+
+    # b 已完成本周期后死亡：不重算
+    b.mark_completed(SLOT)
+    store.data["b"]["heartbeat"] = time.time() - 600
+    assert set(takeover_devices(a, SLOT, DEVICES, set(slot_ring.assign(DEVICES, "a")), slot_ring)) == set()
+
+    # b 未完成就死亡：a 接管 b 的设备
+    store.data["b"]["completed_slot"] = None
+    todo = takeover_devices(a, SLOT, DEVICES, set(slot_ring.assign(DEVICES, "a")), slot_ring)
+    assert set(todo) == set(owned_by_b)
+
+
+def test_worker_joining_mid_slot_does_not_recompute():
+    store = MemoryLeaseStore()
+    a = _worker(store, "a")
+    a.mark_completed(SLOT)
+    done_a = set(DEVICES)
+
+    c = _worker(store, "c", started_at=SLOT + timedelta(minutes=10))
+    slot_ring, done = slot_membership(c, SLOT, DEVICES)
+    assert done == set() and slot_ring.workers == ["a"]
+    assert takeover_devices(c, SLOT, DEVICES, done, slot_ring) == []
+    # a 按新环只负责自己的部分，已完成
+    assert takeover_devices(a, SLOT, DEVICES, done_a, slot_membership(a, SLOT, DEVICES)[0]) == []
+
+    # 下一个周期 c 正常分到设备
+    next_slot = SLOT + timedelta(minutes=config.ARI_INTERVAL_MIN)
+    ring, _ = slot_membership(c, next_slot, DEVICES)
+    assert takeover_devices(c, next_slot, DEVICES, set(), ring) == ring.assign(DEVICES, "c")
+
+
+def test_crash_restart_resumes_previous_completion():
+    store = MemoryLeaseStore()
+    _worker(store, "a")
+    b = _worker(store, "b")
+    b.mark_completed(SLOT)
+
+    # 同一 worker_id 周期中途重启
+    b2 = _worker(store, "b", started_at=SLOT + timedelta(minutes=3))
+    slot_ring, done = slot_membership(b2, SLOT, DEVICES)
+    assert slot_ring.workers == ["a", "b"]
+    assert done == set(slot_ring.assign(DEVICES, "b"))
+    assert takeover_devices(b2, SLOT, DEVICES, done, slot_ring) == []
+
+    # 上一次运行未完成该周期：重启后补算自己的设备
+    store.data["b"]["completed_slot"] = slot_key(SLOT - timedelta(minutes=30))
+    b3 = _worker(store, "b", started_at=SLOT + timedelta(minutes=4))
+    slot_ring, done = slot_membership(b3, SLOT, DEVICES)
+    assert done == set()
+    assert takeover_devices(b3, SLOT, DEVICES, done, slot_ring) == slot_ring.assign(DEVICES, "b")
+
+
+def test_retry_delay_backs_off_to_cap():
+    delays = [retry_delay(n) for n in range(1, 12)]
+    assert delays[0] == config.SHARD_TICK_SEC
+    assert delays == sorted(delays) and delays[-1] == config.SHARD_RETRY_MAX_SEC
+
+
+def test_failed_owner_keeps_devices_after_mid_slot_join():
+    store = MemoryLeaseStore()
+    a = _worker(store, "a")
+    slot_ring, done = slot_membership(a, SLOT, DEVICES)
+    assert slot_ring.workers == ["a"]
+    # a 的本周期计算失败（退避中），期间 c 加入
+    c = _worker(store, "c", started_at=SLOT + timedelta(minutes=10))
+    moved = c.ring().assign(DEVICES, "c")
+    assert moved
+
+    # c 按周期开始时的成员不接手；a 重试时仍负责全部设备（含当前环已分给 c 的）
+    c_ring, c_done = slot_membership(c, SLOT, DEVICES)
+    assert takeover_devices(c, SLOT, DEVICES, c_done, c_ring) == []
+    assert takeover_devices(a, SLOT, DEVICES, done, slot_ring) == DEVICES
+
+    # 下一周期按新环分配
+    next_slot = SLOT + timedelta(minutes=config.ARI_INTERVAL_MIN)
+    ring, _ = slot_membership(a, next_slot, DEVICES)
+    assert set(takeover_devices(a, next_slot, DEVICES, set(), ring)) == set(DEVICES) - set(moved)
@@ -0,0 +1,84 @@
+# tests/test_snapshot.py
+import multiprocessing
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import snapshot
+from device_registry import RegistrySnapshot
+from snapshot import SnapshotStore
+
+DEVICES = [{"device_id": "d1"}, {"device_id": "d2"}]
+
+
+def test_anchor_key_ignores_process_local_registry_version(monkeypatch):
+    latest = datetime(2024, 12, 1, 11, 50)
+    monkeypatch.setattr(snapshot, "get_device_freshness", lambda device_ids=None: {d: latest for d in device_ids})
+
+    keys = []
+    for version in (1, 5):
+        snap = RegistrySnapshot(DEVICES, "file", version)
+        monkeypatch.setattr(snapshot.registry, "snapshot", lambda *a, **kw: snap)
+        keys.append(snapshot.anchor_key())
+    assert keys[0] == keys[1]
+
+    snap = RegistrySnapshot(DEVICES[:1], "file", 1)
+    monkeypatch.setattr(snapshot.registry, "snapshot", lambda *a, **kw: snap)
+    assert snapshot.anchor_key() != keys[0]
+
+
+def _compute_in_process(snapshot_dir, log_path, out_q):
+    def compute():
+        with open(log_path, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(0.5)
+        return {"computed_by": os.getpid()}
+
+    out_q.put(SnapshotStore(snapshot_dir).compute_once("anchor", compute, wait_sec=10))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_processes_with_same_anchor_share_one_computation(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    log_path = str(tmp_path / "calls.log")
+    out_q = ctx.Queue()
+    procs = [ctx.Process(target=_compute_in_process, args=(str(tmp_path), log_path, out_q)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    results = [out_q.get(timeout=20) for _ in procs]
+    for p in procs:
+        p.join(10)
+
+    with open(log_path) as f:
+        assert len(f.read().split()) == 1
+    assert len({r["computed_by"] for r in results}) == 1
+
+
+def test_published_key_uses_anchors_the_cycle_ran_with(monkeypatch):
+    t0 = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=20)
+    latest = {"d1": t0, "d2": None}
+    monkeypatch.setattr(snapshot, "get_device_freshness", lambda device_ids=None: dict(latest))
+    snap = RegistrySnapshot(DEVICES, "file", 1)
+    monkeypatch.setattr(snapshot.registry, "snapshot", lambda *a, **kw: snap)
+    models = snapshot.get_model_set()
+
+    sensor_data = {
+        "d1": {"anchor_time": t0.strftime("%Y-%m-%d %H:%M:%S"), "data_quality_flag": "normal"},
+        "d2": {"anchor_time": "2024-11-20 08:00:00", "data_quality_flag": snapshot.STALE_FLAG},
+    }
+    key = snapshot.computed_anchor_key(sensor_data, models, snap)
+    assert key == snapshot.anchor_key(models=models)
+
+    # 周期内有新分钟到达：发布的结果不能落到新锚点的 key 上
+    saved = {}
+
+    class Store:
+        def save(self, key, data):
+            saved[key] = data
+
+    monkeypatch.setattr(snapshot, "get_snapshot_store", Store)
+    latest["d1"] = t0 + timedelta(minutes=8)
+    snapshot.publish_snapshot(sensor_data, {}, models, snap)
+    assert list(saved) == [key] and key != snapshot.anchor_key(models=models)
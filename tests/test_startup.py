@@ -0,0 +1,10 @@
+# tests/test_startup.py
+import pytest
+
+from bench_startup import measure
+
+
+@pytest.mark.parametrize("module", ["app", "main"])
+def test_entry_import_has_no_heavy_side_effects(module):
+    res = measure(module, runs=1)
+    assert res["heavy_loaded"] == [], res
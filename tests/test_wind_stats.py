@@ -0,0 +1,93 @@
+# tests/test_wind_stats.py
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from minute_grid import build_minute_grid
+from wind_stats import (
+    DIRECTION_FIELDS,
+    _rolling_mean,
+    band_field,
+    compute_wind_stats,
+    grid_wind_stats,
+    missing_wind_fields,
+    wind_fields,
+)
+
+N = 24 * 60
+
+
+def test_rolling_mean_matches_loop():
+    rnd = np.random.default_rng(3)
+    speed = rnd.uniform(0, 15, 200)
+    speed[rnd.random(200) < 0.3] = np.nan
+    fast = _rolling_mean(speed, 10)
+    for i in range(200):
+        win = speed[max(0, i - 9):i + 1]
+        ok = win[~np.isnan(win)]
+        expected = ok.mean() if len(ok) * 2 >= 10 else np.nan
+        assert fast[i] == pytest.approx(expected, nan_ok=True)
+
+
+def test_gust_sustained_and_drift():
+    speed = np.full(N, 4.0)
+    speed[600:720] = 11.0           # 2h 持续大风
+    speed[900] = 20.0               # 单分钟阵风，不构成持续
+    out = compute_wind_stats(speed, direction=np.full(N, 315.0))
+
+    assert out["wind_gust_max_24h"] == 20.0
+    assert out[band_field(10)] == pytest.approx(2.0, abs=0.15)   # 10 分钟滑动平均的上升 / 下降沿
+    assert out[band_field(12)] == 0.0
+    assert out["wind_dir_dominant"] == pytest.approx(315.0)
+    assert out["wind_dir_steadiness"] == pytest.approx(1.0)
+    assert out["wind_drift_24h"] == pytest.approx((120 * 6 * 121 + 15 * 400) / 60.0, rel=1e-6)
+
+
+def test_components_fill_missing_speed_and_direction():
+    speed = np.full(N, np.nan)
+    x = np.full(N, -3.0)            # 向西吹 -> 来自东方
+    y = np.zeros(N)
+    z = np.full(N, 4.0)
+    out = compute_wind_stats(speed, direction=np.full(N, np.nan), x=x, y=y, z=z)
+
+    assert out["wind_mean_24h"] == pytest.approx(5.0)
+    assert out["wind_dir_dominant"] == pytest.approx(90.0)
+
+
+def test_low_coverage_gives_none():
+    speed = np.full(N, np.nan)
+    speed[:100] = 9.0
+    out = compute_wind_stats(speed)
+    assert set(out) == set(wind_fields())
+    assert all(v is None for v in out.values())
+
+
+def test_calm_has_no_dominant_direction():
+    out = compute_wind_stats(np.zeros(N), direction=np.full(N, 90.0))
+    assert out["wind_dir_dominant"] is None and out["wind_dir_steadiness"] == 0.0
+    assert missing_wind_fields(out, has_direction=True) == []
+
+
+def test_direction_fields_missing_only_with_direction_input():
+    out = compute_wind_stats(np.full(N, 6.0))
+    assert out["wind_dir_dominant"] is None and out["wind_dir_steadiness"] is None
+    assert missing_wind_fields(out, has_direction=False) == []
+    assert missing_wind_fields(out, has_direction=True) == list(DIRECTION_FIELDS)
+
+
+def test_grid_quality_counts_component_minutes():
+    end = datetime(2024, 12, 1, 12, 0)
+    start = end - timedelta(hours=24)
+    # wind_speed 只报前 6h，其余时段由三轴分量补齐
+    rows = [
+        (start + timedelta(minutes=i), 5.0 if i < 360 else None, 3.0, 4.0, 0.0)
+        for i in range(N)
+    ]
+    fields = ["wind_speed", "x_wind_speed", "y_wind_speed", "z_wind_speed"]
+    grid = build_minute_grid([rows], end, fields=fields, span_hours=24)
+    stats, missing, quality = grid_wind_stats(grid, end)
+
+    assert quality["valid"] == N and quality["missing_ratio"] == 0.0
+    assert stats["wind_mean_24h"] == pytest.approx(5.0)
+    assert missing == []
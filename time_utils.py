@@ -10,6 +10,16 @@ def floor_to_interval(dt: datetime, interval_min: int = 30) -> datetime:
     return dt.replace(minute=(dt.minute // interval_min) * interval_min, second=0, microsecond=0)
 
 
+def to_naive_local(dt: datetime) -> datetime:
+    """
+    带时区的时间转换为本地时区的 naive 时间（与 datetime.now() / 库中时间可比较），
+    naive 时间原样返回
+    """
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone().replace(tzinfo=None)
+
+
 def get_time_ranges(ari_time: datetime, data_delay_guard_min: int = 5):
     """
     根据 ARI 计算时间和延迟缓冲，返回各窗口时间段
@@ -0,0 +1,159 @@
+# wind_stats.py
+"""
+风吹雪指标：在设备分钟网格的 24h 窗口上一次向量化计算（不逐条循环）
+
+- wind_gust_max_24h       分钟风速最大值（m/s）
+- wind_mean_24h           有效分钟平均风速（m/s）
+- wind_hours_ge_<档>      WIND_SUSTAINED_MIN 分钟滑动平均 >= 档位的累计小时数（WIND_SPEED_BANDS）
+- wind_dir_dominant       主导风向（°，来向），风速加权矢量平均
+- wind_dir_steadiness     风向稳定度：合成矢量长度 / 平均风速（0 ~ 1；静风 / 合成矢量为 0 时为 0，主导风向为 None）
+- wind_drift_24h          吹雪输运量代理：Σ max(u - u_t, 0) · u² / 60（m³/s³·h，u_t = WIND_DRIFT_THRESHOLD_MS）
+
+风速序列：wind_speed 可信时取之，否则由三轴分量合成 √(x² + y² + z²)
+风向：wind_direction 可信时与风速合成矢量，否则用 x（向东）/ y（向北）分量
+有效分钟占比低于 WIND_STATS_MIN_COVERAGE 时全部指标为 None
+设备没有任何风向输入（风向 / x、y 分量）时风向指标为 None，但不计入缺测
+numpy 经 lazy_module 在计算时才导入（字段列表供 fetch_data / API 在 import 阶段使用）
+"""
+from datetime import timedelta
+
+import config
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+WIND_WINDOW_HOURS = 24
+
+# 依赖风向输入的指标
+DIRECTION_FIELDS = ("wind_dir_dominant", "wind_dir_steadiness")
+
+
+def band_field(band):
+    return f"wind_hours_ge_{band:g}"
+
+
+def wind_fields():
+    """
+    fetch_sensor_data 结果中的风吹雪指标字段（供模型 / API 使用）
+    """
+    return [
+        "wind_gust_max_24h",
+        "wind_mean_24h",
+        *(band_field(b) for b in config.WIND_SPEED_BANDS),
+        "wind_dir_dominant",
+        "wind_dir_steadiness",
+        "wind_drift_24h",
+    ]
+
+
+def _rolling_mean(speed, width):
+    """
+    NaN 感知的滑动平均（前缀和），窗口内有效分钟不足一半时为 NaN
+    """
+    valid = ~np.isnan(speed)
+    c_sum = np.concatenate(([0.0], np.cumsum(np.where(valid, speed, 0.0))))
+    c_cnt = np.concatenate(([0], np.cumsum(valid)))
+    hi = np.arange(1, len(speed) + 1)
+    lo = np.maximum(hi - width, 0)
+    cnt = c_cnt[hi] - c_cnt[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (c_sum[hi] - c_sum[lo]) / cnt
+    return np.where(cnt * 2 >= min(width, len(speed)), mean, np.nan)
+
+
+def _speed_series(speed, x=None, y=None, z=None):
+    """
+    wind_speed 无可信值的分钟由三轴分量合成
+    """
+    speed = np.asarray(speed, dtype=float)
+    if x is not None and y is not None:
+        comp = np.sqrt(x ** 2 + y ** 2 + (0.0 if z is None else np.nan_to_num(z)) ** 2)
+        speed = np.where(np.isnan(speed), comp, speed)
+    return speed
+
+
+def compute_wind_stats(speed, direction=None, x=None, y=None, z=None):
+    """
+    :param speed / direction / x / y / z: 等长的逐分钟数组（NaN 表示无可信值）
+    :return: {指标: 值}，覆盖率不足时全部为 None
+    """
+    n = len(speed)
+    out = dict.fromkeys(wind_fields())
+    speed = _speed_series(speed, x, y, z)
+
+    valid = ~np.isnan(speed)
+    if n == 0 or valid.sum() < n * config.WIND_STATS_MIN_COVERAGE:
+        return out
+    u = speed[valid]
+
+    out["wind_gust_max_24h"] = float(u.max())
+    out["wind_mean_24h"] = float(u.mean())
+
+    sustained = _rolling_mean(speed, config.WIND_SUSTAINED_MIN)
+    with np.errstate(invalid="ignore"):
+        for band in config.WIND_SPEED_BANDS:
+            out[band_field(band)] = round(float(np.count_nonzero(sustained >= band)) / 60.0, 2)
+
+    # 主导风向：来向 θ 的风矢量（去向分量）为 (-u·sinθ, -u·cosθ)
+    if direction is not None:
+        theta = np.radians(direction)
+        east, north = -speed * np.sin(theta), -speed * np.cos(theta)
+    else:
+        east, north = np.full(n, np.nan), np.full(n, np.nan)
+    if x is not None and y is not None:
+        missing = np.isnan(east) | np.isnan(north)
+        east = np.where(missing, x, east)
+        north = np.where(missing, y, north)
+
+    vec = ~(np.isnan(east) | np.isnan(north))
+    if vec.any():
+        mean_e, mean_n = east[vec].mean(), north[vec].mean()
+        mean_speed = np.hypot(east[vec], north[vec]).mean()
+        resultant = np.hypot(mean_e, mean_n)
+        if mean_speed > 0 and resultant > 0:
+            out["wind_dir_dominant"] = round(float(np.degrees(np.arctan2(-mean_e, -mean_n)) % 360.0), 1)
+            out["wind_dir_steadiness"] = round(float(resultant / mean_speed), 3)
+        else:
+            # 静风或各向抵消：没有主导风向
+            out["wind_dir_steadiness"] = 0.0
+
+    excess = np.maximum(u - config.WIND_DRIFT_THRESHOLD_MS, 0.0)
+    out["wind_drift_24h"] = round(float(np.sum(excess * u ** 2)) / 60.0, 2)
+    return out
+
+
+def missing_wind_fields(stats, has_direction):
+    """
+    计入缺测的指标：无风向输入时风向指标不算缺测；静风（稳定度 0）时主导风向为 None 也不算
+    """
+    def missing(k):
+        if stats[k] is not None:
+            return False
+        if k in DIRECTION_FIELDS:
+            return has_direction and stats["wind_dir_steadiness"] != 0.0
+        return True
+
+    return [k for k in stats if missing(k)]
+
+
+def grid_wind_stats(grid, end_time):
+    """
+    设备分钟网格上 [end_time - 24h, end_time) 的风吹雪指标
+    :return: (指标, 缺测指标列表, 窗口数据质量)；
+             数据质量以 wind_speed 窗口扫描为准，可信分钟数计入三轴分量合成补齐的分钟
+    """
+    start_time = end_time - timedelta(hours=WIND_WINDOW_HOURS)
+
+    def series(field):
+        return grid.values(field, start_time, end_time) if field in grid.fields else None
+
+    speed, direction = series("wind_speed"), series("wind_direction")
+    x, y, z = series("x_wind_speed"), series("y_wind_speed"), series("z_wind_speed")
+    stats = compute_wind_stats(speed, direction=direction, x=x, y=y, z=z)
+
+    has_direction = (direction is not None and bool(np.any(~np.isnan(direction)))) or (
+        x is not None and y is not None and bool(np.any(~(np.isnan(x) | np.isnan(y))))
+    )
+    scan, _ = grid.window("wind_speed", start_time, end_time)
+    scan.valid = max(scan.valid, int(np.count_nonzero(~np.isnan(_speed_series(speed, x, y, z)))))
+    return stats, missing_wind_fields(stats, has_direction), scan.result()
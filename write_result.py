@@ -1,7 +1,8 @@
 # write_result.py
 
-import clickhouse_connect
+import json
 from datetime import datetime
+from data_quality import dumps_quality
 from config import (
     CLICKHOUSE_HOST,
     CLICKHOUSE_HTTP_PORT,
@@ -12,6 +13,74 @@ from config import (
 
 
 TABLE = "snow_device_ari"
+REGION_TABLE = "snow_region_ari"
+DAILY_TABLE = "snow_device_ari_daily"
+SEASON_TABLE = "snow_device_ari_season"
+
+# 日 / 雪季统计表共有的统计列（ari_stats.STAT_COLUMNS）
+_STATS_COLUMNS_DDL = """
+        samples UInt32,
+        max_ari_1 Nullable(Float64),
+        max_ari_2 Nullable(Float64),
+        max_level String,
+        max_threshold_level String,
+        hours_i Float64,
+        hours_ii Float64,
+        hours_iii Float64,
+        hours_iv Float64,
+        threshold_cycles UInt32,
+        threshold_triggers UInt32,
+        last_threshold_level String,
+        last_ari_time DateTime"""
+
+# 结果表结构迁移（幂等，调度器 / 归档导出启动时由 ensure_schema 执行）
+MIGRATIONS = [
+    f"ALTER TABLE {CLICKHOUSE_DB}.{TABLE} ADD COLUMN IF NOT EXISTS data_quality_detail Nullable(String)",
+    f"ALTER TABLE {CLICKHOUSE_DB}.{TABLE} ADD COLUMN IF NOT EXISTS model_version Nullable(String)",
+    f"ALTER TABLE {CLICKHOUSE_DB}.{TABLE} ADD COLUMN IF NOT EXISTS calc_mode Nullable(String)",
+    f"""
+    CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.{REGION_TABLE} (
+        region String,
+        method String,
+        members String,
+        reporting UInt16,
+        ari_1 Nullable(String),
+        ari_2 Nullable(String),
+        ari_3 Nullable(String),
+        ari_4 Nullable(String),
+        ari_5 Nullable(String),
+        ari_level Nullable(String),
+        threshold_level Nullable(String),
+        worst_station Nullable(String),
+        ari_time DateTime
+    ) ENGINE = MergeTree ORDER BY (region, ari_time)
+    """,
+    # 分片 worker 租约（sharding.ClickHouseLeaseStore，SHARD_LEASE_BACKEND = "clickhouse"）
+    f"""
+    CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.ari_worker_lease (
+        worker_id String,
+        heartbeat Float64,
+        host String,
+        pid UInt32,
+        completed_slot String,
+        released UInt8
+    ) ENGINE = ReplacingMergeTree(heartbeat) ORDER BY worker_id
+    """,
+    # ARI 日 / 雪季统计（ari_stats.py）
+    f"""
+    CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.{DAILY_TABLE} (
+        device_id String,
+        day Date,{_STATS_COLUMNS_DDL}
+    ) ENGINE = ReplacingMergeTree(last_ari_time) ORDER BY (device_id, day)
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.{SEASON_TABLE} (
+        device_id String,
+        season String,
+        days UInt32,{_STATS_COLUMNS_DDL}
+    ) ENGINE = ReplacingMergeTree(last_ari_time) ORDER BY (device_id, season)
+    """,
+]
 
 COLUMNS = [
     "device_id",
@@ -27,6 +96,9 @@ COLUMNS = [
     "calc_window_24h",
     "calc_window_72h",
     "data_quality_flag",
+    "data_quality_detail",
+    "model_version",
+    "calc_mode",
     "ari_time",
 ]
 
@@ -46,6 +118,7 @@ def _fmt(v):
 
 
 def get_client():
+    import clickhouse_connect
     return clickhouse_connect.get_client(
         host=CLICKHOUSE_HOST,
         port=CLICKHOUSE_HTTP_PORT,
@@ -55,7 +128,22 @@ def get_client():
     )
 
 
-def write_ari_results(results_dict: dict, ari_time: datetime):
+def ensure_schema(client=None):
+    """
+    执行 MIGRATIONS（新增列 / 区域结果表），失败只打印不抛出
+    :return: 是否全部成功
+    """
+    try:
+        client = client or get_client()
+        for sql in MIGRATIONS:
+            client.command(sql)
+    except Exception as e:
+        print(f"[ARI] schema migration failed: {e}")
+        return False
+    return True
+
+
+def write_ari_results(results_dict: dict, ari_time: datetime, calc_mode: str = "cycle"):
     if not results_dict:
         print("[ARI] empty result, skip insert")
         return
@@ -81,6 +169,9 @@ def write_ari_results(results_dict: dict, ari_time: datetime):
             _fmt(res.get("calc_window_24h", "Y")),
             _fmt(res.get("calc_window_72h", "Y")),
             _fmt(res.get("data_quality_flag", "normal")),
+            dumps_quality(res.get("data_quality")),
+            _fmt(res.get("model_version")),
+            calc_mode,
 
             ari_time,
         ])
@@ -97,4 +188,51 @@ def write_ari_results(results_dict: dict, ari_time: datetime):
         print("[ARI] ❌ ClickHouse insert failed")
         print("Exception type:", type(e))
         print("Exception repr:", repr(e))
-        raise
\ No newline at end of file
+        raise
+
+
+# 区域结果表结构见 MIGRATIONS（members 为成员 device_id 的 JSON 列表）
+REGION_COLUMNS = [
+    "region",
+    "method",
+    "members",
+    "reporting",
+    "ari_1",
+    "ari_2",
+    "ari_3",
+    "ari_4",
+    "ari_5",
+    "ari_level",
+    "threshold_level",
+    "worst_station",
+    "ari_time",
+]
+
+
+def write_region_results(regions: dict, ari_time: datetime):
+    """
+    :param regions: regions.compute_regions() 的结果
+    """
+    if not regions:
+        return
+
+    rows = [
+        [
+            name,
+            res["method"],
+            json.dumps(res["members"]),
+            res["reporting"],
+            _fmt(res.get("ari_1")),
+            _fmt(res.get("ari_2")),
+            _fmt(res.get("ari_3")),
+            _fmt(res.get("ari_4")),
+            _fmt(res.get("ari_5")),
+            _fmt(res.get("ari_level")),
+            _fmt(res.get("threshold_level")),
+            res.get("worst_station"),
+            ari_time,
+        ]
+        for name, res in regions.items()
+    ]
+    get_client().insert(REGION_TABLE, data=rows, column_names=REGION_COLUMNS)
+    print(f"[ARI] ✅ inserted {len(rows)} rows into {REGION_TABLE}")